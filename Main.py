@@ -2,7 +2,7 @@ import os
 import sys
 from PyQt6.QtWidgets import QApplication
 from PyQt6.QtGui import QIcon
-from gui import ModernSkyMusicPlayer
+import profiling
 from config import LOCAL_VERSION  # 从 config.py 导入
 
 def resource_path(relative_path):
@@ -13,19 +13,6 @@ def resource_path(relative_path):
         base_path = os.path.abspath(".")
     return os.path.join(base_path, relative_path)
 
-def rename_txt_to_json(folder_path):
-    """将指定文件夹中的所有 .txt 文件重命名为 .json 文件"""
-    for filename in os.listdir(folder_path):
-        if filename.endswith('.txt'):
-            base = os.path.splitext(filename)[0]
-            new_filename = base + '.json'
-            new_filepath = os.path.join(folder_path, new_filename)
-            if not os.path.exists(new_filepath):
-                os.rename(os.path.join(folder_path, filename), new_filepath)
-                print(f"重命名 {filename} 为 {new_filename}")
-            else:
-                print(f"文件 {new_filename} 已存在，跳过重命名 {filename}")
-
 def setup_application():
     """设置应用程序，包括图标"""
     app = QApplication(sys.argv)
@@ -37,8 +24,9 @@ def setup_application():
 
 def main():
     """主函数，初始化应用程序并启动主窗口"""
-    songs_folder = "score/score/"
-    rename_txt_to_json(songs_folder)
+    # 性能分析需在导入其他模块前开启，未开启时不会包装任何函数
+    profiling.configure(sys.argv)
+    from gui import ModernSkyMusicPlayer
 
     app = setup_application()
     window = ModernSkyMusicPlayer()
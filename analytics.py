@@ -0,0 +1,160 @@
+import json
+import os
+import time
+import numpy as np
+from utils import file_signature
+from chart import Chart, load_chart
+
+KEY_COUNT = 15
+NPS_WINDOW = 1000  # 密度统计窗口(ms)
+CHORD_THRESHOLD = 50  # 与播放时一致，间隔小于50ms的音符视为和弦
+ANALYTICS_CACHE_FILE = "analytics_cache.json"
+ANALYTICS_VERSION = 2  # 统计口径变化时递增，旧版本的缓存会被重新计算
+
+_analytics_cache = {}
+
+def note_arrays(song_data):
+    """将曲谱音符转换为按时间排序的 (时间, 按键序号) 数组"""
+    if isinstance(song_data, Chart):
+        times = np.frombuffer(song_data.times, dtype=np.float64)
+        keys = (np.frombuffer(song_data.keys, dtype=np.uint8) % KEY_COUNT).astype(np.int16)
+        order = np.argsort(times, kind="stable")
+        return times[order], keys[order]
+    notes = song_data.get("songNotes", []) if isinstance(song_data, dict) else song_data
+    notes = [note for note in notes if isinstance(note, dict) and "Key" in str(note.get("key", ""))]
+    times = np.fromiter((note.get("time", 0) for note in notes), dtype=np.float64, count=len(notes))
+    keys = np.fromiter((int(note["key"].split("Key", 1)[1]) for note in notes), dtype=np.int16, count=len(notes))
+    order = np.argsort(times, kind="stable")
+    return times[order], keys[order]
+
+def analyze_notes(times, keys):
+    """计算曲谱的密度、和弦、音域和难度统计"""
+    note_count = len(times)
+    if note_count == 0:
+        return {
+            "note_count": 0, "duration": 0.0, "avg_nps": 0.0, "peak_nps": 0.0,
+            "peak_start": 0.0, "nps_curve": [], "chord_sizes": {}, "max_chord": 0,
+            "key_usage": [0] * KEY_COUNT, "key_low": None, "key_high": None,
+            "key_span": 0, "difficulty": 0.0,
+        }
+
+    relative = times - times[0]
+    duration = float(relative[-1]) / 1000
+
+    # 每秒按键数曲线
+    nps_curve = np.bincount((relative // NPS_WINDOW).astype(np.int64))
+
+    # 滑动窗口峰值密度：每个音符起点之后一个窗口内的音符数
+    window_counts = np.searchsorted(times, times + NPS_WINDOW, side="left") - np.arange(note_count)
+    peak_index = int(np.argmax(window_counts))
+    peak_nps = float(window_counts[peak_index]) * 1000 / NPS_WINDOW
+
+    # 和弦分组：与前一音符间隔超过阈值即开始新组
+    group_starts = np.flatnonzero(np.diff(times, prepend=-np.inf) >= CHORD_THRESHOLD)
+    chord_sizes = np.diff(np.append(group_starts, note_count))
+    size_counts = np.bincount(chord_sizes)
+    chord_distribution = {str(size): int(count) for size, count in enumerate(size_counts) if count}
+
+    key_usage = np.bincount(np.clip(keys, 0, KEY_COUNT - 1), minlength=KEY_COUNT)
+    used_keys = np.flatnonzero(key_usage)
+
+    # 相邻和弦之间的平均跨度，用于衡量手指移动量
+    group_keys = keys[group_starts].astype(np.float64)
+    avg_jump = float(np.abs(np.diff(group_keys)).mean()) if len(group_keys) > 1 else 0.0
+
+    avg_nps = note_count / duration if duration > 0 else float(note_count)
+    difficulty = (
+        0.35 * min(avg_nps / 8, 1.0)
+        + 0.35 * min(peak_nps / 16, 1.0)
+        + 0.15 * min((float(chord_sizes.mean()) - 1) / 2, 1.0)
+        + 0.15 * min(avg_jump / 6, 1.0)
+    ) * 10
+
+    return {
+        "note_count": note_count,
+        "duration": duration,
+        "avg_nps": round(avg_nps, 2),
+        "peak_nps": round(peak_nps, 2),
+        "peak_start": float(relative[peak_index]) / 1000,
+        "nps_curve": nps_curve.tolist(),
+        "chord_sizes": chord_distribution,
+        "max_chord": int(chord_sizes.max()),
+        "key_usage": key_usage.tolist(),
+        "key_low": int(used_keys[0]),
+        "key_high": int(used_keys[-1]),
+        "key_span": int(used_keys[-1] - used_keys[0] + 1),
+        "difficulty": round(difficulty, 1),
+    }
+
+def analyze_song(song_data):
+    """分析单个曲谱数据"""
+    return analyze_notes(*note_arrays(song_data))
+
+def get_chart_analytics(file_path, song_data=None):
+    """获取曲谱统计，文件未变化时直接返回缓存
+
+    统计总是基于规范化后的 Chart，无论由哪条路径先写入缓存，结果都与播放时一致。
+    """
+    try:
+        signature = file_signature(file_path)
+    except OSError:
+        signature = None
+    cached = _analytics_cache.get(file_path)
+    if cached and signature and cached["signature"] == signature and cached.get("version") == ANALYTICS_VERSION:
+        return cached["stats"]
+
+    if song_data is None:
+        song_data = load_chart(file_path)
+    elif isinstance(song_data, dict) and isinstance(song_data.get("songNotes"), list):
+        song_data = Chart.from_song_data(song_data)
+    if not isinstance(song_data, Chart):
+        return None
+    stats = analyze_song(song_data)
+    if signature:
+        _analytics_cache[file_path] = {"signature": signature, "version": ANALYTICS_VERSION, "stats": stats}
+    return stats
+
+def load_analytics_cache(cache_file=ANALYTICS_CACHE_FILE):
+    """加载磁盘上的统计缓存"""
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            _analytics_cache.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+def save_analytics_cache(cache_file=ANALYTICS_CACHE_FILE):
+    """保存统计缓存到磁盘"""
+    try:
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(dict(_analytics_cache), f, ensure_ascii=False)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"保存曲谱统计缓存失败: {e}")
+
+def analyze_library(song_files, stop_event=None):
+    """批量分析整个曲库，song_files 为 {曲名: 路径}，返回 {曲名: 统计} 和耗时"""
+    started = time.perf_counter()
+    load_analytics_cache()
+    results = {}
+    for song_name, file_path in song_files.items():
+        if stop_event is not None and stop_event.is_set():
+            break
+        stats = get_chart_analytics(file_path)
+        if stats:
+            results[song_name] = stats
+    save_analytics_cache()
+    return results, time.perf_counter() - started
+
+def format_analytics(stats):
+    """将统计结果格式化为简短文本"""
+    if not stats:
+        return "难度: -"
+    chords = " ".join(f"{size}键×{count}" for size, count in sorted(stats["chord_sizes"].items(), key=lambda x: int(x[0])))
+    return (
+        f"难度: {stats['difficulty']}/10\n"
+        f"平均密度: {stats['avg_nps']} 键/秒\n"
+        f"峰值密度: {stats['peak_nps']} 键/秒 (第{int(stats['peak_start'])}秒)\n"
+        f"音域: {stats['key_low']}-{stats['key_high']} (跨{stats['key_span']}键)\n"
+        f"和弦分布: {chords}"
+    )
@@ -0,0 +1,113 @@
+from array import array
+from config import HOLD_TIME_MS
+from utils import load_json
+from profiling import profiled
+
+def physical_key(key):
+    """返回音符对应的实际按键序号，1Key 与 2Key 同序号映射到同一个键"""
+    return key.split("Key", 1)[-1]
+
+def normalize_notes(notes, merge_window=HOLD_TIME_MS):
+    """排序并去除冗余按键事件，返回 (规范化后的音符列表, 移除数量)
+
+    同一按键在 merge_window 毫秒内的重复触发（包括完全相同的音符）会被合并，
+    因为前一次按下尚未释放，再次触发只会多出一次按下/释放和一次阻塞等待。
+    """
+    valid = [note for note in notes if isinstance(note, dict) and isinstance(note.get("key"), str)]
+    ordered = sorted(valid, key=lambda note: note.get("time", 0))
+    normalized = []
+    last_press = {}
+    for note in ordered:
+        key = physical_key(note["key"])
+        note_time = note.get("time", 0)
+        last_time = last_press.get(key)
+        if last_time is not None and note_time - last_time < merge_window:
+            continue
+        last_press[key] = note_time
+        normalized.append(note)
+    return normalized, len(notes) - len(normalized)
+
+def normalize_song(song_data, merge_window=HOLD_TIME_MS):
+    """规范化曲谱数据，返回 (新的曲谱数据, 移除数量)，不修改原数据"""
+    notes, removed = normalize_notes(song_data.get("songNotes", []), merge_window)
+    normalized = dict(song_data)
+    normalized["songNotes"] = notes
+    return normalized, removed
+
+KEY_NAMES = tuple(f"{prefix}Key{index}" for prefix in "12" for index in range(15))
+KEY_CODES = {name: code for code, name in enumerate(KEY_NAMES)}
+
+class Chart:
+    """紧凑且不可修改的曲谱，加载时构建一次，供界面、播放和统计共用
+
+    音符时间(ms)和按键编码分别存放在 array 中，按键编码是 KEY_NAMES 的下标，
+    相比每个音符一个 dict 占用的内存小得多，播放时也无需再判断数据格式。
+    """
+    __slots__ = ("name", "author", "bpm", "pitch_level", "times", "keys", "removed_events")
+
+    def __init__(self, name, times, keys, author="未知", bpm="未知", pitch_level=0, removed_events=0):
+        for slot, value in (("name", name), ("times", times), ("keys", keys), ("author", author),
+                            ("bpm", bpm), ("pitch_level", pitch_level), ("removed_events", removed_events)):
+            object.__setattr__(self, slot, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Chart 对象不可修改")
+
+    def __len__(self):
+        return len(self.times)
+
+    def __repr__(self):
+        return f"Chart({self.name!r}, {len(self)} notes)"
+
+    @classmethod
+    @profiled("compile_chart")
+    def from_song_data(cls, song_data, default_name="", normalize=True):
+        """由 load_json 返回的曲谱数据构建，默认先做规范化"""
+        notes = song_data.get("songNotes", [])
+        removed = 0
+        if normalize:
+            notes, removed = normalize_notes(notes)
+        notes = [note for note in notes if isinstance(note, dict) and note.get("key") in KEY_CODES]
+        return cls(
+            name=song_data.get("name", default_name),
+            times=array("d", (note.get("time", 0) for note in notes)),
+            keys=array("B", (KEY_CODES[note["key"]] for note in notes)),
+            author=song_data.get("author", "未知"),
+            bpm=song_data.get("bpm", "未知"),
+            pitch_level=song_data.get("pitchLevel", 0),
+            removed_events=removed,
+        )
+
+    @property
+    def first_time(self):
+        return self.times[0] if self.times else 0
+
+    @property
+    def last_time(self):
+        return self.times[-1] if self.times else 0
+
+    @property
+    def duration(self):
+        """曲谱时长(秒)"""
+        return (self.last_time - self.first_time) / 1000
+
+    def key_name(self, index):
+        """第 index 个音符的按键名，如 1Key5"""
+        return KEY_NAMES[self.keys[index]]
+
+    def to_song_data(self):
+        """转换回 Sky Studio JSON 结构"""
+        return {
+            "name": self.name,
+            "author": self.author,
+            "bpm": self.bpm,
+            "pitchLevel": self.pitch_level,
+            "songNotes": [{"time": int(t) if t.is_integer() else t, "key": KEY_NAMES[k]} for t, k in zip(self.times, self.keys)],
+        }
+
+def load_chart(file_path, song_name=""):
+    """加载曲谱文件并构建 Chart，数据无效时返回 None"""
+    song_data = load_json(file_path)
+    if not isinstance(song_data, dict) or not isinstance(song_data.get("songNotes"), list):
+        return None
+    return Chart.from_song_data(song_data, song_name)
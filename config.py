@@ -1,2 +1,4 @@
 # config.py
-LOCAL_VERSION = "1.0" 
\ No newline at end of file
+LOCAL_VERSION = "1.0" 
+HOLD_TIME_MS = 100  # 未启用延时时每个按键的按住时长(ms)
+REMOTE_PORT = 47810  # 远程控制服务的默认端口
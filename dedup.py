@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import re
+import time
+from collections import defaultdict
+import numpy as np
+from utils import load_json, file_signature
+from analytics import note_arrays, CHORD_THRESHOLD
+
+SHINGLE_SIZE = 5  # 每个片段包含的相邻和弦数
+NUM_PERM = 64  # MinHash 签名长度
+LSH_BANDS = 16  # LSH 分段数，每段 NUM_PERM // LSH_BANDS 行
+SIMILARITY_THRESHOLD = 0.8  # 判定为近似重复的估计相似度下限
+MERSENNE_PRIME = (1 << 61) - 1
+DEDUP_CACHE_FILE = "dedup_cache.json"
+
+_rng = np.random.default_rng(20240601)
+_perm_a = _rng.integers(1, 1 << 30, size=NUM_PERM, dtype=np.uint64)
+_perm_b = _rng.integers(0, 1 << 30, size=NUM_PERM, dtype=np.uint64)
+_fingerprint_cache = {}
+
+def chord_sequence(times, keys):
+    """将音符按和弦分组，返回 (和弦起始时间, 和弦按键元组) 列表"""
+    if len(times) == 0:
+        return [], []
+    group_starts = np.flatnonzero(np.diff(times, prepend=-np.inf) >= CHORD_THRESHOLD)
+    bounds = np.append(group_starts, len(times))
+    onsets = (times[group_starts] - times[0]).astype(np.int64)
+    chords = [tuple(sorted(set(keys[start:end].tolist()))) for start, end in zip(bounds[:-1], bounds[1:])]
+    return onsets, chords
+
+def exact_hash(onsets, chords):
+    """对规范化后的音符序列求哈希，与文件编码和字段顺序无关"""
+    digest = hashlib.sha1()
+    for onset, chord in zip(onsets, chords):
+        digest.update(f"{int(onset)}:{','.join(map(str, chord))};".encode())
+    return digest.hexdigest()
+
+def shingles(chords):
+    """生成与移调、变速无关的片段：相邻和弦最高音的音程序列"""
+    if len(chords) <= SHINGLE_SIZE:
+        return np.empty(0, dtype=np.uint64)
+    tops = np.fromiter((chord[-1] for chord in chords), dtype=np.int64, count=len(chords))
+    sizes = np.fromiter((min(len(chord), 3) for chord in chords), dtype=np.int64, count=len(chords))
+    # 音程范围 [-14, 14]，编码为 29 进制；和弦大小 1-3 编码为 3 进制
+    steps = (np.diff(tops) + 14) * 3 + (sizes[1:] - 1)
+    windows = np.lib.stride_tricks.sliding_window_view(steps, SHINGLE_SIZE)
+    weights = 87 ** np.arange(SHINGLE_SIZE, dtype=np.int64)
+    return np.unique(windows @ weights).astype(np.uint64)
+
+def minhash(shingle_ids):
+    """计算 MinHash 签名"""
+    if len(shingle_ids) == 0:
+        return None
+    hashed = (_perm_a[:, None] * shingle_ids[None, :] + _perm_b[:, None]) % np.uint64(MERSENNE_PRIME)
+    return hashed.min(axis=1)
+
+def fingerprint_song(song_data):
+    """计算曲谱指纹，返回 {"exact": 哈希, "minhash": 签名列表或None}"""
+    onsets, chords = chord_sequence(*note_arrays(song_data))
+    signature = minhash(shingles(chords))
+    return {
+        "exact": exact_hash(onsets, chords),
+        "minhash": signature.tolist() if signature is not None else None,
+    }
+
+def get_fingerprint(file_path):
+    """获取曲谱指纹，文件未变化时直接返回缓存"""
+    try:
+        signature = file_signature(file_path)
+    except OSError:
+        return None
+    cached = _fingerprint_cache.get(file_path)
+    if cached and cached["signature"] == signature:
+        return cached["fingerprint"]
+    song_data = load_json(file_path)
+    if not isinstance(song_data, dict) or not song_data.get("songNotes"):
+        return None
+    fingerprint = fingerprint_song(song_data)
+    _fingerprint_cache[file_path] = {"signature": signature, "fingerprint": fingerprint}
+    return fingerprint
+
+def load_dedup_cache(cache_file=DEDUP_CACHE_FILE):
+    """加载磁盘上的指纹缓存"""
+    try:
+        with open(cache_file, "r", encoding="utf-8") as f:
+            _fingerprint_cache.update(json.load(f))
+    except (OSError, ValueError):
+        pass
+
+def save_dedup_cache(cache_file=DEDUP_CACHE_FILE):
+    """保存指纹缓存到磁盘"""
+    try:
+        tmp_file = cache_file + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            json.dump(dict(_fingerprint_cache), f, ensure_ascii=False)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"保存曲谱指纹缓存失败: {e}")
+
+def _canonical_key(song_name):
+    """选择组内代表曲谱：优先不带 (1) 之类副本后缀、名称较短的"""
+    is_copy = bool(re.search(r"[\(（]\d+[\)）]$", song_name))
+    return (is_copy, len(song_name), song_name)
+
+def group_duplicates(fingerprints):
+    """根据指纹分组，返回按代表曲谱排序的重复组列表（每组至少两首）"""
+    names = list(fingerprints)
+    parent = {name: name for name in names}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    def union(a, b):
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+
+    # 完全相同：精确哈希一致
+    by_hash = defaultdict(list)
+    for name in names:
+        by_hash[fingerprints[name]["exact"]].append(name)
+    for same in by_hash.values():
+        for other in same[1:]:
+            union(same[0], other)
+
+    # 近似重复：LSH 分桶后只比较同桶候选，避免两两比较
+    signed = [name for name in names if fingerprints[name]["minhash"]]
+    if signed:
+        signatures = np.array([fingerprints[name]["minhash"] for name in signed], dtype=np.uint64)
+        rows = NUM_PERM // LSH_BANDS
+        for band in range(LSH_BANDS):
+            buckets = defaultdict(list)
+            band_values = signatures[:, band * rows:(band + 1) * rows]
+            for index, row in enumerate(map(bytes, band_values)):
+                buckets[row].append(index)
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                # 同桶成员两两比较，桶内第一首可能与其他成员都不相似
+                block = signatures[members]
+                for first in range(len(members) - 1):
+                    similarity = (block[first + 1:] == block[first]).mean(axis=1)
+                    for other in np.flatnonzero(similarity >= SIMILARITY_THRESHOLD) + first + 1:
+                        union(signed[members[first]], signed[members[other]])
+
+    groups = defaultdict(list)
+    for name in names:
+        groups[find(name)].append(name)
+    result = [sorted(group, key=_canonical_key) for group in groups.values() if len(group) > 1]
+    return sorted(result, key=lambda group: group[0])
+
+def find_library_duplicates(song_files, stop_event=None):
+    """扫描整个曲库并分组重复曲谱，song_files 为 {曲名: 路径}，返回 (重复组列表, 耗时)"""
+    started = time.perf_counter()
+    load_dedup_cache()
+    fingerprints = {}
+    for song_name, file_path in song_files.items():
+        if stop_event is not None and stop_event.is_set():
+            break
+        fingerprint = get_fingerprint(file_path)
+        if fingerprint:
+            fingerprints[song_name] = fingerprint
+    save_dedup_cache()
+    return group_duplicates(fingerprints), time.perf_counter() - started
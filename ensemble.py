@@ -0,0 +1,350 @@
+"""合奏模式
+
+一个实例作为指挥，其他实例通过网络加入：
+    TCP 连接传递控制消息，每行一个 JSON，如 {"type": "start", "at": 开始时间, "speed": 速度}
+    UDP 用于 NTP 式校时，成员发送本地时间 t0，指挥回复 (t0, 收到时间 t1, 发出时间 t2)，
+    成员收到时记录 t3，时钟偏差 = ((t1 - t0) + (t2 - t3)) / 2，往返延迟 = (t3 - t0) - (t2 - t1)
+
+所有时间都在指挥的时间线(指挥的 time.perf_counter)上表示。成员用 SyncedTimeSource 把本地时间换算到
+指挥时间线，作为 PlaybackClock 的时间源，因此各实例在同一个将来时刻开始 play_song。
+开始后成员每隔 SYNC_INTERVAL 秒重新校时，偏差以不超过 MAX_SLEW_RATE 的速度平滑修正，避免时间跳变。
+"""
+import argparse
+import json
+import socket
+import struct
+import sys
+import threading
+import time
+
+ENSEMBLE_PORT = 47800  # TCP 控制端口，UDP 校时使用同一端口号
+START_LEAD = 3.0  # 指挥发出开始消息到实际开始的时间(秒)，需要大于网络延迟和成员加载曲谱的时间
+SYNC_SAMPLES = 16  # 每次校时的往返次数，取往返延迟最小的几次
+SYNC_INTERVAL = 2.0  # 持续校时的间隔(秒)
+SYNC_TIMEOUT = 0.5  # 单次校时等待回复的时间(秒)
+MAX_SLEW_RATE = 0.005  # 每秒最多修正 5ms，相当于 0.5% 的速度变化，听不出来
+STEP_THRESHOLD = 0.05  # 偏差超过 50ms 且未在演奏时直接跳到新的偏差
+SYNC_PACKET = struct.Struct("<d")
+SYNC_REPLY = struct.Struct("<ddd")
+
+def estimate_offset(samples):
+    """根据 [(偏差, 往返延迟)] 估计时钟偏差，返回 (偏差, 最小往返延迟)
+
+    往返延迟越小的样本受排队和调度的影响越小，只取延迟不超过最小值 1.5 倍(至少多 0.5ms)的样本的中位数。
+    """
+    if not samples:
+        return None
+    best_delay = min(delay for _, delay in samples)
+    limit = max(best_delay * 1.5, best_delay + 0.0005)
+    offsets = sorted(offset for offset, delay in samples if delay <= limit)
+    return offsets[len(offsets) // 2], best_delay
+
+class SyncedTimeSource:
+    """换算到指挥时间线的时间源，可以直接交给 PlaybackClock 使用
+
+    set_offset 只设置目标偏差，now() 按 MAX_SLEW_RATE 逐步追上目标，时间始终单调递增。
+    local_clock 为本地时钟，默认 time.perf_counter，测试时可以传入带偏差或漂移的时钟。
+    """
+    def __init__(self, local_clock=time.perf_counter, max_slew_rate=MAX_SLEW_RATE):
+        self.local_clock = local_clock
+        self.max_slew_rate = max_slew_rate
+        self.offset = 0.0
+        self.target_offset = 0.0
+        self._lock = threading.Lock()
+        self._last_local = local_clock()
+
+    def now(self):
+        local = self.local_clock()
+        with self._lock:
+            step = max(local - self._last_local, 0.0) * self.max_slew_rate
+            self.offset += min(max(self.target_offset - self.offset, -step), step)
+            self._last_local = local
+            return local + self.offset
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def set_offset(self, offset, step=False):
+        """设置新的时钟偏差，step 为 True 时立即生效，否则平滑过渡"""
+        with self._lock:
+            self.target_offset = offset
+            if step:
+                self.offset = offset
+                self._last_local = self.local_clock()
+
+def _send_message(sock, message):
+    sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+
+def _read_messages(sock):
+    """逐行读取 JSON 消息，连接关闭时结束"""
+    with sock.makefile("r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+class Conductor:
+    """合奏指挥，接受成员连接、回复校时请求并广播开始和停止"""
+    def __init__(self, host="0.0.0.0", port=ENSEMBLE_PORT, log=print, clock=time.perf_counter):
+        self.host = host
+        self.port = port
+        self.log = log
+        self.clock = clock
+        self.members = {}  # socket -> 成员名
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._server = None
+        self._udp = None
+
+    def start(self):
+        """开始监听，port 为 0 时使用系统分配的端口"""
+        self._server = socket.create_server((self.host, self.port))
+        self.port = self._server.getsockname()[1]
+        self._udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._udp.bind((self.host, self.port))
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        threading.Thread(target=self._sync_loop, daemon=True).start()
+        self.log(f"合奏指挥已启动，端口 {self.port}")
+        return self
+
+    def now(self):
+        """指挥时间线上的当前时间"""
+        return self.clock()
+
+    def _sync_loop(self):
+        while not self._closed.is_set():
+            try:
+                data, address = self._udp.recvfrom(64)
+            except OSError:
+                break
+            received = self.clock()
+            if len(data) != SYNC_PACKET.size:
+                continue
+            (sent,) = SYNC_PACKET.unpack(data)
+            try:
+                self._udp.sendto(SYNC_REPLY.pack(sent, received, self.clock()), address)
+            except OSError:
+                pass
+
+    def _accept_loop(self):
+        while not self._closed.is_set():
+            try:
+                sock, address = self._server.accept()
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._member_loop, args=(sock, address), daemon=True).start()
+
+    def _member_loop(self, sock, address):
+        name = f"{address[0]}:{address[1]}"
+        try:
+            for message in _read_messages(sock):
+                if message.get("type") == "hello":
+                    name = message.get("name") or name
+                    with self._lock:
+                        self.members[sock] = name
+                    self.log(f"成员加入: {name}")
+        except OSError:
+            pass
+        with self._lock:
+            self.members.pop(sock, None)
+        sock.close()
+        if not self._closed.is_set():
+            self.log(f"成员离开: {name}")
+
+    def broadcast(self, message):
+        """向所有成员发送消息，发送失败的成员会被移除"""
+        with self._lock:
+            members = list(self.members)
+        for sock in members:
+            try:
+                _send_message(sock, message)
+            except OSError:
+                with self._lock:
+                    self.members.pop(sock, None)
+
+    def announce_start(self, speed=1.0, lead=START_LEAD):
+        """通知所有成员在 lead 秒后开始，返回指挥时间线上的开始时间"""
+        start_at = self.now() + lead
+        self.broadcast({"type": "start", "at": start_at, "speed": speed})
+        self.log(f"合奏将在 {lead:.1f} 秒后开始，成员 {len(self.members)} 个")
+        return start_at
+
+    def announce_stop(self):
+        self.broadcast({"type": "stop"})
+
+    def close(self):
+        self._closed.set()
+        for sock in (self._server, self._udp):
+            if sock is not None:
+                sock.close()
+        with self._lock:
+            members = list(self.members)
+            self.members.clear()
+        for sock in members:
+            sock.close()
+
+class Member:
+    """合奏成员，连接指挥并持续校时
+
+    on_start(开始时间, 速度) 和 on_stop() 在网络线程中调用，界面中使用时需要转到界面线程。
+    """
+    def __init__(self, host, port=ENSEMBLE_PORT, name="", on_start=None, on_stop=None, log=print,
+                 local_clock=time.perf_counter):
+        self.host = host
+        self.port = port
+        self.name = name or socket.gethostname()
+        self.on_start = on_start
+        self.on_stop = on_stop
+        self.log = log
+        self.source = SyncedTimeSource(local_clock)
+        self.round_trip = None
+        self.playing = False  # 演奏中只平滑修正偏差，不直接跳变
+        self._closed = threading.Event()
+        self._sock = None
+        self._udp = None
+
+    def connect(self, timeout=5.0):
+        """连接指挥并完成首次校时，失败时抛出 OSError"""
+        self._sock = socket.create_connection((self.host, self.port), timeout=timeout)
+        self._sock.settimeout(None)
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._udp.settimeout(SYNC_TIMEOUT)
+        if not self.sync(step=True):
+            self.close()
+            raise OSError("校时失败，指挥没有回复")
+        _send_message(self._sock, {"type": "hello", "name": self.name})
+        threading.Thread(target=self._control_loop, daemon=True).start()
+        threading.Thread(target=self._resync_loop, daemon=True).start()
+        self.log(f"已加入合奏 {self.host}:{self.port}，时钟偏差 {self.source.offset * 1000:+.2f}ms，往返 {self.round_trip * 1000:.2f}ms")
+        return self
+
+    def sync(self, samples=SYNC_SAMPLES, step=False):
+        """进行一轮校时，返回是否成功"""
+        results = []
+        for _ in range(samples):
+            t0 = self.source.local_clock()
+            try:
+                self._udp.sendto(SYNC_PACKET.pack(t0), (self.host, self.port))
+                while True:
+                    data = self._udp.recv(64)
+                    t3 = self.source.local_clock()
+                    if len(data) == SYNC_REPLY.size:
+                        sent, t1, t2 = SYNC_REPLY.unpack(data)
+                        if sent == t0:
+                            break
+            except (socket.timeout, OSError):
+                continue
+            results.append((((t1 - t0) + (t2 - t3)) / 2, (t3 - t0) - (t2 - t1)))
+        estimate = estimate_offset(results)
+        if estimate is None:
+            return False
+        offset, self.round_trip = estimate
+        self.source.set_offset(offset, step or (not self.playing and abs(offset - self.source.offset) > STEP_THRESHOLD))
+        return True
+
+    def _resync_loop(self):
+        while not self._closed.wait(SYNC_INTERVAL):
+            if not self.sync():
+                self.log("校时失败，继续使用上次的时钟偏差")
+
+    def _control_loop(self):
+        try:
+            for message in _read_messages(self._sock):
+                kind = message.get("type")
+                if kind == "start" and self.on_start:
+                    self.on_start(float(message["at"]), float(message.get("speed", 1.0)))
+                elif kind == "stop" and self.on_stop:
+                    self.on_stop()
+        except OSError:
+            pass
+        if not self._closed.is_set():
+            self.log("与合奏指挥的连接已断开")
+
+    def close(self):
+        self._closed.set()
+        for sock in (self._sock, self._udp):
+            if sock is not None:
+                sock.close()
+
+def skewed_clock(offset=0.0, drift_ppm=0.0):
+    """带固定偏差和频率漂移的本地时钟，用于在同一台机器上测试校时"""
+    base = time.perf_counter()
+    return lambda: base + offset + (time.perf_counter() - base) * (1 + drift_ppm / 1e6)
+
+def press_errors(chart, speed, start_at, presses):
+    """按下时间(ms)相对约定时间线的误差(ms)，和弦中的音符都以和弦第一个音的时间为准"""
+    from player import CHORD_THRESHOLD
+    times = chart.times
+    errors = []
+    chord_time = times[0]
+    for index, pressed in enumerate(presses[:len(times)]):
+        if index and times[index] - times[index - 1] >= CHORD_THRESHOLD:
+            chord_time = times[index]
+        errors.append(pressed - start_at * 1000 - (chord_time - times[0]) / speed)
+    return errors
+
+def _play(chart, speed, source, start_at, dry_run, output_latency=0.0):
+    """在指定时间源上演奏，dry_run 时只记录按键，返回每个按键相对约定时间线的误差(ms)
+
+    output_latency 为本机输出延迟(秒)，按键会提前这么多发出，误差约为 -output_latency。
+    """
+    from output import RecordingOutput
+    from player import PlaybackClock, SystemTimeSource, play_song
+    from simulate import SimulatedListener
+    clock = PlaybackClock(speed, output_latency=output_latency, source=source)
+    # 同一台机器上 perf_counter 就是指挥时间线，按真实时间记录按键才能看出校时误差
+    output = RecordingOutput(PlaybackClock(source=SystemTimeSource())) if dry_run else None
+    play_song(chart, threading.Event(), speed, SimulatedListener(), clock=clock, output=output, start_at=start_at)
+    if output is None:
+        return None
+    return press_errors(chart, speed, start_at, [event[0] for event in output.events if event[1] == "down"])
+
+def main():
+    parser = argparse.ArgumentParser(description="合奏模式: 指挥和成员在同一时刻开始演奏")
+    parser.add_argument("role", choices=("conduct", "join"))
+    parser.add_argument("chart", help="要演奏的曲谱文件")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=ENSEMBLE_PORT)
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--members", type=int, default=1, help="指挥等待的成员数")
+    parser.add_argument("--lead", type=float, default=START_LEAD)
+    parser.add_argument("--dry-run", action="store_true", help="不发送按键，只报告开始时间误差")
+    parser.add_argument("--latency", type=float, default=0.0, help="本机输出延迟(ms)，按键会提前发出")
+    parser.add_argument("--clock-offset", type=float, default=0.0, help="测试用: 本地时钟偏差(秒)")
+    parser.add_argument("--clock-drift", type=float, default=0.0, help="测试用: 本地时钟漂移(ppm)")
+    args = parser.parse_args()
+
+    from chart import load_chart
+    chart = load_chart(args.chart)
+    if chart is None or not len(chart):
+        print("无法加载曲谱")
+        sys.exit(1)
+
+    if args.role == "conduct":
+        conductor = Conductor(port=args.port).start()
+        while len(conductor.members) < args.members:
+            time.sleep(0.05)
+        from player import SystemTimeSource
+        start_at = conductor.announce_start(args.speed, args.lead)
+        errors = _play(chart, args.speed, SystemTimeSource(), start_at, args.dry_run, args.latency / 1000)
+        conductor.close()
+    else:
+        started = threading.Event()
+        start = {}
+        def on_start(at, speed):
+            start.update(at=at, speed=speed)
+            started.set()
+        member = Member(args.host, args.port, on_start=on_start,
+                        local_clock=skewed_clock(args.clock_offset, args.clock_drift)).connect()
+        started.wait()
+        member.playing = True
+        errors = _play(chart, start["speed"], member.source, start["at"], args.dry_run, args.latency / 1000)
+        member.close()
+    if errors:
+        print(f"按键时间误差: 首个 {errors[0]:+.2f}ms, 最后 {errors[-1]:+.2f}ms, 最大 {max(errors, key=abs):+.2f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,34 @@
 import sys
-import json
 import os
 import threading
-import random
-import time
 import requests
-import keyboard
-import pygetwindow as gw
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QPushButton, QListWidget, QLineEdit, QLabel, QSlider, QDockWidget,
+                             QPushButton, QListWidget, QListWidgetItem, QLineEdit, QLabel, QSlider, QDockWidget,
                              QProgressBar, QTabWidget, QGridLayout, QComboBox, QMenu, QMessageBox,
-                             QCheckBox, QStackedLayout, QSizePolicy)
+                             QCheckBox, QStackedLayout, QSizePolicy, QPlainTextEdit)
 from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer, QEvent
-from PyQt6.QtGui import QIcon, QDoubleValidator, QKeySequence, QFont
-from player import play_song
+from PyQt6.QtGui import QIcon, QDoubleValidator, QKeySequence, QFont, QTextCursor
+from player import play_song, play_playlist, PlaybackClock
+from playlist import Playlist
+from realtime import RealtimePlayback, TimingStats, report_timing
+from humanize import BUILTIN_PROFILES, precompute_humanization, new_seed
+from output import KeyboardOutput, measure_latency, parse_latency_profiles, DEFAULT_PROFILE
+from settings import SettingsStore
+from window import GameWindow, poll_interval
+from preview import render_preview, play_preview, stop_preview
+from pianoroll import PianoRollWidget, ThumbnailLabel
+from analytics import get_chart_analytics, analyze_library, format_analytics
+from dedup import find_library_duplicates
+from chart import Chart, load_chart
+from library import Library, is_archive_member
+from ensemble import Conductor, Member, ENSEMBLE_PORT
+from remote import RemoteServer
+from hotkeys import HotkeyDispatcher, HOTKEY_COMMANDS
 from utils import load_json, key_mapping, release_all_keys
-from config import LOCAL_VERSION
-from utils import fetch_latest_version
+from config import LOCAL_VERSION, REMOTE_PORT
+from logger import LogBuffer, LEVEL_NAMES, LOG_CAPACITY, LOG_FLUSH_INTERVAL, level_value, format_entry
+from profiling import profiled
+from utils import fetch_latest_version, load_cached_version, save_cached_version, VERSION_URL
 
 def resource_path(relative_path):
     """获取资源文件的绝对路径"""
@@ -28,41 +40,83 @@ def resource_path(relative_path):
 
 class PlayThread(QThread):
     """播放线程类，用于播放歌曲"""
-    update_log = pyqtSignal(str)
     update_progress = pyqtSignal(float)
     update_time = pyqtSignal(float)
+    song_changed = pyqtSignal(str, object)  # 曲谱编号, Chart
 
-    def __init__(self, song_data, speed, delay_enabled=False, delay_min=200, delay_max=500):
+    def __init__(self, chart, speed, humanize_profile=None, delay_min=200, delay_max=500, seed=None, playlist=None,
+                 realtime=False, cpu=None, output_latency=0.0, log_buffer=None, clock_source=None, start_at=None):
         super().__init__()
-        self.song_data = song_data
+        self.log_buffer = log_buffer or LogBuffer()
+        self.chart = chart
+        self.playlist = playlist
+        self.realtime = realtime
+        self.cpu = cpu
+        self.timing = TimingStats()
         self.speed = speed
+        self.clock = PlaybackClock(speed, output_latency=output_latency / 1000, source=clock_source)
+        self.start_at = start_at  # 合奏时在时钟时间源上约定的开始时间
         self.stop_event = threading.Event()
         self.paused = False
         self.seek_position = 0
         self.initial_progress = 0
         self.manual_stop = False
-        self.start_time = 0
-        self.delay_enabled = delay_enabled
+        self.humanize_profile = humanize_profile
         self.delay_min = delay_min
         self.delay_max = delay_max
+        self.seed = new_seed() if seed is None else seed
 
     def run(self):
         """线程运行函数"""
         try:
-            self.start_time = time.time()
-            play_song(
-                self.song_data, 
-                self.stop_event, 
-                self.speed, 
-                self,
-                self.initial_progress,
-                self.delay_enabled,
-                self.delay_min,
-                self.delay_max
-            )
+            if self.playlist:
+                # 实时模式按曲进入和退出，两首之间的加载和 GC 不在实时模式内
+                play_playlist(
+                    self.playlist,
+                    self.stop_event,
+                    self.speed,
+                    self,
+                    self.build_humanization if self.humanize_profile else None,
+                    clock=self.clock,
+                    timing=self.timing,
+                    start_at=self.start_at,
+                    realtime_factory=self.realtime_playback
+                )
+            else:
+                with self.realtime_playback():
+                    play_song(
+                        self.chart, 
+                        self.stop_event, 
+                        self.speed, 
+                        self,
+                        self.initial_progress,
+                        self.build_humanization(self.chart) if self.humanize_profile else None,
+                        clock=self.clock,
+                        timing=self.timing,
+                        start_at=self.start_at
+                    )
+            report_timing(self.timing, self.realtime, self.log)
             self.update_play_progress(self.initial_progress)
         except Exception as e:
-            self.update_log.emit(f"播放出错: {str(e)}")
+            self.log(f"播放出错: {str(e)}", "error")
+        finally:
+            if self.playlist:
+                self.playlist.close()
+
+    def realtime_playback(self):
+        return RealtimePlayback(self.realtime, self.cpu, self.log)
+
+    def build_humanization(self, chart):
+        """播放前为整首曲谱生成人性化数据，同一种子可复现同一次演奏"""
+        name, profile = self.humanize_profile
+        humanize = precompute_humanization(chart, profile, self.delay_min, self.delay_max, self.seed, name)
+        self.log(f"人性化配置: {name}, 种子: {self.seed}")
+        return humanize
+
+    def start_song(self, song_name, chart):
+        """播放列表切换到下一首"""
+        self.chart = chart
+        self.song_changed.emit(song_name, chart)
 
     def stop(self):
         """停止播放"""
@@ -75,16 +129,122 @@ class PlayThread(QThread):
         if self.paused:
             release_all_keys()
 
-    def log(self, message):
-        """记录日志信息"""
-        self.update_log.emit(message)
+    def set_speed(self, speed):
+        """播放中切换速度，从当前位置起按新速度继续"""
+        self.speed = speed
+        self.clock.set_speed(speed)
+
+    def seek(self, progress):
+        """播放中跳转到当前曲谱的指定进度(百分比)"""
+        chart = self.chart
+        self.clock.seek(self.clock.origin + (chart.last_time - chart.first_time) * progress / 100)
+
+    def log(self, message, level="info"):
+        """记录日志信息，写入共享的日志缓冲区，由界面定时批量显示"""
+        self.log_buffer.log(message, level)
 
     def update_play_progress(self, progress):
         """更新播放进度"""
         self.update_progress.emit(progress)
-        current_time = (time.time() - self.start_time) * self.speed
         if not self.paused:
-            self.update_time.emit(current_time)
+            self.update_time.emit(self.clock.elapsed())
+
+class VersionCheckThread(QThread):
+    """版本检查线程类，在后台获取最新版本"""
+    version_fetched = pyqtSignal(str)
+
+    def __init__(self, url=VERSION_URL, parent=None):
+        super().__init__(parent)
+        self.url = url
+
+    def run(self):
+        """线程运行函数"""
+        latest_version = fetch_latest_version(self.url)
+        if latest_version is None:
+            self.version_fetched.emit('获取失败')
+            return
+        save_cached_version(latest_version)
+        self.version_fetched.emit(latest_version)
+
+class LatencyCalibrationThread(QThread):
+    """输出延迟校准线程类，测量按键注入到系统的延迟"""
+    calibrated = pyqtSignal(object)
+
+    def run(self):
+        """线程运行函数"""
+        try:
+            self.calibrated.emit(measure_latency(KeyboardOutput()))
+        except Exception as e:
+            print(f"输出延迟校准失败: {e}")
+            self.calibrated.emit(None)
+
+class PreviewRenderThread(QThread):
+    """试听渲染线程类，在后台合成曲谱音频"""
+    rendered = pyqtSignal(str, str)  # 曲名, 试听文件路径(失败时为空)
+
+    def __init__(self, song_name, file_path, chart=None, parent=None):
+        super().__init__(parent)
+        self.song_name = song_name
+        self.file_path = file_path
+        self.chart = chart
+
+    def run(self):
+        """线程运行函数"""
+        try:
+            chart = self.chart or load_chart(self.file_path, self.song_name)
+            self.rendered.emit(self.song_name, render_preview(chart) if chart is not None and len(chart) else "")
+        except Exception as e:
+            print(f"生成试听失败: {e}")
+            self.rendered.emit(self.song_name, "")
+
+class EnsembleConnectThread(QThread):
+    """合奏连接线程类，在后台连接指挥并完成首次校时"""
+    connected = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, member, parent=None):
+        super().__init__(parent)
+        self.member = member
+
+    def run(self):
+        """线程运行函数"""
+        try:
+            self.connected.emit(self.member.connect())
+        except OSError as e:
+            self.failed.emit(str(e))
+
+class LibraryScanThread(QThread):
+    """曲库扫描线程类，在后台并行扫描所有曲库根目录"""
+    scanned = pyqtSignal(object)
+
+    def __init__(self, library, parent=None):
+        super().__init__(parent)
+        self.library = library
+
+    def run(self):
+        """线程运行函数"""
+        self.scanned.emit(self.library.refresh())
+
+class LibraryAnalyticsThread(QThread):
+    """曲库统计线程类，在后台批量计算所有曲谱的统计数据和重复分组"""
+    analytics_ready = pyqtSignal(dict, float)
+    duplicates_ready = pyqtSignal(list, float)
+
+    def __init__(self, song_files, parent=None):
+        super().__init__(parent)
+        self.song_files = song_files
+        self.stop_event = threading.Event()
+
+    def run(self):
+        """线程运行函数"""
+        results, elapsed = analyze_library(self.song_files, self.stop_event)
+        self.analytics_ready.emit(results, elapsed)
+        groups, elapsed = find_library_duplicates(self.song_files, self.stop_event)
+        self.duplicates_ready.emit(groups, elapsed)
+
+    def stop(self):
+        """停止统计"""
+        self.stop_event.set()
 
 class HotkeyEdit(QLineEdit):
     """快捷键编辑控件"""
@@ -218,6 +378,10 @@ class SpeedInput(QLineEdit):
 
 class ModernSkyMusicPlayer(QMainWindow):
     """现代天空音乐播放器主窗口类"""
+    ensemble_start = pyqtSignal(float, float)  # 合奏开始时间, 速度，由网络线程发出
+    ensemble_stop = pyqtSignal()
+    command_received = pyqtSignal(str, object)  # 命令, 参数，由快捷键钩子线程或远程控制服务线程发出
+
     def __init__(self):
         super().__init__()
         self.initialize_ui()
@@ -245,38 +409,63 @@ class ModernSkyMusicPlayer(QMainWindow):
 
     def initialize_data(self):
         """初始化数据"""
-        self.current_song_data = None
+        self.log_buffer = LogBuffer()
+        self.current_chart = None
         self.play_thread = None
         self.current_hotkeys = {"pause": "F10", "stop": "F11"}
+        self.hotkeys = HotkeyDispatcher(self.on_hotkey)
         self.hotkey_edits = {}
         self.total_duration = 0
-        self._song_cache = {}
-        self._current_song = None
+        self._song_cache = {}  # 曲谱编号 -> Chart
+        self._current_song = None  # 当前曲谱的显示标题
+        self._current_id = None
         self._max_cache_size = 50
-        self.favorites_file = "favorites.json"
-        self.hotkey_settings_file = "hotkey_settings.json"
+        self.settings = SettingsStore(log=lambda message: self.log(message, "error"))
+        self.library = Library(self.settings.get("library_roots"))
+        self.library_scan_thread = None
+        self.game_window = GameWindow()
         self.delay_enabled = False
         self.delay_min = 200
         self.delay_max = 500
+        self.humanize_profiles = dict(BUILTIN_PROFILES)
         self.current_play_mode = "单曲循环"
         self.is_dragging = False
+        self.version_thread = None
+        self.latest_version = None
+        self.about_box = None
+        self.library_analytics = {}
+        self.duplicate_groups = {}
+        self.analytics_thread = None
+        self.playlist_list = None
+        self.latency_profile = DEFAULT_PROFILE
+        self.latency_profiles = {DEFAULT_PROFILE: 0.0}
+        self.calibration_thread = None
+        self.preview_thread = None
+        self.pending_seek = 0
+        self.conductor = None
+        self.ensemble_member = None
+        self.ensemble_thread = None
+        self.remote_server = None
+        self.remote_queue = []  # 远程控制加入的待播放曲谱编号
 
     def load_initial_data(self):
         """加载初始数据"""
-        self.favorites = self.load_favorites()
+        if self.settings.migrated:
+            self.log("已将旧的设置文件迁移到 settings.json")
         self.load_hotkey_settings()
         self.load_song_list()
-        self.load_favorites_list()
+        if self.remote_checkbox.isChecked():
+            self.toggle_remote(True)
 
     def setup_timers(self):
         """设置定时器"""
-        self._update_timer = QTimer()
-        self._update_timer.timeout.connect(self._update_ui)
-        self._update_timer.start(100)
+        self.log_flush_timer = QTimer()
+        self.log_flush_timer.timeout.connect(self.flush_log)
+        self.log_flush_timer.start(LOG_FLUSH_INTERVAL)
         self.window_check_timer = QTimer()
         self.window_check_timer.timeout.connect(self.check_window_focus)
-        self.window_check_timer.start(1000)
         self.load_delay_settings()
+        self.load_latency_settings()
 
     def get_stylesheet(self):
         """获取样式表"""
@@ -332,17 +521,42 @@ class ModernSkyMusicPlayer(QMainWindow):
         about_button.clicked.connect(self.show_about_dialog)
         self.main_layout.addWidget(about_button, alignment=Qt.AlignmentFlag.AlignRight)
 
-    def show_about_dialog(self):
-        """显示关于对话框"""
-        latest_version = fetch_latest_version()
-        about_message = (
+    def build_about_message(self, latest_version):
+        """生成关于对话框内容"""
+        return (
             f"当前版本: {LOCAL_VERSION}\n"
             f"最新版本: {latest_version}\n"
             "作者: Tloml-Starry\n"
             '项目主页：<a href="https://github.com/Tloml-Starry/SkyAutoMusic">GitHub</a> | <a href="https://gitee.com/Tloml-Starry/SkyAutoMusic">Gitee</a>\n'
             'BUG反馈&功能提议&流: <a href="https://qm.qq.com/q/dWe60BFyE0">392665563</a>'
         )
+
+    def check_latest_version(self):
+        """在后台检查最新版本，已有检查在进行时不重复启动"""
+        if self.version_thread and self.version_thread.isRunning():
+            return
+        self.version_thread = VersionCheckThread(parent=self)
+        self.version_thread.version_fetched.connect(self.on_version_fetched)
+        self.version_thread.start()
+
+    def on_version_fetched(self, latest_version):
+        """版本检查完成事件"""
+        if latest_version == '获取失败' and self.latest_version:
+            return
+        self.latest_version = latest_version
+        if self.about_box is not None:
+            self.about_box.setText(self.build_about_message(latest_version))
+
+    def show_about_dialog(self):
+        """显示关于对话框"""
+        cached_version, fresh = load_cached_version()
+        if cached_version:
+            self.latest_version = cached_version
+        if not fresh:
+            self.check_latest_version()
+        about_message = self.build_about_message(self.latest_version or '检查中...')
         msg_box = QMessageBox(self)
+        self.about_box = msg_box
         msg_box.setWindowTitle("关于")
         msg_box.setText(about_message)
         msg_box.setIcon(QMessageBox.Icon.Information)
@@ -371,6 +585,7 @@ class ModernSkyMusicPlayer(QMainWindow):
             }
         """)
         msg_box.exec()
+        self.about_box = None
 
     def setup_play_tab(self, main_tab_widget):
         """设置播放选项卡"""
@@ -393,6 +608,10 @@ class ModernSkyMusicPlayer(QMainWindow):
         self.search_input.setFixedHeight(30)
         self.search_input.textChanged.connect(self.filter_songs)
         left_layout.addWidget(self.search_input)
+        self.hide_duplicates_checkbox = QCheckBox("隐藏重复曲谱")
+        self.hide_duplicates_checkbox.setStyleSheet(self.get_checkbox_stylesheet())
+        self.hide_duplicates_checkbox.stateChanged.connect(lambda _: self.filter_songs(self.search_input.text()))
+        left_layout.addWidget(self.hide_duplicates_checkbox)
         tab_widget = QTabWidget()
         tab_widget.currentChanged.connect(self.on_tab_changed)
         self.setup_songs_tab(tab_widget)
@@ -444,6 +663,9 @@ class ModernSkyMusicPlayer(QMainWindow):
         self.setup_hotkey_settings(right_layout)
         self.setup_delay_settings(right_layout)
         self.setup_info_display(right_layout)
+        self.setup_piano_roll(right_layout)
+        self.setup_ensemble_controls(right_layout)
+        self.setup_log_display(right_layout)
         layout.addWidget(right_panel, stretch=1)
 
     def setup_play_controls(self, layout):
@@ -465,6 +687,11 @@ class ModernSkyMusicPlayer(QMainWindow):
         self.auto_play = QCheckBox("自动播放")
         self.auto_play.setStyleSheet(self.get_checkbox_stylesheet())
         play_controls.addWidget(self.auto_play)
+        play_controls.addWidget(QLabel("间隔(秒):"))
+        self.gap_input = QLineEdit("5")
+        self.gap_input.setValidator(QDoubleValidator(0.0, 60.0, 1, self.gap_input))
+        self.gap_input.setFixedWidth(40)
+        play_controls.addWidget(self.gap_input)
         layout.addLayout(play_controls)
 
     def setup_time_display(self, layout):
@@ -521,8 +748,45 @@ class ModernSkyMusicPlayer(QMainWindow):
         delay_layout.addWidget(QLabel("上限(ms):"))
         delay_layout.addWidget(self.delay_max_input)
         layout.addLayout(delay_layout)
+        humanize_layout = QHBoxLayout()
+        self.humanize_combo = QComboBox()
+        self.humanize_combo.addItems(list(self.humanize_profiles))
+        self.humanize_combo.setToolTip("均匀: 仅随机按住时长; 高斯: 时机和时长正态抖动; 连贯: 相邻和弦抖动相关")
+        self.seed_input = QLineEdit()
+        self.seed_input.setPlaceholderText("随机种子(留空随机)")
+        humanize_layout.addWidget(QLabel("人性化:"))
+        humanize_layout.addWidget(self.humanize_combo)
+        humanize_layout.addWidget(self.seed_input)
+        layout.addLayout(humanize_layout)
+        realtime_layout = QHBoxLayout()
+        self.realtime_checkbox = QCheckBox("实时模式")
+        self.realtime_checkbox.setStyleSheet(self.get_checkbox_stylesheet())
+        self.realtime_checkbox.setToolTip("播放期间暂停垃圾回收并提升播放线程优先级")
+        self.cpu_combo = QComboBox()
+        self.cpu_combo.addItem("不绑定核心", None)
+        for cpu in range(os.cpu_count() or 1):
+            self.cpu_combo.addItem(f"核心 {cpu}", cpu)
+        realtime_layout.addWidget(self.realtime_checkbox)
+        realtime_layout.addWidget(self.cpu_combo)
+        layout.addLayout(realtime_layout)
+        latency_layout = QHBoxLayout()
+        self.latency_profile_combo = QComboBox()
+        self.latency_profile_combo.setEditable(True)
+        self.latency_profile_combo.setToolTip("输出延迟配置，可输入新名称创建")
+        self.latency_profile_combo.currentTextChanged.connect(self.on_latency_profile_changed)
+        self.latency_input = QLineEdit("0")
+        self.latency_input.setValidator(QDoubleValidator(0.0, 500.0, 1, self.latency_input))
+        self.latency_input.setFixedWidth(50)
+        self.calibrate_button = QPushButton("校准")
+        self.calibrate_button.clicked.connect(self.calibrate_latency)
+        latency_layout.addWidget(self.latency_profile_combo)
+        latency_layout.addWidget(QLabel("输出延迟(ms):"))
+        latency_layout.addWidget(self.latency_input)
+        latency_layout.addWidget(self.calibrate_button)
+        layout.addLayout(latency_layout)
         save_button = QPushButton("保存设置")
         save_button.clicked.connect(self.save_delay_settings)
+        save_button.clicked.connect(self.save_latency_settings)
         layout.addWidget(save_button)
         layout.addStretch()
 
@@ -535,10 +799,13 @@ class ModernSkyMusicPlayer(QMainWindow):
         self.bpm_label = QLabel("BPM: -")
         self.duration_label = QLabel("时长: -")
         self.note_count_label = QLabel("按键数: -")
+        self.difficulty_label = QLabel("难度: -")
+        self.density_label = QLabel("密度: -")
         info_style = """
             QLabel { color: #cccccc; padding: 2px; background-color: #2d2d2d; border-radius: 4px; }
         """
-        for label in [self.song_name_label, self.author_label, self.bpm_label, self.duration_label, self.note_count_label]:
+        for label in [self.song_name_label, self.author_label, self.bpm_label, self.duration_label, self.note_count_label,
+                      self.difficulty_label, self.density_label]:
             label.setStyleSheet(info_style)
             label.setAlignment(Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignVCenter)
         info_layout.addWidget(self.song_name_label, 0, 0)
@@ -546,8 +813,80 @@ class ModernSkyMusicPlayer(QMainWindow):
         info_layout.addWidget(self.bpm_label, 2, 0)
         info_layout.addWidget(self.duration_label, 3, 0)
         info_layout.addWidget(self.note_count_label, 4, 0)
+        info_layout.addWidget(self.difficulty_label, 5, 0)
+        info_layout.addWidget(self.density_label, 6, 0)
         layout.addWidget(info_group)
 
+    def setup_piano_roll(self, layout):
+        """设置曲谱网格视图"""
+        self.piano_roll = PianoRollWidget()
+        self.piano_roll.setFixedHeight(105)
+        self.piano_roll.setToolTip("滚轮滚动，Ctrl+滚轮缩放，点击定位")
+        self.piano_roll.seek_requested.connect(self.seek_to_progress)
+        layout.addWidget(self.piano_roll)
+
+    def seek_to_progress(self, progress):
+        """跳转到当前曲谱的指定进度：播放中直接跳转，未播放时作为下次开始的位置"""
+        if self.play_thread and self.play_thread.isRunning():
+            self.play_thread.seek(progress)
+        else:
+            self.pending_seek = progress
+            self.piano_roll.set_playhead(self.total_duration * 1000 * progress / 100)
+            self.update_progress(progress)
+        self.log(f"定位到 {progress:.1f}%")
+
+    def on_thumbnail_clicked(self, chart_id, chart, progress):
+        """曲谱信息中的缩略图点击事件"""
+        if chart_id != self._current_id:
+            if self.play_thread and self.play_thread.isRunning():
+                self.log("正在播放其他曲谱，无法定位", "warning")
+                return
+            self.set_current_chart(chart, chart_id)
+        self.seek_to_progress(progress)
+
+    def setup_ensemble_controls(self, layout):
+        """设置合奏控制"""
+        ensemble_layout = QHBoxLayout()
+        ensemble_layout.addWidget(QLabel("合奏:"))
+        self.ensemble_combo = QComboBox()
+        self.ensemble_combo.addItems(["指挥", "加入"])
+        self.ensemble_combo.setToolTip("指挥: 开始演奏时通知所有成员在同一时刻开始; 加入: 跟随指挥开始和停止")
+        ensemble_layout.addWidget(self.ensemble_combo)
+        self.ensemble_host_input = QLineEdit()
+        self.ensemble_host_input.setPlaceholderText("指挥地址")
+        ensemble_layout.addWidget(self.ensemble_host_input)
+        self.ensemble_button = QPushButton("连接")
+        self.ensemble_button.clicked.connect(self.toggle_ensemble)
+        ensemble_layout.addWidget(self.ensemble_button)
+        self.remote_checkbox = QCheckBox("远程控制")
+        self.remote_checkbox.setStyleSheet(self.get_checkbox_stylesheet())
+        self.remote_checkbox.setToolTip("启动本地 HTTP/WebSocket 接口，地址和 token 在 settings.json 的 remote 中设置")
+        self.remote_checkbox.setChecked(bool(self.settings.get("remote").get("enabled")))
+        self.remote_checkbox.toggled.connect(self.toggle_remote)
+        ensemble_layout.addWidget(self.remote_checkbox)
+        layout.addLayout(ensemble_layout)
+        self.command_received.connect(self.on_command)
+        self.ensemble_start.connect(self.on_ensemble_start)
+        self.ensemble_stop.connect(self.stop_playback)
+
+    def setup_log_display(self, layout):
+        """设置日志面板"""
+        log_header = QHBoxLayout()
+        log_header.addWidget(QLabel("日志:"))
+        self.log_level_combo = QComboBox()
+        for level in ("info", "warning", "error", "debug"):
+            self.log_level_combo.addItem(LEVEL_NAMES[level], level)
+        self.log_level_combo.currentIndexChanged.connect(self.on_log_level_changed)
+        log_header.addWidget(self.log_level_combo)
+        log_header.addStretch()
+        layout.addLayout(log_header)
+        self.log_view = QPlainTextEdit()
+        self.log_view.setReadOnly(True)
+        self.log_view.setMaximumBlockCount(LOG_CAPACITY)
+        self.log_view.setFixedHeight(120)
+        self.log_view.setStyleSheet("QPlainTextEdit { background-color: #252525; color: #cccccc; border: 1px solid #333333; border-radius: 4px; font-size: 11px; }")
+        layout.addWidget(self.log_view)
+
     def get_checkbox_stylesheet(self):
         """获取复选框样式表"""
         return """
@@ -557,11 +896,6 @@ class ModernSkyMusicPlayer(QMainWindow):
             QCheckBox::indicator:hover { border: 1px solid #4CAF50; }
         """
 
-    def _update_ui(self):
-        """更新UI"""
-        if self.play_thread and self.play_thread.isRunning():
-            pass
-
     def on_tab_changed(self, index):
         """选项卡切换事件"""
         if index == 2:
@@ -578,93 +912,179 @@ class ModernSkyMusicPlayer(QMainWindow):
                 self.hotkey_edits[action].setText(key)
 
     def load_song_list(self):
-        """加载歌曲列表"""
-        songs_folder = "score/score/"
-        if os.path.exists(songs_folder):
-            songs = [f.replace('.json', '') for f in os.listdir(songs_folder) if f.endswith('.json')]
-            self.song_list.addItems(sorted(songs))
-        else:
+        """在后台扫描所有曲库根目录，完成后刷新歌曲列表"""
+        if self.library_scan_thread and self.library_scan_thread.isRunning():
+            return
+        self.library_scan_thread = LibraryScanThread(self.library, parent=self)
+        self.library_scan_thread.scanned.connect(self.on_library_scanned)
+        self.library_scan_thread.start()
+
+    def on_library_scanned(self, library):
+        """曲库扫描完成事件"""
+        for root, reason in library.errors:
+            self.log(f"曲库目录不可用: {root} ({reason})", "warning")
+        song_files = library.song_files()
+        self.song_list.clear()
+        self.load_favorites_list()
+        if not song_files:
             self.log("歌曲文件夹不存在")
+            return
+        for entry in sorted(library.entries(), key=lambda entry: entry.title):
+            self.song_list.addItem(self.song_item(entry))
+        archived = sum(1 for file_path in song_files.values() if is_archive_member(file_path))
+        if archived:
+            self.log(f"曲库归档中的曲谱: {archived} 首(只读)")
+        self.log(f"曲库扫描完成: {len(library.roots)} 个目录, {len(song_files)} 首, 耗时 {library.elapsed:.2f} 秒")
+        self.filter_songs(self.search_input.text())
+        self.start_library_analytics(song_files)
+
+    def song_item(self, entry):
+        """曲库列表项，显示标题，曲谱编号保存在 UserRole 中"""
+        item = QListWidgetItem(entry.title)
+        item.setData(Qt.ItemDataRole.UserRole, entry.id)
+        return item
+
+    def item_id(self, item):
+        return item.data(Qt.ItemDataRole.UserRole)
+
+    def song_title(self, chart_id):
+        """曲谱编号对应的显示标题"""
+        entry = self.library.get(chart_id)
+        return entry.title if entry else chart_id
+
+    def song_path(self, chart_id):
+        """曲谱编号对应的文件路径，曲谱已不在曲库中时返回 None"""
+        entry = self.library.get(chart_id)
+        return entry.path if entry else None
+
+    def start_library_analytics(self, song_files):
+        """在后台批量计算曲库统计"""
+        if self.analytics_thread and self.analytics_thread.isRunning():
+            return
+        self.analytics_thread = LibraryAnalyticsThread(song_files, parent=self)
+        self.analytics_thread.analytics_ready.connect(self.on_library_analytics_ready)
+        self.analytics_thread.duplicates_ready.connect(self.on_duplicates_ready)
+        self.analytics_thread.start()
+
+    def on_library_analytics_ready(self, results, elapsed):
+        """曲库统计完成事件"""
+        self.library_analytics = results
+        self.log(f"曲库统计完成: {len(results)} 首, 耗时 {elapsed:.2f} 秒")
+
+    def on_duplicates_ready(self, groups, elapsed):
+        """重复曲谱分组完成事件"""
+        self.duplicate_groups = {name: group for group in groups for name in group}
+        duplicate_count = sum(len(group) - 1 for group in groups)
+        self.log(f"重复曲谱检测完成: {len(groups)} 组, {duplicate_count} 首重复, 耗时 {elapsed:.2f} 秒")
+        for i in range(self.song_list.count()):
+            item = self.song_list.item(i)
+            group = self.duplicate_groups.get(item.text())
+            item.setToolTip(f"重复曲谱: {', '.join(group)}" if group else "")
+        self.filter_songs(self.search_input.text())
+
+    def is_hidden_duplicate(self, song_name):
+        """判断曲谱是否为需要隐藏的重复副本"""
+        group = self.duplicate_groups.get(song_name)
+        return bool(group) and group[0] != song_name
 
     def load_favorites_list(self):
-        """加载收藏列表"""
+        """加载收藏列表，收藏按曲谱编号保存，暂时不在曲库中的收藏保留但不显示"""
         self.favorites_list.clear()
-        self.favorites_list.addItems(sorted(self.favorites))
+        for entry in sorted(self.settings.migrate_favorites(self.library), key=lambda entry: entry.title):
+            self.favorites_list.addItem(self.song_item(entry))
 
     def filter_songs(self, text):
         """过滤歌曲"""
         for i in range(self.song_list.count()):
             item = self.song_list.item(i)
             if item:
-                item.setHidden(text.lower() not in item.text().lower())
+                hidden = text.lower() not in item.text().lower()
+                if self.hide_duplicates_checkbox.isChecked() and self.is_hidden_duplicate(item.text()):
+                    hidden = True
+                item.setHidden(hidden)
 
+    @profiled("load_song")
     def load_song(self, item):
         """加载歌曲"""
+        chart_id = self.item_id(item)
         song_name = item.text()
         
-        if song_name in self._song_cache:
-            self.current_song_data = self._song_cache[song_name]
-            self.update_song_info(self.current_song_data, song_name)
+        if chart_id in self._song_cache:
+            self.set_current_chart(self._song_cache[chart_id], chart_id)
             self.log(f"从缓存加载: {song_name}")
             return
             
-        file_path = f"score/score/{song_name}.json"
+        file_path = self.song_path(chart_id)
+        if file_path is None:
+            self.log(f"曲谱 {song_name} 已不在曲库中，请刷新列表", "warning")
+            return
         try:
             song_data = load_json(file_path)
             if not song_data or "songNotes" not in song_data:
-                self.log("加载歌曲失败")
+                self.log("加载歌曲失败", "error")
                 return
                 
             notes = song_data.get("songNotes", [])
             if not isinstance(notes, list) or not all(isinstance(note, dict) for note in notes):
-                self.log(f"曲谱 {song_name} 的音符数据不符合预期，删除曲谱文件")
-                os.remove(file_path)
-                return
-
-            self._song_cache[song_name] = song_data
-            self.current_song_data = song_data
-            self._current_song = song_name
-            
-            # 更新曲谱信息显示
-            self.update_song_info(song_data, song_name)
-            
-            if notes:
-                if len(notes) > 1:
-                    self.total_duration = (notes[-1]['time'] - notes[0]['time']) / 1000
+                if is_archive_member(file_path):
+                    self.log(f"曲谱 {song_name} 的音符数据不符合预期", "error")
                 else:
-                    self.total_duration = 0
+                    self.log(f"曲谱 {song_name} 的音符数据不符合预期，删除曲谱文件")
+                    os.remove(file_path)
+                return
 
-                total_minutes = int(self.total_duration // 60)
-                total_seconds = int(self.total_duration % 60)
-                self.time_label.setText(f"00:00 / {total_minutes:02}:{total_seconds:02}")
-            else:
+            chart = Chart.from_song_data(song_data, song_name)
+            if chart.removed_events:
+                self.log(f"曲谱规范化: 移除 {chart.removed_events} 个冗余按键事件")
+            if not len(chart):
                 self.log("曲谱中没有音符数据")
-            
+
+            self.cache_chart(chart_id, chart)
+            self.set_current_chart(chart, chart_id)
             self.log(f"已加载: {song_name}")
             
         except Exception as e:
-            self.log(f"加载歌曲出错: {str(e)}")
+            self.log(f"加载歌曲出错: {str(e)}", "error")
+
+    def cache_chart(self, chart_id, chart):
+        """按曲谱编号缓存曲谱，超过上限时移除最早加入的曲谱"""
+        self._song_cache[chart_id] = chart
+        while len(self._song_cache) > self._max_cache_size:
+            self._song_cache.pop(next(iter(self._song_cache)))
+
+    def set_current_chart(self, chart, chart_id):
+        """设置当前曲谱并刷新信息和时长显示"""
+        self.current_chart = chart
+        self._current_id = chart_id
+        self._current_song = self.song_title(chart_id)
+        self.total_duration = chart.duration
+        self.update_song_info(chart, chart_id)
+        self.piano_roll.set_chart(chart)
+        self.pending_seek = 0
+        total_minutes = int(self.total_duration // 60)
+        total_seconds = int(self.total_duration % 60)
+        self.time_label.setText(f"00:00 / {total_minutes:02}:{total_seconds:02}")
 
-    def update_song_info(self, song_data, song_name):
+    def update_song_info(self, chart, chart_id):
         """更新曲谱信息显示"""
-        real_name = song_data.get("name", song_name)
-        author = song_data.get("author", "未知")
-        bpm = song_data.get("bpm", "未知")
-        notes = song_data.get("songNotes", [])
+        song_name = self.song_title(chart_id)
+        minutes = int(chart.duration // 60)
+        seconds = int(chart.duration % 60)
         
-        if isinstance(notes, list) and all(isinstance(note, dict) for note in notes):
-            duration = (notes[-1]['time'] - notes[0]['time']) / 1000 if notes else 0
-        else:
-            duration = 0
-            
-        minutes = int(duration // 60)
-        seconds = int(duration % 60)
-        
-        self.song_name_label.setText(f"曲名: {real_name}")
-        self.author_label.setText(f"作者: {author}")
-        self.bpm_label.setText(f"BPM: {bpm}")
+        self.song_name_label.setText(f"曲名: {chart.name or song_name}")
+        self.author_label.setText(f"作者: {chart.author}")
+        self.bpm_label.setText(f"BPM: {chart.bpm}")
         self.duration_label.setText(f"时长: {minutes}分{seconds}秒")
-        self.note_count_label.setText(f"按键数: {len(notes)}")
+        self.note_count_label.setText(f"按键数: {len(chart)}")
+
+        file_path = self.song_path(chart_id)
+        stats = get_chart_analytics(file_path, chart) if file_path else None
+        if stats:
+            self.difficulty_label.setText(f"难度: {stats['difficulty']}/10  最大和弦: {stats['max_chord']}键")
+            self.density_label.setText(f"密度: 平均 {stats['avg_nps']} / 峰值 {stats['peak_nps']} 键/秒")
+        else:
+            self.difficulty_label.setText("难度: -")
+            self.density_label.setText("密度: -")
 
     def load_and_play_song(self, item):
         """加载并播放歌曲"""
@@ -677,64 +1097,55 @@ class ModernSkyMusicPlayer(QMainWindow):
             self.stop_playback()
         
         self.load_song(item)
-        if self.current_song_data:
+        if self.current_chart:
             if not self.check_sky_window():
                 return
             self.start_playback()
             self.play_button.setText("暂停")
 
-    def toggle_pause(self):
-        """切换暂停状态"""
-        # 如果有正在运行的播放线程，则处理暂停/继续
-        if hasattr(self, 'play_thread') and self.play_thread and self.play_thread.isRunning():
-            self.play_thread.toggle_pause()
-            if self.play_thread.paused:
-                self.play_button.setText("继续")
-                self.log("演奏已暂停")
-            else:
-                if not self.check_sky_window():
-                    self.play_thread.toggle_pause()
-                    self.log("无法继续，未检测到游戏窗口")
-                    return
-                self.play_button.setText("暂停")
-                self.log("演奏继续")
-        else:
-            # 直接开始播放当前选中的歌曲
-            current_item = self.song_list.currentItem() or self.favorites_list.currentItem()
-            if current_item:
-                self.load_and_play_song(current_item)
-            else:
-                self.log("请先选择要播放的歌曲")
-
-    def start_playback(self):
-        """开始播放"""
-        if not self.current_song_data:
+    def start_playback(self, start_at=None, clock_source=None, speed=None):
+        """开始播放，合奏时 start_at 为 clock_source 上约定的开始时间"""
+        if not self.current_chart:
             self.log("没有加载歌曲")
             return
         
         try:
-            speed = float(self.speed_input.text())
+            speed = float(self.speed_input.text()) if speed is None else speed
+            if self.conductor and start_at is None:
+                start_at = self.conductor.announce_start(speed)
             self.log(f"启动播放线程，速度: {speed}")
             if self.delay_enabled:
                 self.log(f"当前使用延时设置: {self.delay_min}ms - {self.delay_max}ms")
             self.play_thread = PlayThread(
-                song_data=self.current_song_data, 
+                chart=self.current_chart, 
                 speed=speed,
-                delay_enabled=self.delay_enabled,
+                humanize_profile=self.current_humanize_profile() if self.delay_enabled else None,
                 delay_min=self.delay_min,
-                delay_max=self.delay_max
+                delay_max=self.delay_max,
+                seed=self.current_humanize_seed(),
+                playlist=self.build_playlist() if self.auto_play.isChecked() else None,
+                realtime=self.realtime_checkbox.isChecked(),
+                cpu=self.cpu_combo.currentData(),
+                output_latency=self.current_output_latency(),
+                log_buffer=self.log_buffer,
+                clock_source=clock_source,
+                start_at=start_at
             )
+            self.play_thread.seek_position = self.pending_seek
+            self.pending_seek = 0
             
-            self.play_thread.update_log.connect(self.log)
+            self.play_thread.song_changed.connect(self.on_song_changed)
             self.play_thread.update_progress.connect(self.update_progress)
             self.play_thread.update_time.connect(self.update_time_label)
             self.play_thread.finished.connect(self.on_playback_finished)
             
             self.play_thread.start()
+            self.piano_roll.follow(self.play_thread.clock.elapsed)
+            self.update_window_polling()
             self.play_button.setText("暂停")
             self.log("播放线程已启动")
         except Exception as e:
-            self.log(f"播放出错: {str(e)}")
+            self.log(f"播放出错: {str(e)}", "error")
 
     def update_speed_label(self, value):
         """更新速度标签"""
@@ -747,6 +1158,9 @@ class ModernSkyMusicPlayer(QMainWindow):
             speed = float(text)
             if 0.1 <= speed <= 10.0:
                 self.speed_slider.setValue(int(speed * 100))
+                if self.play_thread and self.play_thread.isRunning() and speed != self.play_thread.speed:
+                    self.play_thread.set_speed(speed)
+                    self.log(f"播放速度已调整为: {speed}")
         except:
             pass
 
@@ -754,22 +1168,39 @@ class ModernSkyMusicPlayer(QMainWindow):
         """打开曲谱编辑器"""
         self.log("Opening score editor")
 
-    def log(self, message):
-        """记录日志信息"""
-        print(message)  # 将日志信息打印到控制台
+    def log(self, message, level="info"):
+        """记录日志信息，由日志面板定时批量显示"""
+        self.log_buffer.log(message, level)
+
+    def flush_log(self):
+        """将新日志批量追加到日志面板，超出 maximumBlockCount 的旧行由控件自动丢弃"""
+        entries, dropped = self.log_buffer.drain()
+        minimum = level_value(self.log_level_combo.currentData())
+        lines = [format_entry(entry) for entry in entries if level_value(entry[1]) >= minimum]
+        if dropped:
+            lines.insert(0, f"... 省略 {dropped} 条日志")
+        if lines:
+            self.log_view.appendPlainText("\n".join(lines))
+
+    def on_log_level_changed(self):
+        """切换显示级别时从缓冲区重新生成日志面板内容"""
+        self.log_buffer.drain()
+        entries = self.log_buffer.entries(self.log_level_combo.currentData())
+        self.log_view.setPlainText("\n".join(format_entry(entry) for entry in entries))
+        self.log_view.moveCursor(QTextCursor.MoveOperation.End)
 
     def stop_playback(self):
         """停止播放"""
+        if self.conductor:
+            self.conductor.announce_stop()
         if self.play_thread and self.play_thread.isRunning():
             self.play_thread.stop()
             self.play_thread.wait()
             self.play_button.setText("开始")
             release_all_keys()
             self.log("演奏已停止")
-            
-            for timer in self.findChildren(QTimer):
-                if timer != self.window_check_timer:
-                    timer.stop()
+            self.piano_roll.stop_follow()
+            self.update_window_polling()
 
     def toggle_pause(self):
         """切换暂停状态"""
@@ -786,6 +1217,7 @@ class ModernSkyMusicPlayer(QMainWindow):
                     return
                 self.play_button.setText("暂停")
                 self.log("演奏继续")
+            self.update_window_polling()
         else:
             # 直接开始播放当前选中的歌曲
             current_item = self.song_list.currentItem() or self.favorites_list.currentItem()
@@ -794,55 +1226,215 @@ class ModernSkyMusicPlayer(QMainWindow):
             else:
                 self.log("请先选择要播放的歌曲")
 
+    def build_playlist(self):
+        """根据当前列表和播放模式构建连续播放列表，从当前曲谱开始"""
+        current_list = self.favorites_list if self.favorites_list.hasFocus() else self.song_list
+        chart_ids = [self.item_id(current_list.item(i)) for i in range(current_list.count()) if not current_list.item(i).isHidden()]
+        if self._current_id not in chart_ids:
+            chart_ids.insert(0, self._current_id)
+        try:
+            gap = float(self.gap_input.text())
+        except ValueError:
+            gap = 5.0
+        self.playlist_list = current_list
+        self.log(f"连续播放: {self.current_play_mode}, 共 {len(chart_ids)} 首, 间隔 {gap} 秒")
+        return Playlist(chart_ids, load=self.load_chart_by_id, mode=self.current_play_mode, start_index=chart_ids.index(self._current_id), gap=gap)
+
+    def load_chart_by_id(self, chart_id):
+        """按曲谱编号加载 Chart，在播放列表的预编译线程中调用"""
+        file_path = self.song_path(chart_id)
+        return load_chart(file_path, self.song_title(chart_id)) if file_path else None
+
+    def find_song_item(self, list_widget, chart_id):
+        """在列表中查找曲谱编号对应的列表项"""
+        for i in range(list_widget.count()):
+            item = list_widget.item(i)
+            if self.item_id(item) == chart_id:
+                return item
+        return None
+
+    def on_song_changed(self, chart_id, chart):
+        """连续播放切换曲谱事件，chart 随信号一起传递，播放线程可能已经切换到下一首"""
+        self.cache_chart(chart_id, chart)
+        self.set_current_chart(chart, chart_id)
+        item = self.find_song_item(self.playlist_list, chart_id)
+        if item:
+            self.playlist_list.setCurrentItem(item)
+        self.log(f"正在播放: {self._current_song}")
+
     def on_playback_finished(self):
         """播放完成事件"""
         self.play_button.setText("开始")
+        self.piano_roll.stop_follow()
+        self.update_window_polling()
+        if self.ensemble_member:
+            self.ensemble_member.playing = False
+        if self.remote_server:
+            self.remote_server.notify()
         
         if not self.play_thread.manual_stop:
-            if self.auto_play.isChecked():
-                if self.current_play_mode != "单曲循环":
-                    QTimer.singleShot(5000, lambda: self.play_next_song(self.current_play_mode))
-                    self.log("5秒后自动播放下一首...")
-                else:
-                    QTimer.singleShot(5000, lambda: self.load_and_play_song(self.song_list.currentItem()))
-                    self.log("5秒后重新播放...")
-            else:
-                self.log("播放结束")
-
-    def play_next_song(self, mode):
-        """播放下一首歌曲"""
-        if not self.auto_play.isChecked():
+            self.log("播放结束")
+            if self.remote_queue and not self.play_thread.playlist:
+                self.play_chart_id(self.remote_queue.pop(0))
+
+    def toggle_ensemble(self):
+        """开始或退出合奏"""
+        if self.conductor or self.ensemble_member:
+            self.leave_ensemble()
             return
-        
-        # 确定当前使用的列表和行号
-        current_list = self.favorites_list if self.favorites_list.hasFocus() else self.song_list
-        current_row = current_list.currentRow()
-        if current_row == -1:  # 如果没有选中项，默认从第一行开始
-            current_row = 0
-        
-        # 根据播放模式选择下一首歌
-        if self.current_play_mode == "单曲循环":
-            next_row = current_row
-        elif self.current_play_mode == "列表循环":
-            next_row = (current_row + 1) % current_list.count()
-        else:  # 随机播放
-            total_songs = current_list.count()
-            if total_songs > 1:
-                next_row = current_row
-                while (next_row := random.randint(0, total_songs - 1)) == current_row:
-                    pass
-            else:
-                next_row = 0
-        
-        current_list.setCurrentRow(next_row)
-        next_item = current_list.item(next_row)
-        if next_item:
-            self.log(f"即将播放: {next_item.text()}")
-            if current_list == self.favorites_list:
-                self.log("从收藏列表继续播放")
+        if self.ensemble_thread and self.ensemble_thread.isRunning():
+            return
+        if self.ensemble_combo.currentText() == "指挥":
+            try:
+                self.conductor = Conductor(port=ENSEMBLE_PORT, log=self.log).start()
+            except OSError as e:
+                self.log(f"启动合奏指挥失败: {str(e)}", "error")
+                return
+            self.on_ensemble_ready()
+            return
+        host = self.ensemble_host_input.text().strip()
+        if not host:
+            self.log("请输入指挥地址")
+            return
+        member = Member(host, log=self.log, on_start=self.ensemble_start.emit, on_stop=self.ensemble_stop.emit)
+        self.ensemble_thread = EnsembleConnectThread(member, self)
+        self.ensemble_thread.connected.connect(self.on_ensemble_joined)
+        self.ensemble_thread.failed.connect(lambda reason: self.log(f"加入合奏失败: {reason}", "error"))
+        self.ensemble_thread.start()
+        self.log(f"正在连接合奏指挥 {host}...")
+
+    def on_ensemble_joined(self, member):
+        """成功加入合奏事件"""
+        self.ensemble_member = member
+        self.on_ensemble_ready()
+
+    def on_ensemble_ready(self):
+        self.ensemble_button.setText("退出")
+        self.ensemble_combo.setEnabled(False)
+        self.ensemble_host_input.setEnabled(False)
+
+    def leave_ensemble(self):
+        """退出合奏，关闭网络连接"""
+        for session in (self.conductor, self.ensemble_member):
+            if session:
+                session.close()
+        self.conductor = None
+        self.ensemble_member = None
+        self.ensemble_button.setText("连接")
+        self.ensemble_combo.setEnabled(True)
+        self.ensemble_host_input.setEnabled(True)
+        self.log("已退出合奏")
+
+    def on_ensemble_start(self, start_at, speed):
+        """收到指挥的开始通知，在约定时刻开始演奏当前曲谱"""
+        if not self.ensemble_member:
+            return
+        if self.play_thread and self.play_thread.isRunning():
+            self.stop_playback()
+        if not self.current_chart:
+            self.log("合奏开始，但没有加载歌曲", "warning")
+            return
+        if not self.check_sky_window():
+            return
+        self.ensemble_member.playing = True
+        delay = start_at - self.ensemble_member.source.now()
+        self.log(f"合奏将在 {delay:.1f} 秒后开始，速度 {speed}")
+        self.start_playback(start_at, self.ensemble_member.source, speed)
+
+    def toggle_remote(self, enabled):
+        """启动或停止远程控制服务"""
+        if self.remote_server:
+            self.remote_server.stop()
+            self.remote_server = None
+            self.log("远程控制已停止")
+        if enabled:
+            config = self.settings.get("remote")
+            try:
+                self.remote_server = RemoteServer(self, config.get("host", "127.0.0.1"), config.get("port", REMOTE_PORT),
+                                                  config.get("token", ""), log=self.log).start()
+            except OSError as e:
+                self.log(f"启动远程控制失败: {str(e)}", "error")
+                self.remote_checkbox.setChecked(False)
+                return
+        self.settings.update("remote", enabled=enabled)
+
+    def state(self):
+        """远程控制查询的播放状态，在服务线程中调用，只读取简单属性"""
+        thread = self.play_thread
+        playing = bool(thread and thread.isRunning())
+        elapsed = thread.clock.elapsed() if playing else 0.0
+        return {
+            "song": self._current_song,
+            "id": self._current_id,
+            "playing": playing,
+            "paused": bool(playing and thread.paused),
+            "position": round(elapsed, 1),
+            "duration": round(self.total_duration, 1),
+            "speed": thread.speed if playing else None,
+            "queue": len(self.remote_queue),
+            "hotkey_latency": self.hotkeys.stats(),
+        }
+
+    def search(self, text, limit):
+        """远程控制的曲库搜索"""
+        return [{"id": entry.id, "title": entry.title} for entry in self.library.search(text, limit)]
+
+    def queue(self):
+        entries = [self.library.get(chart_id) for chart_id in list(self.remote_queue)]
+        return [{"id": entry.id, "title": entry.title} for entry in entries if entry]
+
+    def execute(self, command, params):
+        """远程控制命令，在服务线程中调用，通过信号转到界面线程执行"""
+        self.command_received.emit(command, params)
+
+    def on_hotkey(self, action, pressed_at):
+        """快捷键回调，在键盘钩子线程中调用，只把命令排队交给界面线程"""
+        self.command_received.emit(HOTKEY_COMMANDS[action], {"pressed_at": pressed_at})
+
+    def on_command(self, command, params):
+        """在界面线程中执行快捷键和远程控制命令"""
+        playing = self.play_thread and self.play_thread.isRunning()
+        if command == "play":
+            if params.get("id"):
+                self.play_chart_id(params["id"])
+            elif playing:
+                if self.play_thread.paused:
+                    self.toggle_pause()
+            elif self.current_chart and self.check_sky_window():
+                self.start_playback()
+        elif command == "pause" and playing and not self.play_thread.paused:
+            self.toggle_pause()
+        elif command == "resume" and playing and self.play_thread.paused:
+            self.toggle_pause()
+        elif command == "toggle":
+            self.toggle_pause()
+        elif command == "stop":
+            self.stop_playback()
+        elif command == "seek":
+            self.seek_to_progress(params["progress"])
+        elif command == "tempo":
+            self.speed_input.setText(f"{params['speed']:g}")
+        elif command == "queue":
+            if self.library.get(params["id"]) is None:
+                self.log(f"远程控制: 没有编号为 {params['id']} 的曲谱", "warning")
             else:
-                self.log("从所有歌曲列表继续播放")
-            self.load_and_play_song(next_item)
+                self.remote_queue.append(params["id"])
+        elif command == "clear_queue":
+            self.remote_queue.clear()
+        if "pressed_at" in params:
+            latency = self.hotkeys.record(params["pressed_at"])
+            self.log(f"快捷键响应延迟 {latency * 1000:.1f}ms", "debug")
+        if self.remote_server:
+            self.remote_server.notify()
+
+    def play_chart_id(self, chart_id):
+        """按曲谱编号选中并播放曲谱"""
+        item = self.find_song_item(self.song_list, chart_id)
+        if item is None:
+            self.log(f"远程控制: 没有编号为 {chart_id} 的曲谱", "warning")
+            return
+        self.song_list.setCurrentItem(item)
+        self.load_and_play_song(item)
 
     def update_hotkey(self, action, new_key):
         """更新快捷键"""
@@ -850,62 +1442,21 @@ class ModernSkyMusicPlayer(QMainWindow):
             return
         
         try:
-            keyboard.parse_hotkey(new_key)
-            
-            try:
-                keyboard.remove_hotkey(self.current_hotkeys[action])
-            except:
-                pass
-            
+            self.hotkeys.bind(action, new_key)
             self.current_hotkeys[action] = new_key
-            
-            if action == "pause":
-                keyboard.add_hotkey(new_key, self.toggle_pause)
-            elif action == "stop":
-                keyboard.add_hotkey(new_key, self.stop_playback)
-            
             self.log(f"已将{action}的快捷键置为: {new_key}")
             self.save_hotkey_settings()
         except Exception as e:
-            self.log(f"快捷键设置失败: {str(e)}")
+            self.log(f"快捷键设置失败: {str(e)}", "error")
             self.hotkey_edits[action].setText(self.current_hotkeys[action])
 
     def save_hotkey_settings(self):
         """保存快捷键设置"""
-        try:
-            with open(self.hotkey_settings_file, 'w', encoding='utf-8') as f:
-                json.dump(self.current_hotkeys, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            self.log(f"保存快捷键设置失败: {str(e)}")
+        self.settings.set("hotkeys", dict(self.current_hotkeys))
 
     def load_hotkey_settings(self):
         """加载快捷键设置"""
-        try:
-            if os.path.exists(self.hotkey_settings_file):
-                with open(self.hotkey_settings_file, 'r', encoding='utf-8') as f:
-                    self.current_hotkeys = json.load(f)
-        except Exception as e:
-            self.log(f"加载快捷键设置失败: {str(e)}")
-
-    def load_favorites(self):
-        """加载收藏列表"""
-        try:
-            if os.path.exists(self.favorites_file):
-                with open(self.favorites_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return []
-        except Exception as e:
-            if hasattr(self, 'log_widget'):
-                self.log(f"加载收藏列表失败: {str(e)}")
-            return []
-
-    def save_favorites(self):
-        """保存收藏列表"""
-        try:
-            with open(self.favorites_file, 'w', encoding='utf-8') as f:
-                json.dump(self.favorites, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            self.log(f"保存收藏列表失败: {str(e)}")
+        self.current_hotkeys.update(self.settings.get("hotkeys"))
 
     def show_song_context_menu(self, position):
         """显示歌曲上下文菜单"""
@@ -914,47 +1465,89 @@ class ModernSkyMusicPlayer(QMainWindow):
         
         if item:
             song_name = item.text()
-            if song_name not in self.favorites:
+            chart_id = self.item_id(item)
+            if not self.settings.is_favorite(chart_id):
                 add_action = menu.addAction("添加到收藏")
                 if add_action:
-                    add_action.triggered.connect(lambda: self.add_to_favorites(song_name))
+                    add_action.triggered.connect(lambda: self.add_to_favorites(chart_id))
             else:
                 remove_action = menu.addAction("从收藏中移除")
                 if remove_action:
-                    remove_action.triggered.connect(lambda: self.remove_from_favorites(song_name))
+                    remove_action.triggered.connect(lambda: self.remove_from_favorites(chart_id))
             
             info_action = menu.addAction("查看曲谱信息")
             if info_action:
-                info_action.triggered.connect(lambda: self.show_song_info(song_name))
+                info_action.triggered.connect(lambda: self.show_song_info(chart_id))
+
+            preview_action = menu.addAction("试听")
+            preview_action.triggered.connect(lambda: self.preview_song(chart_id))
+            stop_preview_action = menu.addAction("停止试听")
+            stop_preview_action.triggered.connect(stop_preview)
+
+            group = self.duplicate_groups.get(song_name)
+            if group:
+                duplicates_action = menu.addAction(f"查看重复曲谱 ({len(group)})")
+                duplicates_action.triggered.connect(lambda: self.show_duplicate_group(song_name))
         
         menu.exec(self.song_list.mapToGlobal(position))
 
-    def show_song_info(self, song_name):
+    def preview_song(self, chart_id):
+        """在后台合成曲谱音频并播放，已渲染过的曲谱直接使用缓存"""
+        if self.preview_thread and self.preview_thread.isRunning():
+            return
+        song_name = self.song_title(chart_id)
+        self.log(f"正在生成试听: {song_name}")
+        self.preview_thread = PreviewRenderThread(song_name, self.song_path(chart_id), self._song_cache.get(chart_id), self)
+        self.preview_thread.rendered.connect(self.on_preview_rendered)
+        self.preview_thread.start()
+
+    def on_preview_rendered(self, song_name, file_path):
+        """试听生成完成事件"""
+        if not file_path:
+            self.log(f"生成试听失败: {song_name}", "error")
+            return
+        try:
+            play_preview(file_path)
+            self.log(f"正在试听: {song_name}")
+        except Exception as e:
+            self.log(f"播放试听失败: {str(e)}", "error")
+
+    def show_duplicate_group(self, song_name):
+        """显示与该曲谱重复的曲谱列表"""
+        group = self.duplicate_groups.get(song_name, [song_name])
+        lines = [f"{name} (保留)" if index == 0 else name for index, name in enumerate(group)]
+        QMessageBox.information(self, "重复曲谱", "\n".join(lines))
+
+    def show_song_info(self, chart_id):
         """显示曲谱的详细信息"""
-        file_path = f"score/score/{song_name}.json"
-        song_data = load_json(file_path)
+        song_name = self.song_title(chart_id)
+        file_path = self.song_path(chart_id)
+        chart = self._song_cache.get(chart_id)
+        if chart is None and file_path:
+            song_data = load_json(file_path)
+            if isinstance(song_data, dict) and isinstance(song_data.get("songNotes"), list):
+                chart = Chart.from_song_data(song_data, song_name)
         
-        if song_data:
-            real_name = song_data.get("name", song_name)
-            author = song_data.get("author", "未知")
-            bpm = song_data.get("bpm", "未知")
-            notes = song_data.get("songNotes", [])
-            duration = (notes[-1]['time'] - notes[0]['time']) / 1000 if notes else 0
-            minutes = int(duration // 60)
-            seconds = int(duration % 60)
-            note_count = len(notes)
+        if chart:
+            minutes = int(chart.duration // 60)
+            seconds = int(chart.duration % 60)
             
             info_message = (
-                f"曲名: {real_name}\n"
+                f"曲名: {chart.name or song_name}\n"
                 f"文件名: {song_name}\n"
-                f"作者: {author}\n"
-                f"BPM: {bpm}\n"
+                f"作者: {chart.author}\n"
+                f"BPM: {chart.bpm}\n"
                 f"时长: {minutes}分{seconds}秒\n"
-                f"按键数量: {note_count}"
+                f"按键数量: {len(chart)}\n"
+                f"{format_analytics(get_chart_analytics(file_path, chart))}"
             )
             
             msg_box = QMessageBox(self)
             msg_box.setWindowTitle("曲谱信息")
+            if len(chart):
+                thumbnail = ThumbnailLabel(chart)
+                thumbnail.clicked.connect(lambda progress: (msg_box.accept(), self.on_thumbnail_clicked(chart_id, chart, progress)))
+                msg_box.layout().addWidget(thumbnail, msg_box.layout().rowCount(), 0, 1, msg_box.layout().columnCount())
             msg_box.setText(info_message)
             msg_box.setIcon(QMessageBox.Icon.Information)
             
@@ -1025,35 +1618,30 @@ class ModernSkyMusicPlayer(QMainWindow):
         item = self.favorites_list.itemAt(position)
         
         if item:
-            song_name = item.text()
+            chart_id = self.item_id(item)
             remove_action = menu.addAction("从收藏中移除")
-            remove_action.triggered.connect(lambda: self.remove_from_favorites(song_name))
+            remove_action.triggered.connect(lambda: self.remove_from_favorites(chart_id))
         
         menu.exec(self.favorites_list.mapToGlobal(position))
 
-    def add_to_favorites(self, song_name):
+    def add_to_favorites(self, chart_id):
         """添加到收藏"""
-        if song_name not in self.favorites:
-            self.favorites.append(song_name)
-            self.favorites_list.addItem(song_name)
-            self.save_favorites()
-            self.log(f"已将 {song_name} 添加到收藏")
+        entry = self.library.get(chart_id)
+        if entry and self.settings.add_favorite(chart_id):
+            self.favorites_list.addItem(self.song_item(entry))
+            self.log(f"已将 {entry.title} 添加到收藏")
 
-    def remove_from_favorites(self, song_name):
+    def remove_from_favorites(self, chart_id):
         """从收藏中移除"""
-        if song_name in self.favorites:
-            self.favorites.remove(song_name)
-            items = self.favorites_list.findItems(song_name, Qt.MatchFlag.MatchExactly)
-            for item in items:
+        if self.settings.remove_favorite(chart_id):
+            item = self.find_song_item(self.favorites_list, chart_id)
+            if item:
                 self.favorites_list.takeItem(self.favorites_list.row(item))
-            self.save_favorites()
-            self.log(f"已将 {song_name} 从收藏中移除")
+            self.log(f"已将 {self.song_title(chart_id)} 从收藏中移除")
 
     def on_slider_pressed(self):
         """滑动条按下事件"""
         self.is_dragging = True
-        if self.play_thread and self.play_thread.isRunning():
-            self.play_thread.toggle_pause()
 
     def on_slider_released(self):
         """滑动条释放事件"""
@@ -1061,8 +1649,6 @@ class ModernSkyMusicPlayer(QMainWindow):
             self.is_dragging = False
             position = self.speed_slider.value() / 100.0  # 将滑动条值转换为速度值
             self.speed_input.setText(f"{position:.1f}")
-            if self.play_thread and self.play_thread.isRunning():
-                self.play_thread.toggle_pause()
 
     def update_progress_position(self, position):
         """更新进度位置"""
@@ -1081,17 +1667,12 @@ class ModernSkyMusicPlayer(QMainWindow):
     def check_sky_window(self):
         """检查光遇窗口"""
         try:
-            windows = gw.getWindowsWithTitle('Sky') + gw.getWindowsWithTitle('光·遇')
-            sky_window = next((w for w in windows if w.title.strip() == 'Sky' or w.title.strip() == '光·遇'), None)
-            
-            if sky_window:
+            if self.game_window.get():
                 try:
-                    if (sky_window.isMinimized):
-                        sky_window.restore()
-                    sky_window.activate()
-                    return True
+                    return self.game_window.activate()
                 except Exception as e:
-                    self.log(f"激活游戏窗口失败: {str(e)}")
+                    self.game_window.invalidate()
+                    self.log(f"激活游戏窗口失败: {str(e)}", "error")
                     return False
             else:
                 QMessageBox.warning(self, "警告", "未找到光遇窗口，请先打开光遇游戏")
@@ -1104,35 +1685,54 @@ class ModernSkyMusicPlayer(QMainWindow):
     def register_global_hotkeys(self):
         """注册全局快捷键"""
         try:
-            keyboard.add_hotkey(self.current_hotkeys["pause"], self.toggle_pause)
-            keyboard.add_hotkey(self.current_hotkeys["stop"], self.stop_playback)
+            for action, key in self.current_hotkeys.items():
+                self.hotkeys.bind(action, key)
             self.log("快捷键注册成功")
         except Exception as e:
-            self.log(f"快捷键注册失败: {str(e)}")
+            self.log(f"快捷键注册失败: {str(e)}", "error")
 
     def check_window_focus(self):
-        """检查窗口焦点"""
+        """检查窗口焦点，只在演奏中由定时器调用"""
         if self.play_thread and self.play_thread.isRunning() and not self.play_thread.paused:
             try:
-                windows = gw.getWindowsWithTitle('Sky') + gw.getWindowsWithTitle('光·遇')
-                sky_window = next((w for w in windows if w.title.strip() == 'Sky' or w.title.strip() == '光·遇'), None)
-                
-                if sky_window and not sky_window.isActive:
+                if self.game_window.is_active() is False:
                     self.play_thread.toggle_pause()
                     self.play_button.setText("继续")
                     self.log("检测到光遇窗口失去焦点，自动暂停演奏")
-                    
             except Exception as e:
-                self.log(f"检查窗口焦点时出错: {str(e)}")
+                self.game_window.invalidate()
+                self.log(f"检查窗口焦点时出错: {str(e)}", "error")
+        self.update_window_polling()
+
+    def update_window_polling(self):
+        """演奏中频繁检查窗口焦点，暂停、停止或空闲时停止检查"""
+        running = self.play_thread is not None and self.play_thread.isRunning()
+        interval = poll_interval(running, running and self.play_thread.paused)
+        if interval and not self.window_check_timer.isActive():
+            self.window_check_timer.start(interval)
+        elif not interval and self.window_check_timer.isActive():
+            self.window_check_timer.stop()
 
     def open_score_folder(self):
         """打开曲谱文件夹"""
-        folder_path = os.path.abspath("score/score")
-        if os.path.exists(folder_path):
-            os.startfile(folder_path)
+        folder_path = self.library.first_folder()
+        if folder_path:
+            os.startfile(os.path.abspath(folder_path))
         else:
             self.log("曲谱文件夹不存在")
 
+    def current_humanize_profile(self):
+        """当前选择的人性化配置 (名称, 配置)"""
+        name = self.humanize_combo.currentText()
+        return name, self.humanize_profiles.get(name, BUILTIN_PROFILES["均匀"])
+
+    def current_humanize_seed(self):
+        """输入框中的随机种子，留空或无效时返回 None"""
+        try:
+            return int(self.seed_input.text())
+        except ValueError:
+            return None
+
     def toggle_delay(self, state):
         """切换按键延时状态"""
         # 使用 Qt.CheckState 来正确判断复选框状态
@@ -1145,32 +1745,86 @@ class ModernSkyMusicPlayer(QMainWindow):
         try:
             self.delay_min = int(self.delay_min_input.text())
             self.delay_max = int(self.delay_max_input.text())
-            with open('delay_settings.json', 'w', encoding='utf-8') as f:
-                json.dump({
-                    'enabled': self.delay_enabled,
-                    'min': self.delay_min,
-                    'max': self.delay_max
-                }, f, ensure_ascii=False, indent=2)
+            self.settings.set("delay", {
+                'enabled': self.delay_enabled,
+                'min': self.delay_min,
+                'max': self.delay_max,
+                'profile': self.humanize_combo.currentText(),
+                'profiles': {name: profile for name, profile in self.humanize_profiles.items() if name not in BUILTIN_PROFILES}
+            })
             self.log(f"延时设置已保存 - 启用状态: {'开启' if self.delay_enabled else '关闭'}, 范围: {self.delay_min}ms - {self.delay_max}ms")
         except ValueError:
             self.log("请输入有效的延时值")
 
+    def current_output_latency(self):
+        """当前输入框中的输出延迟(ms)"""
+        try:
+            return max(0.0, float(self.latency_input.text()))
+        except ValueError:
+            return 0.0
+
+    def load_latency_settings(self):
+        """加载输出延迟配置"""
+        self.latency_profile, self.latency_profiles = parse_latency_profiles(self.settings.get("latency"))
+        self.latency_profile_combo.blockSignals(True)
+        self.latency_profile_combo.clear()
+        self.latency_profile_combo.addItems(list(self.latency_profiles))
+        self.latency_profile_combo.setCurrentText(self.latency_profile)
+        self.latency_profile_combo.blockSignals(False)
+        self.latency_input.setText(str(self.latency_profiles.get(self.latency_profile, 0.0)))
+
+    def on_latency_profile_changed(self, profile):
+        """切换输出延迟配置"""
+        if profile in self.latency_profiles:
+            self.latency_input.setText(str(self.latency_profiles[profile]))
+
+    def save_latency_settings(self):
+        """保存当前输出延迟配置"""
+        profile = self.latency_profile_combo.currentText().strip() or DEFAULT_PROFILE
+        self.latency_profile = profile
+        self.latency_profiles[profile] = self.current_output_latency()
+        self.settings.set("latency", {"profile": profile, "profiles": dict(self.latency_profiles)})
+        if self.latency_profile_combo.findText(profile) == -1:
+            self.latency_profile_combo.addItem(profile)
+        self.log(f"输出延迟已保存 - 配置: {profile}, 延迟: {self.latency_profiles[profile]}ms")
+
+    def calibrate_latency(self):
+        """在后台测量输出延迟"""
+        if self.calibration_thread and self.calibration_thread.isRunning():
+            return
+        self.calibrate_button.setEnabled(False)
+        self.log("正在校准输出延迟...")
+        self.calibration_thread = LatencyCalibrationThread(self)
+        self.calibration_thread.calibrated.connect(self.on_latency_calibrated)
+        self.calibration_thread.start()
+
+    def on_latency_calibrated(self, latency):
+        """输出延迟校准完成事件"""
+        self.calibrate_button.setEnabled(True)
+        if latency is None:
+            self.log("输出延迟校准失败，请手动输入", "error")
+            return
+        self.latency_input.setText(f"{latency:.1f}")
+        self.log(f"输出延迟校准完成: {latency:.1f}ms，点击保存设置后生效于当前配置")
+
     def load_delay_settings(self):
         """加载延时设置"""
         try:
-            with open('delay_settings.json', 'r', encoding='utf-8') as f:
-                settings = json.load(f)
+            settings = self.settings.get("delay")
+            if settings:
                 self.delay_enabled = settings.get('enabled', False)
                 self.delay_min = settings.get('min', 200)
                 self.delay_max = settings.get('max', 500)
+                self.humanize_profiles.update(settings.get('profiles', {}))
+                self.humanize_combo.clear()
+                self.humanize_combo.addItems(list(self.humanize_profiles))
+                self.humanize_combo.setCurrentText(settings.get('profile', "均匀"))
                 self.delay_checkbox.setChecked(self.delay_enabled)
                 self.delay_min_input.setText(str(self.delay_min))
                 self.delay_max_input.setText(str(self.delay_max))
                 self.log(f"已加载延时设置 - 启用状态: {'开启' if self.delay_enabled else '关闭'}, 范围: {self.delay_min}ms - {self.delay_max}ms")
-        except FileNotFoundError:
-            self.log("未找到延时设置文件，使用默认值")
         except Exception as e:
-            self.log(f"加载延时设置失败: {str(e)}")
+            self.log(f"加载延时设置失败: {str(e)}", "error")
 
     def toggle_play_mode(self):
         """切换播放模式"""
@@ -1182,6 +1836,8 @@ class ModernSkyMusicPlayer(QMainWindow):
             self.current_play_mode = "单曲循环"
         
         self.play_mode_button.setText(self.current_play_mode)
+        if self.play_thread and self.play_thread.isRunning() and self.play_thread.playlist:
+            self.play_thread.playlist.mode = self.current_play_mode
         self.log(f"播放模式切换为: {self.current_play_mode}")
 
     def update_time_label(self, current_time):
@@ -1194,7 +1850,7 @@ class ModernSkyMusicPlayer(QMainWindow):
 
     def update_progress(self, progress):
         """更新播放进度"""
-        current_time = self.total_duration * progress
+        current_time = self.total_duration * progress / 100
         current_minutes = int(current_time // 60)
         current_seconds = int(current_time % 60)
         total_minutes = int(self.total_duration // 60)
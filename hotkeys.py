@@ -0,0 +1,68 @@
+"""全局快捷键
+
+keyboard 的回调运行在它自己的钩子线程中。这里的回调只记录触发时间并交给 dispatch，
+由调用方通过排队的信号转到界面线程执行，钩子线程中不操作界面，也不等待播放线程结束。
+"""
+import statistics
+import threading
+import time
+from collections import deque
+import keyboard
+
+LATENCY_SAMPLES = 50  # 保留最近多少次快捷键响应延迟
+HOTKEY_COMMANDS = {"pause": "toggle", "stop": "stop"}  # 快捷键动作 -> 播放命令，与远程控制的命令相同
+
+class HotkeyDispatcher:
+    """管理全局快捷键绑定，dispatch(动作, 触发时间) 在钩子线程中调用，必须立即返回"""
+    def __init__(self, dispatch):
+        self.dispatch = dispatch
+        self._bindings = {}  # 动作 -> (快捷键, add_hotkey 返回的句柄)
+        self._lock = threading.Lock()
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def bind(self, action, hotkey):
+        """绑定或更换一个动作的快捷键
+
+        先注册新快捷键再移除旧的，只替换这一个绑定，键盘钩子保持不变；
+        快捷键无效时抛出 ValueError，原绑定保留。
+        """
+        keyboard.parse_hotkey(hotkey)
+        with self._lock:
+            old = self._bindings.get(action)
+            if old and old[0] == hotkey:
+                return
+            handle = keyboard.add_hotkey(hotkey, self._fire, args=(action,))
+            if old:
+                keyboard.remove_hotkey(old[1])
+            self._bindings[action] = (hotkey, handle)
+
+    def unbind_all(self):
+        with self._lock:
+            for _, handle in self._bindings.values():
+                keyboard.remove_hotkey(handle)
+            self._bindings.clear()
+
+    def hotkey(self, action):
+        binding = self._bindings.get(action)
+        return binding[0] if binding else None
+
+    def _fire(self, action):
+        self.dispatch(action, time.perf_counter())
+
+    def record(self, pressed_at):
+        """记录从快捷键触发到命令执行完成的延迟(秒)，返回本次延迟"""
+        latency = time.perf_counter() - pressed_at
+        self.latencies.append(latency)
+        return latency
+
+    def stats(self):
+        """最近快捷键响应延迟的统计(ms)，没有记录时返回 None"""
+        samples = sorted(self.latencies)
+        if not samples:
+            return None
+        return {
+            "count": len(samples),
+            "median": round(statistics.median(samples) * 1000, 2),
+            "p95": round(samples[int(0.95 * (len(samples) - 1))] * 1000, 2),
+            "max": round(samples[-1] * 1000, 2),
+        }
@@ -0,0 +1,75 @@
+import random
+import numpy as np
+from player import CHORD_THRESHOLD
+
+CORRELATION_LENGTH = 32  # 相关抖动的卷积核长度(和弦数)
+
+BUILTIN_PROFILES = {
+    "均匀": {"onset": {"type": "none"}, "hold": {"type": "uniform"}, "correlation": 0.0},
+    "高斯": {"onset": {"type": "gaussian", "sigma": 6}, "hold": {"type": "gaussian"}, "correlation": 0.0},
+    "连贯": {"onset": {"type": "gaussian", "sigma": 10}, "hold": {"type": "gaussian"}, "correlation": 0.8},
+}
+
+class Humanization:
+    """预先生成的人性化数据，按音符下标给出按下时机偏移(ms)和按住时长(ms)
+
+    只有和弦起始音符位置上的值会被使用，数据已转换为列表，播放循环中只做下标访问。
+    """
+    __slots__ = ("profile", "seed", "onset", "hold")
+
+    def __init__(self, profile, seed, onset, hold):
+        self.profile = profile
+        self.seed = seed
+        self.onset = onset
+        self.hold = hold
+
+def new_seed():
+    """生成新的随机种子，记录下来即可复现同一次演奏"""
+    return random.randrange(1 << 31)
+
+def chord_start_mask(times):
+    """标记每个和弦的起始音符，与播放时的和弦分组规则一致"""
+    times = np.asarray(times, dtype=np.float64)
+    return np.diff(times, prepend=-np.inf) >= CHORD_THRESHOLD
+
+def _sample(rng, spec, count, low, high):
+    """按分布配置采样，low/high 为该分布的取值范围"""
+    kind = spec.get("type", "none")
+    if kind == "uniform":
+        return rng.uniform(spec.get("min", low), spec.get("max", high), count)
+    if kind == "gaussian":
+        mean = spec.get("mean", (low + high) / 2)
+        sigma = spec.get("sigma", (high - low) / 4)
+        return np.clip(rng.normal(mean, sigma, count), spec.get("min", low), spec.get("max", high))
+    return np.full(count, spec.get("value", (low + high) / 2), dtype=np.float64)
+
+def _correlate(noise, correlation):
+    """用指数衰减核平滑噪声，使相邻和弦的偏移相关，同时保持原有方差"""
+    if correlation <= 0 or len(noise) < 2:
+        return noise
+    kernel = correlation ** np.arange(CORRELATION_LENGTH)
+    kernel /= np.sqrt(np.sum(kernel ** 2))
+    return np.convolve(noise, kernel)[:len(noise)]
+
+def precompute_humanization(chart, profile, hold_min, hold_max, seed=None, profile_name=""):
+    """为整首曲谱一次性生成按下时机偏移和按住时长"""
+    seed = new_seed() if seed is None else seed
+    rng = np.random.default_rng(seed)
+    starts = np.flatnonzero(chord_start_mask(chart.times))
+    chord_count = len(starts)
+
+    onset_spec = profile.get("onset", {"type": "none"})
+    sigma = onset_spec.get("sigma", 0)
+    if onset_spec.get("type", "none") == "none":
+        onset = np.zeros(chord_count)
+    else:
+        onset = _sample(rng, dict(onset_spec, mean=0), chord_count, -3 * sigma, 3 * sigma)
+        onset = _correlate(onset, profile.get("correlation", 0.0))
+
+    hold = _sample(rng, profile.get("hold", {"type": "uniform"}), chord_count, hold_min, hold_max)
+
+    note_onset = np.zeros(len(chart))
+    note_hold = np.full(len(chart), float(hold_min))
+    note_onset[starts] = onset
+    note_hold[starts] = hold
+    return Humanization(profile_name, seed, note_onset.tolist(), note_hold.tolist())
@@ -0,0 +1,117 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from analytics import get_chart_analytics, load_analytics_cache, save_analytics_cache
+from dedup import get_fingerprint, load_dedup_cache, save_dedup_cache
+from library import SONGS_FOLDER
+
+class ImportReport:
+    """单个文件的导入结果，记录被丢弃、折叠和无法解析的内容"""
+    def __init__(self, source):
+        self.source = source
+        self.song_name = None
+        self.output_path = None
+        self.note_count = 0
+        self.dropped = 0  # 无法映射到按键而丢弃的音符数
+        self.folded = 0  # 超出音域、按八度折叠进音域的音符数
+        self.merged = 0  # 折叠后与其他音符重合而合并的音符数
+        self.errors = []  # 无法解析的内容说明
+        self.notes = []  # 其他说明
+
+    @property
+    def ok(self):
+        return self.output_path is not None
+
+    def summary(self):
+        name = os.path.basename(self.source)
+        if not self.ok:
+            return f"{name}: 导入失败 - {'; '.join(self.errors) or '没有可用的音符'}"
+        parts = [f"{self.note_count} 个音符"]
+        if self.dropped:
+            parts.append(f"丢弃 {self.dropped}")
+        if self.folded:
+            parts.append(f"八度折叠 {self.folded}")
+        if self.merged:
+            parts.append(f"合并 {self.merged}")
+        if self.errors:
+            parts.append(f"{len(self.errors)} 处无法解析")
+        parts.extend(self.notes)
+        return f"{name} -> {self.song_name}: {', '.join(parts)}"
+
+def unique_song_path(folder, song_name):
+    """生成不与现有曲谱重名的文件路径，重名时依次加 (1)、(2)..."""
+    candidate = song_name
+    index = 1
+    while os.path.exists(os.path.join(folder, candidate + ".json")):
+        candidate = f"{song_name}({index})"
+        index += 1
+    return candidate, os.path.join(folder, candidate + ".json")
+
+def write_song(song_data, folder, song_name):
+    """以 Sky Studio 格式写入曲谱文件，返回 (曲名, 文件路径)"""
+    os.makedirs(folder, exist_ok=True)
+    song_name, file_path = unique_song_path(folder, song_name)
+    tmp_file = file_path + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump([song_data], f, ensure_ascii=False)
+    os.replace(tmp_file, file_path)
+    return song_name, file_path
+
+def convert_file(convert, source):
+    """转换单个文件，convert(source, report) 返回 song_data 或 None，返回 (导入结果, song_data)"""
+    report = ImportReport(source)
+    try:
+        song_data = convert(source, report)
+    except Exception as e:
+        report.errors.append(str(e))
+        song_data = None
+    return report, song_data
+
+def save_import(report, song_data, folder):
+    """写入转换好的曲谱并记录到导入结果中"""
+    if song_data and song_data.get("songNotes"):
+        report.note_count = len(song_data["songNotes"])
+        report.song_name, report.output_path = write_song(song_data, folder, song_data["name"])
+    return report
+
+def import_file(convert, source, folder=SONGS_FOLDER):
+    """转换并写入单个文件"""
+    report = save_import(*convert_file(convert, source), folder)
+    update_library_index([report])
+    return report
+
+def update_library_index(reports):
+    """将新导入的曲谱写入统计和指纹缓存，曲库列表下次刷新时即可直接使用"""
+    load_analytics_cache()
+    load_dedup_cache()
+    for report in reports:
+        if report.ok:
+            get_chart_analytics(report.output_path)
+            get_fingerprint(report.output_path)
+    save_analytics_cache()
+    save_dedup_cache()
+
+def batch_import(convert, sources, folder=SONGS_FOLDER, workers=None):
+    """用进程池批量导入，返回 (导入结果列表, 耗时)
+
+    写入文件在主进程中按顺序进行，避免多个进程同时为重名曲谱分配文件名。
+    """
+    started = time.perf_counter()
+    sources = list(sources)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        converted = list(executor.map(convert_file, [convert] * len(sources), sources, chunksize=8))
+    reports = [save_import(report, song_data, folder) for report, song_data in converted]
+    update_library_index(reports)
+    return reports, time.perf_counter() - started
+
+def find_sources(paths, extensions):
+    """展开文件和文件夹参数，返回指定扩展名的文件列表"""
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                sources.extend(os.path.join(root, name) for name in sorted(files) if name.lower().endswith(extensions))
+        elif path.lower().endswith(extensions):
+            sources.append(path)
+    return sources
@@ -0,0 +1,440 @@
+"""曲库索引和归档
+
+曲库可以由多个根目录组成(见 Library)，每个根目录下的散装曲谱、.skylib 归档和 zip 压缩包合并为一个索引。
+
+把整个曲谱文件夹打包为一个 .skylib 文件，每首曲谱单独压缩为一个数据块，文件头记录索引的位置：
+
+    文件头  8字节标识 + 索引偏移(8字节) + 索引长度(8字节)
+    数据块  每首曲谱转为 UTF-8 后单独 zlib 压缩
+    索引    zlib 压缩的 JSON {成员名: [偏移, 压缩长度, 原始长度, crc32]}
+
+打开归档时只读取文件头和索引，之后任意一首曲谱都可以直接定位到数据块解压，不需要扫描整个归档。
+归档内的曲谱用 "归档路径/曲名.json" 形式的路径表示，load_json 和各类缓存可以像普通文件一样使用。
+zip 压缩包也按同样方式只读加载，成员列表来自 zip 的中央目录，曲谱在用到时才解压。
+"""
+import hashlib
+import json
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+SONGS_FOLDER = "score/score/"
+ARCHIVE_FOLDER = "score"  # 默认放置曲库归档和 zip 压缩包的目录
+DEFAULT_ROOTS = [SONGS_FOLDER, ARCHIVE_FOLDER]  # 默认的曲库根目录，可在 settings.json 的 library_roots 中修改
+ARCHIVE_EXTENSION = ".skylib"
+ZIP_EXTENSION = ".zip"
+ARCHIVE_EXTENSIONS = (ARCHIVE_EXTENSION, ZIP_EXTENSION)
+SONG_EXTENSIONS = (".json", ".txt")  # 可以作为曲谱加载的文件
+TEXT_EXTENSION = ".txt"  # .txt 可能是 JSON 曲谱，也可能是字母谱，需要检查内容
+CHART_HEAD_PATTERN = re.compile(rb"\s*(?:\{|\[\s*\{)")
+SNIFF_SIZE = 64
+ARCHIVE_PATH_PATTERN = re.compile(r"\.(?:skylib|zip)/", re.IGNORECASE)
+ARCHIVE_MAGIC = b"SKYLIB\x00\x01"
+HEADER = struct.Struct("<8sQQ")
+COMPRESS_LEVEL = 9
+
+class LibraryArchive:
+    """只读的曲库归档，打开时加载索引，按成员名随机读取"""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "rb")
+        try:
+            magic, index_offset, index_size = HEADER.unpack(self._file.read(HEADER.size))
+            if magic != ARCHIVE_MAGIC:
+                raise ValueError(f"不是有效的曲库归档: {path}")
+            self._file.seek(index_offset)
+            self.index = {name: tuple(entry) for name, entry in json.loads(zlib.decompress(self._file.read(index_size))).items()}
+        except Exception:
+            self._file.close()
+            raise
+        self.stat = os.stat(path)
+
+    def names(self):
+        """归档内的成员名，如 曲名.json"""
+        return list(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def signature(self, name):
+        """成员的内容签名 [crc32, 原始长度]，重新打包后内容不变的曲谱缓存依然有效"""
+        _, _, raw_size, crc = self.index[name]
+        return [crc, raw_size]
+
+    def head(self, name, size=SNIFF_SIZE):
+        """只解压成员开头的 size 字节，用于检查内容类型"""
+        offset, block_size, _, _ = self.index[name]
+        with self._lock:
+            self._file.seek(offset)
+            block = self._file.read(block_size)
+        return zlib.decompressobj().decompress(block, size)
+
+    def read(self, name):
+        """读取并解压一个成员，返回原始字节"""
+        offset, size, raw_size, crc = self.index[name]
+        with self._lock:
+            self._file.seek(offset)
+            block = self._file.read(size)
+        try:
+            data = zlib.decompress(block)
+        except zlib.error:
+            data = None
+        if data is None or len(data) != raw_size or zlib.crc32(data) != crc:
+            raise ValueError(f"曲库归档数据损坏: {name}")
+        return data
+
+    def close(self):
+        self._file.close()
+
+class ZipArchive:
+    """只读的 zip 曲谱压缩包，与 LibraryArchive 接口相同
+
+    打开时 zipfile 只读取中央目录，成员在 read 时才解压。
+    没有 UTF-8 标记的文件名按 GBK 解码，兼容 Windows 上打包的中文文件名。
+    """
+    def __init__(self, path):
+        self.path = path
+        self._zip = zipfile.ZipFile(path)
+        self.index = {}
+        for info in self._zip.infolist():
+            if info.is_dir():
+                continue
+            name = info.filename
+            if not info.flag_bits & 0x800:
+                try:
+                    name = name.encode("cp437").decode("gbk")
+                except (UnicodeEncodeError, UnicodeDecodeError):
+                    pass
+            if name.startswith("__MACOSX/") or not name.lower().endswith(SONG_EXTENSIONS):
+                continue
+            self.index[name] = info
+        self.stat = os.stat(path)
+
+    def names(self):
+        """压缩包内的曲谱成员名，可能包含子目录，如 合集/曲名.json"""
+        return list(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def signature(self, name):
+        """成员的内容签名 [crc32, 原始长度]"""
+        info = self.index[name]
+        return [info.CRC, info.file_size]
+
+    def head(self, name, size=SNIFF_SIZE):
+        """只解压成员开头的 size 字节，用于检查内容类型"""
+        with self._zip.open(self.index[name]) as f:
+            return f.read(size)
+
+    def read(self, name):
+        """解压一个成员，返回原始字节，crc 由 zipfile 校验"""
+        return self._zip.read(self.index[name])
+
+    def close(self):
+        self._zip.close()
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+def open_archive(path):
+    """返回已打开的归档，文件被替换后自动重新打开"""
+    key = os.path.abspath(path)
+    stat = os.stat(path)
+    with _archives_lock:
+        archive = _archives.get(key)
+        if archive is not None and (archive.stat.st_mtime_ns, archive.stat.st_size) == (stat.st_mtime_ns, stat.st_size):
+            return archive
+        if archive is not None:
+            archive.close()
+        archive_class = ZipArchive if path.lower().endswith(ZIP_EXTENSION) else LibraryArchive
+        archive = _archives[key] = archive_class(path)
+        return archive
+
+def split_archive_path(path):
+    """把 归档路径/成员名 拆分为 (归档路径, 成员名)，普通文件路径返回 None"""
+    normalized = path.replace("\\", "/")
+    match = ARCHIVE_PATH_PATTERN.search(normalized)
+    if match is None:
+        return None
+    end = match.end() - 1
+    return path[:end], normalized[end + 1:]
+
+def is_archive_member(path):
+    return split_archive_path(path) is not None
+
+def read_file(path):
+    """读取普通文件或归档成员的全部字节"""
+    member = split_archive_path(path)
+    if member is None:
+        with open(path, "rb") as f:
+            return f.read()
+    archive_path, name = member
+    try:
+        return open_archive(archive_path).read(name)
+    except KeyError:
+        raise FileNotFoundError(f"归档中没有该曲谱: {path}") from None
+
+def path_signature(path):
+    """普通文件返回 [修改时间, 大小]，归档成员返回 [crc32, 原始长度]，不存在时抛出 OSError"""
+    member = split_archive_path(path)
+    if member is None:
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+    archive_path, name = member
+    archive = open_archive(archive_path)
+    if name not in archive:
+        raise FileNotFoundError(f"归档中没有该曲谱: {path}")
+    return archive.signature(name)
+
+def looks_like_chart(head):
+    """根据文件开头判断是否为 JSON 曲谱，兼容 UTF-8 BOM 和 UTF-16"""
+    head = head.replace(b"\x00", b"")
+    for bom in (b"\xef\xbb\xbf", b"\xff\xfe", b"\xfe\xff"):
+        if head.startswith(bom):
+            head = head[len(bom):]
+            break
+    return CHART_HEAD_PATTERN.match(head) is not None
+
+def chart_id(root, relative_path):
+    """曲谱的稳定编号，只由曲库根目录和曲谱在其中的相对路径决定，与扫描顺序和其他根目录无关"""
+    key = os.path.normcase(os.path.normpath(root)) + "\0" + relative_path.replace("\\", "/")
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+def scan_root(root):
+    """扫描一个曲库根目录，返回 [(相对路径, 路径)]，包括散装曲谱和目录下归档中的曲谱
+
+    只列出文件名，不读取曲谱内容；.txt 只读取开头检查是否为 JSON 曲谱，字母谱需要先用 text_import 导入。
+    无法打开的归档会被跳过并打印原因。
+    """
+    songs = []
+    archives = []
+    with os.scandir(root) as entries:
+        for entry in sorted(entries, key=lambda entry: entry.name):
+            name = entry.name.lower()
+            if name.endswith(SONG_EXTENSIONS) and entry.is_file():
+                if name.endswith(TEXT_EXTENSION) and not _sniff(lambda: _read_head(entry.path)):
+                    continue
+                songs.append((entry.name, entry.path))
+            elif name.endswith(ARCHIVE_EXTENSIONS) and entry.is_file():
+                archives.append(entry)
+    for entry in archives:
+        try:
+            archive = open_archive(entry.path)
+        except (OSError, ValueError, zlib.error, zipfile.BadZipFile) as e:
+            print(f"打开曲库归档失败: {entry.path}: {e}")
+            continue
+        songs.extend((f"{entry.name}/{name}", f"{entry.path}/{name}") for name in sorted(archive.names())
+                     if name.lower().endswith(SONG_EXTENSIONS)
+                     and (not name.lower().endswith(TEXT_EXTENSION) or _sniff(lambda: archive.head(name))))
+    return songs
+
+def _read_head(path):
+    with open(path, "rb") as f:
+        return f.read(SNIFF_SIZE)
+
+def _sniff(read_head):
+    try:
+        return looks_like_chart(read_head())
+    except (OSError, ValueError, zlib.error, zipfile.BadZipFile):
+        return False
+
+class LibraryEntry:
+    """曲库索引中的一首曲谱，title 是列表中显示的名称，在整个曲库中唯一"""
+    __slots__ = ("id", "title", "name", "root", "path")
+
+    def __init__(self, chart_id, title, name, root, path):
+        self.id = chart_id
+        self.title = title
+        self.name = name
+        self.root = root
+        self.path = path
+
+    def __repr__(self):
+        return f"LibraryEntry({self.id!r}, {self.title!r}, {self.path!r})"
+
+class Library:
+    """由多个根目录合并而成的曲库索引
+
+    索引在第一次使用时才建立，各根目录在线程池中互不影响地并行扫描，
+    某个根目录不可用(例如网络共享未挂载)时只记录错误，其余根目录照常加载。
+    不同根目录中的同名曲谱都会保留，后出现的标题加上根目录名区分。
+    """
+    def __init__(self, roots=None, workers=None):
+        self.roots = [root for root in (roots or DEFAULT_ROOTS) if root]
+        self.workers = workers
+        self.errors = []  # [(根目录, 原因)]
+        self.elapsed = 0.0
+        self._entries = None
+        self._titles = {}
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        """重新扫描所有根目录"""
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers or len(self.roots) or 1) as executor:
+            futures = [executor.submit(scan_root, root) for root in self.roots]
+        entries = {}
+        titles = {}
+        errors = []
+        for root, future in zip(self.roots, futures):
+            try:
+                songs = future.result()
+            except OSError as e:
+                errors.append((root, str(e)))
+                continue
+            label = os.path.basename(os.path.normpath(root)) or root
+            for relative_path, path in songs:
+                name = os.path.splitext(os.path.basename(relative_path))[0]
+                title = name
+                index = 1
+                while title in titles:
+                    title = f"{name} [{label}]" if index == 1 else f"{name} [{label} {index}]"
+                    index += 1
+                entry = LibraryEntry(chart_id(root, relative_path), title, name, root, path)
+                entries[entry.id] = entry
+                titles[title] = entry
+        with self._lock:
+            self._entries = entries
+            self._titles = titles
+            self.errors = errors
+            self.elapsed = time.perf_counter() - started
+        return self
+
+    def _ensure(self):
+        if self._entries is None:
+            self.refresh()
+
+    def __len__(self):
+        self._ensure()
+        return len(self._entries)
+
+    def entries(self):
+        """按根目录顺序排列的所有曲谱"""
+        self._ensure()
+        return list(self._entries.values())
+
+    def get(self, chart_id):
+        self._ensure()
+        return self._entries.get(chart_id)
+
+    def find(self, title):
+        """按显示标题查找，标题取决于根目录顺序，只用于显示和迁移旧数据，保存时应使用 id"""
+        self._ensure()
+        return self._titles.get(title)
+
+    def titles(self):
+        self._ensure()
+        return list(self._titles)
+
+    def song_files(self):
+        """{标题: 路径}，供统计和查重使用"""
+        self._ensure()
+        return {title: entry.path for title, entry in self._titles.items()}
+
+    def search(self, text, limit=None):
+        """按标题搜索，忽略大小写"""
+        text = text.lower()
+        matches = [entry for entry in self.entries() if text in entry.title.lower()]
+        return matches[:limit] if limit else matches
+
+    def first_folder(self):
+        """第一个存在的根目录，用于打开文件夹等操作"""
+        return next((root for root in self.roots if os.path.isdir(root)), None)
+
+def normalize_text(raw_data):
+    """把曲谱转为 UTF-8，UTF-16 曲谱的体积可以减半；无法识别编码的保持原样"""
+    from utils import detect_encoding
+    try:
+        return raw_data.decode(detect_encoding(raw_data) or "utf-8").encode("utf-8")
+    except (UnicodeDecodeError, LookupError):
+        return raw_data
+
+def pack_library(songs_folder, archive_path, level=COMPRESS_LEVEL):
+    """把文件夹中的曲谱打包为归档，返回 (曲谱数, 原始大小, 归档大小, 耗时)"""
+    started = time.perf_counter()
+    index = {}
+    raw_total = 0
+    tmp_file = archive_path + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(HEADER.pack(ARCHIVE_MAGIC, 0, 0))
+        for filename in sorted(os.listdir(songs_folder)):
+            if not filename.endswith(".json"):
+                continue
+            with open(os.path.join(songs_folder, filename), "rb") as song_file:
+                raw_data = song_file.read()
+            raw_total += len(raw_data)
+            data = normalize_text(raw_data)
+            block = zlib.compress(data, level)
+            index[filename] = [f.tell(), len(block), len(data), zlib.crc32(data)]
+            f.write(block)
+        index_offset = f.tell()
+        index_block = zlib.compress(json.dumps(index, ensure_ascii=False).encode("utf-8"), level)
+        f.write(index_block)
+        f.seek(0)
+        f.write(HEADER.pack(ARCHIVE_MAGIC, index_offset, len(index_block)))
+    os.replace(tmp_file, archive_path)
+    return len(index), raw_total, os.path.getsize(archive_path), time.perf_counter() - started
+
+def extract_library(archive_path, songs_folder):
+    """把归档中的曲谱解压到文件夹，已存在的同名文件不覆盖，返回解压的曲谱数"""
+    archive = LibraryArchive(archive_path)
+    os.makedirs(songs_folder, exist_ok=True)
+    count = 0
+    try:
+        for name in archive.names():
+            if os.path.basename(name) != name:
+                continue
+            file_path = os.path.join(songs_folder, name)
+            if os.path.exists(file_path):
+                continue
+            with open(file_path, "wb") as f:
+                f.write(archive.read(name))
+            count += 1
+    finally:
+        archive.close()
+    return count
+
+def main():
+    args = sys.argv[1:]
+    if len(args) >= 2 and args[0] == "pack":
+        archive_path = args[2] if len(args) > 2 else os.path.join(ARCHIVE_FOLDER, "library" + ARCHIVE_EXTENSION)
+        count, raw_size, packed_size, elapsed = pack_library(args[1], archive_path)
+        print(f"已打包 {count} 首曲谱: {raw_size / 1048576:.1f}MB -> {packed_size / 1048576:.1f}MB, 耗时 {elapsed:.2f}秒")
+    elif len(args) == 3 and args[0] == "extract":
+        print(f"已解压 {extract_library(args[1], args[2])} 首曲谱")
+    elif len(args) == 2 and args[0] == "list":
+        archive = open_archive(args[1])
+        for name in sorted(archive.names()):
+            print(f"{archive.signature(name)[1]:>10}  {name}")
+        print(f"共 {len(archive)} 首")
+    elif args and args[0] == "scan":
+        library = Library(args[1:] or None).refresh()
+        errors = dict(library.errors)
+        for root in library.roots:
+            if root in errors:
+                print(f"{root}: 扫描失败 - {errors[root]}")
+            else:
+                print(f"{root}: {sum(1 for entry in library.entries() if entry.root == root)} 首")
+        print(f"共 {len(library)} 首, 耗时 {library.elapsed:.3f}秒")
+    else:
+        print("用法: python library.py pack <曲谱文件夹> [归档文件]")
+        print("      python library.py extract <归档文件> <曲谱文件夹>")
+        print("      python library.py list <归档文件或zip压缩包>")
+        print("      python library.py scan [曲库根目录]...")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,81 @@
+import threading
+import time
 import tkinter as tk
+from collections import deque
 from tkinter import ttk
 
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+LEVEL_NAMES = {"debug": "调试", "info": "信息", "warning": "警告", "error": "错误"}
+LOG_CAPACITY = 2000  # 环形缓冲区保留的日志条数
+LOG_FLUSH_INTERVAL = 100  # 日志界面批量刷新间隔(ms)
+
+def level_value(level):
+    """日志级别对应的数值，未知级别按 info 处理，兼容旧的 'log' 级别"""
+    return LOG_LEVELS.get(level, LOG_LEVELS["info"])
+
+class LogBuffer:
+    """线程安全的日志环形缓冲区
+
+    任意线程都可以调用 log，界面定时调用 drain 取出新日志批量显示。
+    缓冲区和待显示队列都有上限，超出时丢弃最旧的日志，因此长时间运行内存不会增长。
+    """
+    def __init__(self, capacity=LOG_CAPACITY, level="debug", echo=False):
+        self.capacity = capacity
+        self.level = level_value(level)
+        self.echo = echo
+        self._entries = deque(maxlen=capacity)
+        self._pending = deque(maxlen=capacity)
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    def log(self, message, level="info"):
+        """记录一条日志，低于缓冲区级别的日志直接忽略"""
+        if level_value(level) < self.level:
+            return
+        entry = (time.time(), level, str(message))
+        with self._lock:
+            self._entries.append(entry)
+            if len(self._pending) == self._pending.maxlen:
+                self._dropped += 1
+            self._pending.append(entry)
+        if self.echo:
+            print(message)
+
+    def drain(self):
+        """取出上次调用以来的新日志，返回 (日志列表, 因积压被丢弃的条数)"""
+        with self._lock:
+            entries = list(self._pending)
+            self._pending.clear()
+            dropped, self._dropped = self._dropped, 0
+        return entries, dropped
+
+    def entries(self, level="debug"):
+        """缓冲区中不低于指定级别的全部日志"""
+        minimum = level_value(level)
+        with self._lock:
+            return [entry for entry in self._entries if level_value(entry[1]) >= minimum]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._pending.clear()
+            self._dropped = 0
+
+def format_entry(entry):
+    """格式化一条日志用于显示"""
+    timestamp, level, message = entry
+    prefix = time.strftime("%H:%M:%S", time.localtime(timestamp))
+    if level_value(level) >= LOG_LEVELS["warning"]:
+        return f"{prefix} [{LEVEL_NAMES.get(level, level)}] {message}"
+    return f"{prefix} {message}"
+
 class LogWindow:
-    def __init__(self, root):
+    def __init__(self, root, buffer=None, max_lines=LOG_CAPACITY):
         self.root = root
+        self.buffer = buffer or LogBuffer()
+        self.max_lines = max_lines
         self.setup_ui()
+        self.root.after(LOG_FLUSH_INTERVAL, self.flush)
 
     def setup_ui(self):
         """设置UI"""
@@ -20,11 +91,25 @@ class LogWindow:
         self.text_widget.tag_configure('error', foreground='red')
 
     def log(self, message, level='log'):
-        """记录日志"""
-        self.text_widget.config(state='normal')
-        self.text_widget.insert(tk.END, message + '\n', level)
-        self.text_widget.config(state='disabled')
-        self.text_widget.yview(tk.END)
+        """记录日志，可在任意线程调用，界面定时批量刷新"""
+        self.buffer.log(message, 'info' if level == 'log' else level)
+
+    def flush(self):
+        """将积累的日志一次性写入文本框，并删除超出上限的旧行"""
+        entries, dropped = self.buffer.drain()
+        if entries or dropped:
+            self.text_widget.config(state='normal')
+            if dropped:
+                self.text_widget.insert(tk.END, f"... 省略 {dropped} 条日志\n", 'error')
+            for entry in entries:
+                tag = 'error' if level_value(entry[1]) >= LOG_LEVELS["warning"] else 'log'
+                self.text_widget.insert(tk.END, format_entry(entry) + '\n', tag)
+            line_count = int(self.text_widget.index('end-1c').split('.')[0])
+            if line_count > self.max_lines:
+                self.text_widget.delete('1.0', f"{line_count - self.max_lines + 1}.0")
+            self.text_widget.config(state='disabled')
+            self.text_widget.yview(tk.END)
+        self.root.after(LOG_FLUSH_INTERVAL, self.flush)
 
     def close(self):
         """关闭日志窗口"""
@@ -35,4 +120,4 @@ def show_log_window():
     root = tk.Tk()
     root.title("日志")
     log_window = LogWindow(root)
-    return root, log_window
\ No newline at end of file
+    return root, log_window
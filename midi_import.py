@@ -0,0 +1,199 @@
+import os
+import struct
+import sys
+import numpy as np
+from importer import batch_import, find_sources, SONGS_FOLDER
+
+MIDI_EXTENSIONS = (".mid", ".midi")
+DEFAULT_TEMPO = 500000  # MIDI 默认速度(微秒/四分音符)，即 120 BPM
+DRUM_CHANNEL = 9  # 打击乐通道，没有音高，不导入
+BASE_NOTE = 60  # pitchLevel 为 0 时 1Key0 对应的 MIDI 音高(C4)
+SCALE_STEPS = (0, 2, 4, 5, 7, 9, 11, 12, 14, 16, 17, 19, 21, 23, 24)  # 15个按键对应的C大调音阶(半音)
+OCTAVE_SHIFTS = range(-3, 4)  # 移调搜索的八度范围
+QUANTIZE_MS = 10  # 音符时间量化到的最小单位(ms)
+
+# 相对音域起点的半音数 -> 按键序号，不在音阶上的为 -1
+STEP_TO_KEY = np.full(25, -1, dtype=np.int64)
+STEP_TO_KEY[list(SCALE_STEPS)] = np.arange(len(SCALE_STEPS))
+IN_SCALE = np.zeros(12, dtype=bool)
+IN_SCALE[[step % 12 for step in SCALE_STEPS]] = True
+
+def _read_varlen(data, pos):
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+
+def read_midi_header(data):
+    """解析 MIDI 文件头，返回 (音轨数, 时间单位, 第一个音轨的位置)"""
+    if data[:4] != b"MThd":
+        raise ValueError("不是有效的 MIDI 文件")
+    header_length, _, track_count, division = struct.unpack(">IHHh", data[4:14])
+    return track_count, division, 8 + header_length
+
+def iter_midi_events(data):
+    """逐个事件流式解析 MIDI 数据，依次产生 ("note", tick, channel, note) 和 ("tempo", tick, 微秒/四分音符)
+
+    只处理 note-on(力度大于0) 和速度变化事件，其余事件直接跳过，不在内存中保存事件列表。
+    """
+    track_count, _, pos = read_midi_header(data)
+    for _ in range(track_count):
+        if data[pos:pos + 4] != b"MTrk":
+            raise ValueError("MIDI 音轨数据损坏")
+        track_length = struct.unpack(">I", data[pos + 4:pos + 8])[0]
+        pos += 8
+        end = pos + track_length
+        tick = 0
+        status = 0
+        while pos < end:
+            delta, pos = _read_varlen(data, pos)
+            tick += delta
+            byte = data[pos]
+            if byte & 0x80:
+                status = byte
+                pos += 1
+            elif not status:
+                raise ValueError("MIDI 事件缺少状态字节")
+            kind = status & 0xF0
+            if status == 0xFF:
+                meta_type = data[pos]
+                length, pos = _read_varlen(data, pos + 1)
+                if meta_type == 0x51 and length == 3:
+                    yield ("tempo", tick, int.from_bytes(data[pos:pos + 3], "big"))
+                pos += length
+                status = 0
+            elif status in (0xF0, 0xF7):
+                length, pos = _read_varlen(data, pos)
+                pos += length
+                status = 0
+            elif kind in (0xC0, 0xD0):
+                pos += 1
+            else:
+                if kind == 0x90 and data[pos + 1] > 0:
+                    yield ("note", tick, status & 0x0F, data[pos])
+                pos += 2
+        pos = end
+
+def midi_note_times(data):
+    """解析 MIDI，返回按时间排序的 (时间ms数组, 音高数组, 初始BPM)，打击乐通道被忽略"""
+    _, division, _ = read_midi_header(data)
+    tempo_changes = []
+    ticks = []
+    notes = []
+    for event in iter_midi_events(data):
+        if event[0] == "note":
+            if event[2] != DRUM_CHANNEL:
+                ticks.append(event[1])
+                notes.append(event[3])
+        else:
+            tempo_changes.append((event[1], event[2]))
+    ticks = np.asarray(ticks, dtype=np.float64)
+    notes = np.asarray(notes, dtype=np.int64)
+    tempo_changes.sort()
+
+    if division < 0:
+        # SMPTE 时间格式：高字节为每秒帧数(负数)，低字节为每帧 tick 数
+        frames = -(division >> 8)
+        ms = ticks * 1000 / (frames * (division & 0xFF))
+    else:
+        # 按速度变化分段把 tick 换算为 ms
+        segment_ticks = [0]
+        segment_tempos = [DEFAULT_TEMPO]
+        for tick, tempo in tempo_changes:
+            if tick == segment_ticks[-1]:
+                segment_tempos[-1] = tempo
+            else:
+                segment_ticks.append(tick)
+                segment_tempos.append(tempo)
+        segment_ticks = np.asarray(segment_ticks, dtype=np.float64)
+        ms_per_tick = np.asarray(segment_tempos, dtype=np.float64) / 1000 / division
+        segment_ms = np.concatenate([[0.0], np.cumsum(np.diff(segment_ticks) * ms_per_tick[:-1])])
+        segment = np.searchsorted(segment_ticks, ticks, side="right") - 1
+        ms = segment_ms[segment] + (ticks - segment_ticks[segment]) * ms_per_tick[segment]
+
+    bpm = round(60000000 / (tempo_changes[0][1] if tempo_changes and tempo_changes[0][0] == 0 else DEFAULT_TEMPO))
+    order = np.argsort(ms, kind="stable")
+    return ms[order], notes[order], bpm
+
+def best_transposition(notes):
+    """搜索使最多音符落在音阶上、其次最多落在音域内的 (pitchLevel, 八度偏移)"""
+    best = None
+    for pitch_level in range(12):
+        in_scale = IN_SCALE[(notes - BASE_NOTE - pitch_level) % 12]
+        scale_count = int(in_scale.sum())
+        for octave in OCTAVE_SHIFTS:
+            relative = notes - BASE_NOTE - pitch_level - 12 * octave
+            in_range = int((in_scale & (relative >= 0) & (relative <= SCALE_STEPS[-1])).sum())
+            score = (scale_count, in_range, -abs(octave), -pitch_level)
+            if best is None or score > best[0]:
+                best = (score, pitch_level, octave)
+    return best[1], best[2]
+
+def quantize_notes(times, notes, report=None):
+    """把音符映射到15个按键，返回 (pitchLevel, 时间数组, 按键数组)
+
+    不在音阶上的音符丢弃，超出音域的按八度折叠进音域，折叠后同一时间同一按键的音符合并。
+    """
+    if not len(notes):
+        return 0, times, notes
+    pitch_level, octave = best_transposition(notes)
+    relative = notes - BASE_NOTE - pitch_level - 12 * octave
+    in_scale = IN_SCALE[relative % 12]
+    top = SCALE_STEPS[-1]
+    out_of_range = in_scale & ((relative < 0) | (relative > top))
+    # 低于音域的折叠到最低八度，高于音域的折叠到最高八度
+    folded = np.where(relative < 0, relative % 12, np.where(relative > top, relative % 12 + 12, relative))
+    keys = STEP_TO_KEY[np.clip(folded, 0, top)]
+    keep = in_scale & (keys >= 0)
+
+    times = np.round(times[keep] / QUANTIZE_MS) * QUANTIZE_MS
+    keys = keys[keep]
+    unique = np.unique(np.stack([times, keys]), axis=1)
+    if report is not None:
+        report.dropped += int((~in_scale).sum())
+        report.folded += int(out_of_range.sum())
+        report.merged += int(len(keys) - unique.shape[1])
+        report.notes.append(f"pitchLevel {pitch_level}, 八度偏移 {octave:+d}")
+    return pitch_level, unique[0], unique[1].astype(np.int64)
+
+def convert_midi(file_path, report=None):
+    """将 MIDI 文件转换为 Sky Studio 曲谱数据"""
+    with open(file_path, "rb") as f:
+        data = f.read()
+    times, notes, bpm = midi_note_times(data)
+    if not len(notes):
+        if report is not None:
+            report.errors.append("没有找到音符")
+        return None
+    pitch_level, times, keys = quantize_notes(times, notes, report)
+    if not len(times):
+        if report is not None:
+            report.errors.append("没有可以映射到按键的音符")
+        return None
+    times -= times[0]
+    return {
+        "name": os.path.splitext(os.path.basename(file_path))[0],
+        "author": "MIDI 导入",
+        "bpm": bpm,
+        "bitsPerPage": 16,
+        "pitchLevel": pitch_level,
+        "isComposed": True,
+        "isEncrypted": False,
+        "songNotes": [{"time": int(t), "key": f"1Key{k}"} for t, k in zip(times.tolist(), keys.tolist())],
+    }
+
+def main():
+    paths = sys.argv[1:]
+    if not paths:
+        print("用法: python midi_import.py <MIDI文件或文件夹>...")
+        return
+    reports, elapsed = batch_import(convert_midi, find_sources(paths, MIDI_EXTENSIONS), SONGS_FOLDER)
+    for report in reports:
+        print(report.summary())
+    print(f"导入完成: 成功 {sum(report.ok for report in reports)}/{len(reports)}, 耗时 {elapsed:.2f}秒")
+
+if __name__ == "__main__":
+    main()
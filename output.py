@@ -0,0 +1,114 @@
+import statistics
+import threading
+import time
+import keyboard
+from utils import release_all_keys
+
+PROBE_KEY = "f24"  # 校准时用于探测的按键，游戏内没有绑定
+DEFAULT_PROFILE = "默认"
+
+class KeyboardOutput:
+    """通过 keyboard 库向系统注入按键"""
+    def __init__(self):
+        self._hooks = {}
+
+    def press(self, key):
+        keyboard.press(key)
+
+    def release(self, key):
+        keyboard.release(key)
+
+    def release_all(self):
+        """释放所有已映射的按键"""
+        release_all_keys()
+
+    def add_listener(self, callback):
+        """监听按键到达系统输入队列的事件，callback(按键名, 到达时间)"""
+        self._hooks[callback] = keyboard.hook(
+            lambda event: event.event_type == keyboard.KEY_DOWN and callback(event.name, time.perf_counter())
+        )
+
+    def remove_listener(self, callback):
+        hook = self._hooks.pop(callback, None)
+        if hook is not None:
+            keyboard.unhook(hook)
+
+class SimulatedOutput:
+    """模拟输出后端，按键在固定延迟后才到达，用于测试延迟校准和补偿"""
+    def __init__(self, delay_ms=0.0):
+        self.delay_ms = delay_ms
+        self.events = []  # [(到达时间, 事件类型, 按键)]
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def _deliver(self, event_type, key):
+        arrival = time.perf_counter() + self.delay_ms / 1000
+        with self._lock:
+            self.events.append((arrival, event_type, key))
+        if event_type == "down":
+            for callback in list(self._listeners):
+                threading.Timer(self.delay_ms / 1000, callback, (key, arrival)).start()
+
+    def press(self, key):
+        self._deliver("down", key)
+
+    def release(self, key):
+        self._deliver("up", key)
+
+    def release_all(self):
+        pass
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+class RecordingOutput:
+    """记录输出后端，不发送任何按键，只按时钟记录 (时间ms, 事件类型, 按键)，用于模拟回放"""
+    def __init__(self, clock):
+        self.clock = clock
+        self.events = []
+
+    def press(self, key):
+        self.events.append((round(self.clock.now() * 1000, 3), "down", key))
+
+    def release(self, key):
+        self.events.append((round(self.clock.now() * 1000, 3), "up", key))
+
+    def release_all(self):
+        self.events.append((round(self.clock.now() * 1000, 3), "release_all", ""))
+
+def measure_latency(output, samples=10, probe_key=PROBE_KEY, timeout=1.0):
+    """测量输出后端从调用 press 到按键到达的延迟，返回中位数(ms)，全部超时返回 None"""
+    arrived = threading.Event()
+    arrival_time = [0.0]
+
+    def on_key(key, timestamp):
+        if key == probe_key:
+            arrival_time[0] = timestamp
+            arrived.set()
+
+    measurements = []
+    output.add_listener(on_key)
+    try:
+        for _ in range(samples):
+            arrived.clear()
+            sent = time.perf_counter()
+            output.press(probe_key)
+            if arrived.wait(timeout):
+                measurements.append((arrival_time[0] - sent) * 1000)
+            output.release(probe_key)
+            time.sleep(0.02)
+    finally:
+        output.remove_listener(on_key)
+    return round(statistics.median(measurements), 2) if measurements else None
+
+def parse_latency_profiles(settings):
+    """解析延迟配置，返回 (当前配置名, {配置名: 延迟ms})"""
+    try:
+        profiles = {name: float(value) for name, value in settings.get("profiles", {}).items()}
+        return settings.get("profile", DEFAULT_PROFILE), profiles or {DEFAULT_PROFILE: 0.0}
+    except (ValueError, TypeError, AttributeError):
+        return DEFAULT_PROFILE, {DEFAULT_PROFILE: 0.0}
@@ -0,0 +1,200 @@
+import math
+import numpy as np
+from PyQt6.QtWidgets import QWidget, QLabel
+from PyQt6.QtCore import Qt, QTimer, QRectF, pyqtSignal
+from PyQt6.QtGui import QPainter, QColor, QPixmap, QPen
+
+KEY_COUNT = 15
+BASE_BUCKET_MS = 10  # 最精细一级的时间桶宽度(ms)，之后每级翻倍
+NOTE_DRAW_MS = 80  # 逐个绘制音符时每个音符的显示宽度(ms)
+DEFAULT_MS_PER_PIXEL = 20.0
+MIN_MS_PER_PIXEL = 1.0
+FRAME_INTERVAL = 16  # 跟随播放时的刷新间隔(ms)，约 60fps
+BACKGROUND_COLOR = QColor("#252525")
+LANE_COLOR = QColor("#2d2d2d")
+NOTE_COLOR = QColor("#4CAF50")
+PLAYHEAD_COLOR = QColor("#ff5252")
+
+class NoteLevels:
+    """按细节层级预先汇总的音符网格
+
+    第 n 级把时间按 BASE_BUCKET_MS * 2^n 分桶，每个桶记录15个按键的音符数。
+    缩小显示时选择桶宽不小于一个像素的层级，绘制的方块数只与控件宽度有关，与音符总数无关。
+    """
+    def __init__(self, chart):
+        times = np.frombuffer(chart.times, dtype=np.float64)
+        self.first_time = float(times[0]) if len(times) else 0.0
+        self.times = times - self.first_time
+        self.keys = (np.frombuffer(chart.keys, dtype=np.uint8) % KEY_COUNT).astype(np.int64)
+        self.duration = float(self.times[-1]) if len(times) else 0.0
+        self.levels = []
+        buckets = (self.times // BASE_BUCKET_MS).astype(np.int64)
+        bucket_count = int(buckets[-1]) + 1 if len(times) else 1
+        grid = np.bincount(buckets * KEY_COUNT + self.keys, minlength=bucket_count * KEY_COUNT)
+        grid = grid.reshape(bucket_count, KEY_COUNT).astype(np.uint32)
+        while True:
+            self.levels.append(grid)
+            if len(grid) <= 1:
+                break
+            if len(grid) % 2:
+                grid = np.vstack([grid, np.zeros((1, KEY_COUNT), dtype=np.uint32)])
+            grid = grid[0::2] + grid[1::2]
+
+    def __len__(self):
+        return len(self.times)
+
+    def level_for(self, ms_per_pixel):
+        """选择桶宽不小于一个像素的最精细层级"""
+        level = max(0, math.ceil(math.log2(max(ms_per_pixel, 1e-9) / BASE_BUCKET_MS)))
+        return min(level, len(self.levels) - 1)
+
+    def notes_in(self, start_ms, end_ms):
+        """时间范围内的单个音符 (时间数组, 按键数组)，时间相对第一个音符"""
+        first, last = np.searchsorted(self.times, [start_ms - NOTE_DRAW_MS, end_ms])
+        return self.times[first:last], self.keys[first:last]
+
+    def cells_in(self, start_ms, end_ms, ms_per_pixel):
+        """时间范围内的汇总方块，返回 (桶起始时间数组, 按键数组, 音符数数组, 桶宽ms)"""
+        level = self.level_for(ms_per_pixel)
+        bucket_ms = BASE_BUCKET_MS * (1 << level)
+        grid = self.levels[level]
+        first = max(0, int(start_ms // bucket_ms))
+        last = min(len(grid), int(end_ms // bucket_ms) + 1)
+        if first >= last:
+            empty = np.zeros(0)
+            return empty, empty, empty, bucket_ms
+        rows, keys = np.nonzero(grid[first:last])
+        counts = grid[first:last][rows, keys]
+        return (rows + first) * bucket_ms, keys, counts, bucket_ms
+
+def draw_notes(painter, levels, rect, start_ms, ms_per_pixel):
+    """在指定区域内绘制曲谱，start_ms 为区域左边缘对应的时间(相对第一个音符)"""
+    painter.fillRect(rect, BACKGROUND_COLOR)
+    row_height = rect.height() / KEY_COUNT
+    for key in range(0, KEY_COUNT, 2):
+        painter.fillRect(QRectF(rect.left(), rect.top() + (KEY_COUNT - 1 - key) * row_height, rect.width(), row_height), LANE_COLOR)
+    if not len(levels):
+        return
+    end_ms = start_ms + rect.width() * ms_per_pixel
+
+    if ms_per_pixel * 2 <= BASE_BUCKET_MS:
+        times, keys = levels.notes_in(start_ms, end_ms)
+        width = max(2.0, NOTE_DRAW_MS / ms_per_pixel)
+        for time_ms, key in zip(times.tolist(), keys.tolist()):
+            x = rect.left() + (time_ms - start_ms) / ms_per_pixel
+            painter.fillRect(QRectF(x, rect.top() + (KEY_COUNT - 1 - key) * row_height + 1, width, row_height - 2), NOTE_COLOR)
+        return
+
+    cell_starts, keys, counts, bucket_ms = levels.cells_in(start_ms, end_ms, ms_per_pixel)
+    width = max(1.0, bucket_ms / ms_per_pixel)
+    color = QColor(NOTE_COLOR)
+    for cell_start, key, count in zip(cell_starts.tolist(), keys.tolist(), counts.tolist()):
+        # 音符越多颜色越亮
+        color.setAlphaF(min(1.0, 0.45 + 0.15 * count))
+        x = rect.left() + (cell_start - start_ms) / ms_per_pixel
+        painter.fillRect(QRectF(x, rect.top() + (KEY_COUNT - 1 - key) * row_height, width, row_height), color)
+
+class PianoRollWidget(QWidget):
+    """15键网格视图，横轴为时间，纵轴为按键，显示跟随播放的播放头
+
+    滚轮左右滚动，Ctrl+滚轮缩放，点击请求跳转到该位置。
+    """
+    seek_requested = pyqtSignal(float)  # 进度百分比
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.levels = None
+        self.view_start = 0.0
+        self.ms_per_pixel = DEFAULT_MS_PER_PIXEL
+        self.playhead = None
+        self.position_source = None
+        self.follow_timer = QTimer(self)
+        self.follow_timer.timeout.connect(self.update_playhead)
+        self.setMinimumHeight(KEY_COUNT * 6)
+
+    def set_chart(self, chart):
+        """显示新的曲谱，层级数据只在这里计算一次"""
+        self.levels = NoteLevels(chart) if chart is not None and len(chart) else None
+        self.view_start = 0.0
+        self.playhead = None
+        self.update()
+
+    def follow(self, position_source):
+        """开始跟随播放，position_source 返回当前已播放时长(秒)"""
+        self.position_source = position_source
+        self.follow_timer.start(FRAME_INTERVAL)
+
+    def stop_follow(self):
+        self.follow_timer.stop()
+        self.position_source = None
+
+    def update_playhead(self):
+        if self.position_source is None:
+            return
+        self.set_playhead(self.position_source() * 1000)
+
+    def set_playhead(self, position_ms):
+        """设置播放头位置(相对第一个音符的ms)，播放头超出可见范围时翻页"""
+        self.playhead = position_ms
+        visible_ms = self.width() * self.ms_per_pixel
+        if not self.view_start <= position_ms < self.view_start + visible_ms * 0.9:
+            self.view_start = max(0.0, position_ms - visible_ms * 0.1)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        rect = QRectF(self.rect())
+        if self.levels is None:
+            painter.fillRect(rect, BACKGROUND_COLOR)
+            return
+        draw_notes(painter, self.levels, rect, self.view_start, self.ms_per_pixel)
+        if self.playhead is not None:
+            x = (self.playhead - self.view_start) / self.ms_per_pixel
+            painter.setPen(QPen(PLAYHEAD_COLOR, 2))
+            painter.drawLine(int(x), 0, int(x), self.height())
+
+    def wheelEvent(self, event):
+        if self.levels is None:
+            return
+        delta = event.angleDelta().y()
+        if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            # 以鼠标位置为中心缩放
+            anchor_x = event.position().x()
+            anchor_ms = self.view_start + anchor_x * self.ms_per_pixel
+            factor = 0.8 if delta > 0 else 1.25
+            max_ms_per_pixel = max(self.levels.duration / max(self.width(), 1), MIN_MS_PER_PIXEL)
+            self.ms_per_pixel = min(max(self.ms_per_pixel * factor, MIN_MS_PER_PIXEL), max_ms_per_pixel)
+            self.view_start = max(0.0, anchor_ms - anchor_x * self.ms_per_pixel)
+        else:
+            self.view_start = max(0.0, self.view_start - delta / 120 * self.width() * self.ms_per_pixel * 0.2)
+        self.update()
+
+    def mousePressEvent(self, event):
+        if self.levels is None or event.button() != Qt.MouseButton.LeftButton or not self.levels.duration:
+            return
+        position = self.view_start + event.position().x() * self.ms_per_pixel
+        self.seek_requested.emit(min(max(position / self.levels.duration * 100, 0.0), 100.0))
+
+def render_thumbnail(chart, width, height):
+    """把整首曲谱缩略绘制为 QPixmap"""
+    pixmap = QPixmap(width, height)
+    levels = NoteLevels(chart)
+    painter = QPainter(pixmap)
+    draw_notes(painter, levels, QRectF(0, 0, width, height), 0.0, max(levels.duration, 1.0) / width)
+    painter.end()
+    return pixmap
+
+class ThumbnailLabel(QLabel):
+    """可点击的曲谱缩略图，点击时给出对应的进度百分比"""
+    clicked = pyqtSignal(float)
+
+    def __init__(self, chart, width=360, height=60, parent=None):
+        super().__init__(parent)
+        self.setPixmap(render_thumbnail(chart, width, height))
+        self.setFixedSize(width, height)
+        self.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.setToolTip("点击定位到该位置")
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.clicked.emit(min(max(event.position().x() / self.width() * 100, 0.0), 100.0))
@@ -1,117 +1,312 @@
+import contextlib
+import heapq
+import math
 import time
 import threading
-from utils import press_key, release_all_keys, get_key_mapping
-import keyboard
-import random
-
-def play_song(song_data, stop_event, speed_factor, log_window, initial_progress=0, 
-              delay_enabled=False, delay_min=200, delay_max=500):
-    # 预处理音符数据
-    notes = song_data.get("songNotes", []) if isinstance(song_data, dict) else song_data
-    if not notes:
+from utils import get_key_mapping
+from output import KeyboardOutput
+from bisect import bisect_left
+from chart import KEY_NAMES
+from config import HOLD_TIME_MS
+from profiling import profiled
+
+CHORD_THRESHOLD = 50  # 曲谱时间间隔小于50ms的音符视为和弦
+MAX_WAIT_SLICE = 0.05  # 等待下一个音符时的最长单次休眠(秒)，保证变速、暂停能及时生效
+
+WAIT_DONE, WAIT_STOPPED, WAIT_SEEKED = range(3)
+
+class SystemTimeSource:
+    """真实时间源"""
+    def now(self):
+        return time.perf_counter()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+class VirtualTimeSource:
+    """虚拟时间源，sleep 立即返回并推进虚拟时间，用于以CPU速度模拟整首演奏
+
+    call_at 可在指定虚拟时间执行回调（如暂停、继续、跳转），回调在推进到该时间时于播放线程内执行。
+    """
+    def __init__(self, start=0.0):
+        self._now = start
+        self._scheduled = []
+
+    def now(self):
+        return self._now
+
+    def sleep(self, seconds):
+        target = self._now + max(seconds, 0.0)
+        if seconds > 0 and target == self._now:
+            # 极小的休眠在浮点精度下不会推进时间，至少前进一个可表示的单位避免死循环
+            target = math.nextafter(self._now, math.inf)
+        while self._scheduled and self._scheduled[0][0] <= target:
+            when, _, callback = heapq.heappop(self._scheduled)
+            self._now = max(self._now, when)
+            callback()
+        self._now = target
+
+    def call_at(self, when, callback):
+        heapq.heappush(self._scheduled, (when, len(self._scheduled), callback))
+
+class PlaybackClock:
+    """播放时钟，将曲谱时间(ms)映射为实际时间，支持播放中变速和暂停
+
+    时钟只记录一个锚点 (曲谱位置, 实际时间)，变速时在当前位置重新设置锚点，
+    之后所有音符的截止时间都从新锚点按新速度推算，因此变速是 O(1) 的。
+    output_latency 为输出延迟(秒)，所有截止时间都会提前这么多，用于补偿按键注入延迟。
+    source 为时间源，默认使用真实时间，测试时可换成 VirtualTimeSource。
+    """
+    def __init__(self, speed=1.0, position=0, output_latency=0.0, source=None):
+        self._lock = threading.Lock()
+        self.source = source or SystemTimeSource()
+        self.speed = speed
+        self.output_latency = output_latency
+        self.origin = position
+        self.seek_count = 0
+        self._anchor_position = position
+        self._anchor_time = self.source.now()
+        self._paused_at = None
+
+    def now(self):
+        """时间源的当前时间(秒)"""
+        return self.source.now()
+
+    def sleep(self, seconds):
+        """通过时间源休眠"""
+        self.source.sleep(seconds)
+
+    def _position_at(self, now):
+        return self._anchor_position + (now - self._anchor_time) * 1000 * self.speed
+
+    def position(self):
+        """当前曲谱位置(ms)"""
+        with self._lock:
+            now = self._paused_at if self._paused_at is not None else self.source.now()
+            return self._position_at(now)
+
+    def elapsed(self):
+        """从曲谱起点算起的已播放时长(秒)，按曲谱时间计算"""
+        return max(0.0, (self.position() - self.origin) / 1000)
+
+    def start(self, position, origin=None, at=None):
+        """从指定曲谱位置开始计时
+
+        at 为时间源上的开始时间，可以是将来的时间，用于多个实例在同一时刻开始合奏，
+        按键会比共同时间线提前 output_latency 发出。不指定 at 时时间线从现在起推迟
+        output_latency，该位置的按键立即发出。
+        """
+        with self._lock:
+            self.origin = position if origin is None else origin
+            self._anchor_position = position
+            self._anchor_time = self.source.now() + self.output_latency if at is None else at
+            self._paused_at = None
+
+    def set_origin(self, position):
+        """设置计算已播放时长的起点，不影响计时"""
+        with self._lock:
+            self.origin = position
+
+    def set_speed(self, speed):
+        """在当前位置重新锚定并切换速度"""
+        with self._lock:
+            now = self._paused_at if self._paused_at is not None else self.source.now()
+            self._anchor_position = self._position_at(now)
+            self._anchor_time = now
+            self.speed = speed
+
+    def pause(self):
+        """暂停计时"""
+        with self._lock:
+            if self._paused_at is None:
+                self._paused_at = self.source.now()
+
+    def resume(self):
+        """继续计时，暂停期间不计入曲谱位置"""
+        with self._lock:
+            if self._paused_at is not None:
+                self._anchor_time += self.source.now() - self._paused_at
+                self._paused_at = None
+
+    def seek(self, position):
+        """跳转到指定曲谱位置(ms)，正在等待的播放循环会重新定位下一个音符"""
+        with self._lock:
+            now = self._paused_at if self._paused_at is not None else self.source.now()
+            self._anchor_position = position
+            self._anchor_time = now
+            self.seek_count += 1
+
+    def time_until(self, note_time):
+        """距离需要发出指定曲谱时间的按键还有多少实际秒数，已扣除输出延迟"""
+        with self._lock:
+            now = self._paused_at if self._paused_at is not None else self.source.now()
+            return (note_time - self._position_at(now)) / 1000 / self.speed - self.output_latency
+
+@profiled("play_song", thread_entry=True)
+def play_song(chart, stop_event, speed_factor, log_window, initial_progress=0,
+              humanize=None, clock=None, timing=None, output=None, start_at=None):
+    times = chart.times
+    note_count = len(times)
+    if not note_count:
         log_window.log("没有找到可播放的音符数据")
         return
-        
-    first_time = notes[0].get("time", 0) if isinstance(notes[0], dict) else notes[0][1]
-    last_time = notes[-1].get("time", 0) if isinstance(notes[-1], dict) else notes[-1][1]
-    total_duration = last_time - first_time
-    
-    key_map = {note.get("key") if isinstance(note, dict) else note[0]: get_key_mapping(note.get("key") if isinstance(note, dict) else note[0]) for note in notes}
-    
-    start_time = time.perf_counter() - (first_time / 1000 / speed_factor)
-    pause_start_time = 0
-    pause_total_time = 0
-    
+
+    first_time = times[0]
+    total_duration = times[-1] - first_time
+    key_map = [get_key_mapping(name) for name in KEY_NAMES]
+
+    if clock is None:
+        clock = PlaybackClock(speed_factor)
+    if output is None:
+        output = KeyboardOutput()
+    clock.start(first_time, at=start_at)
+
+    index = 0
     start_position = getattr(log_window, 'seek_position', initial_progress)
-    if start_position > 0:
-        current_index = next(i for i, note in enumerate(notes) if (note.get("time", 0) if isinstance(note, dict) else note[1] - first_time) / total_duration * 100 >= start_position)
-        notes = notes[current_index:]
-        first_time = notes[0].get("time", 0) if isinstance(notes[0], dict) else notes[0][1]
-        start_time = time.perf_counter() - (first_time / 1000 / speed_factor)
+    if start_position > 0 and total_duration > 0:
+        index = min(bisect_left(times, first_time + total_duration * start_position / 100), note_count - 1)
+        clock.start(times[index], origin=first_time, at=start_at)
         if hasattr(log_window, 'update_play_progress'):
             log_window.update_play_progress(start_position)
-    
-    current_chord = []
-    current_time = 0
-    
-    for i, note in enumerate(notes):
-        if stop_event.is_set():
-            release_all_keys()
-            return
-            
-        while getattr(log_window, 'paused', False):
-            if stop_event.is_set():
-                release_all_keys()
-                return
-            if pause_start_time == 0:
-                pause_start_time = time.perf_counter()
-                release_all_keys()
-            time.sleep(0.1)
-            continue
-            
-        if pause_start_time > 0:
-            pause_duration = time.perf_counter() - pause_start_time
-            pause_total_time += pause_duration
-            pause_start_time = 0
-            start_time += pause_duration
-        
-        key = note.get("key") if isinstance(note, dict) else note[0]
-        note_time = (note.get("time", 0) if isinstance(note, dict) else note[1]) / 1000 / speed_factor
-        
-        if i < len(notes) - 1:
-            next_note = notes[i + 1]
-            next_time = (next_note.get("time", 0) if isinstance(next_note, dict) else next_note[1]) / 1000 / speed_factor
-            if abs(next_time - note_time) < 0.05:
-                current_chord.append(key)
-                current_time = note_time
-                continue
-        
-        if current_chord:
-            current_chord.append(key)
-            play_chord(current_chord, current_time, start_time, key_map, log_window, delay_enabled, delay_min, delay_max, first_time, total_duration, note)
-            current_chord = []
-        else:
-            play_single_key(key, note_time, start_time, key_map, log_window, delay_enabled, delay_min, delay_max, first_time, total_duration, note)
-    
-    release_all_keys()
+
+    if not play_notes(chart, index, 0, clock, key_map, output, log_window, humanize, stop_event, timing):
+        return
+
+    output.release_all()
     log_window.log("演奏结束")
 
-def play_chord(chord, chord_time, start_time, key_map, log_window, delay_enabled, delay_min, delay_max, first_time, total_duration, note):
-    sleep_time = chord_time - (time.perf_counter() - start_time)
-    if sleep_time > 0:
-        time.sleep(sleep_time)
-    try:
-        for chord_key in chord:
-            keyboard.press(key_map[chord_key])
-        if delay_enabled:
-            time.sleep(random.randint(delay_min, delay_max) / 1000.0)
+@profiled("play_playlist", thread_entry=True)
+def play_playlist(playlist, stop_event, speed_factor, log_window,
+                  humanize_factory=None, clock=None, timing=None, output=None, start_at=None, realtime_factory=None):
+    """在同一条时间线上连续播放整个列表，两首之间只间隔 playlist.gap 秒
+
+    humanize_factory 为 Chart -> Humanization 的函数，每首曲谱开始前调用一次。
+    realtime_factory 返回只包住一首曲谱演奏的上下文(如 RealtimePlayback)，
+    加载下一首和生成人性化数据都在上下文之外，GC 可以在两首之间正常回收。
+    start_at 为时钟时间源上的开始时间，为 None 时立即开始。
+    """
+    entry = playlist.next_chart()
+    if entry is None:
+        log_window.log("播放列表中没有可播放的曲谱")
+        return
+
+    key_map = [get_key_mapping(name) for name in KEY_NAMES]
+    if clock is None:
+        clock = PlaybackClock(speed_factor)
+    if output is None:
+        output = KeyboardOutput()
+    song_name, chart = entry
+    # offset 把每首曲谱的时间平移到整条时间线上
+    offset = -chart.first_time
+    clock.start(0, at=start_at)
+
+    while True:
+        clock.set_origin(chart.first_time + offset)
+        humanize = humanize_factory(chart) if humanize_factory else None
+        if hasattr(log_window, 'start_song'):
+            log_window.start_song(song_name, chart)
+        with realtime_factory() if realtime_factory else contextlib.nullcontext():
+            playing = play_notes(chart, 0, offset, clock, key_map, output, log_window, humanize, stop_event, timing)
+        if not playing:
+            return
+        end_position = chart.last_time + offset
+        entry = playlist.next_chart()
+        if entry is None or stop_event.is_set():
+            break
+        song_name, chart = entry
+        offset = end_position + playlist.gap * 1000 * clock.speed - chart.first_time
+
+    output.release_all()
+    log_window.log("播放列表结束")
+
+def play_notes(chart, index, offset, clock, key_map, output, log_window, humanize, stop_event, timing=None):
+    """从第 index 个音符开始按时间线播放曲谱，返回 False 表示播放已停止
+
+    humanize 为预先生成的 Humanization，为 None 时按谱面时间按下并固定按住 HOLD_TIME_MS。
+    """
+    times = chart.times
+    keys = chart.keys
+    note_count = len(times)
+    first_time = chart.first_time
+    total_duration = chart.last_time - first_time
+    seek_count = clock.seek_count
+
+    while index < note_count:
+        if stop_event.is_set():
+            output.release_all()
+            return False
+
+        # 间隔小于阈值的相邻音符合并为一个和弦同时按下
+        chord_end = index + 1
+        while chord_end < note_count and times[chord_end] - times[chord_end - 1] < CHORD_THRESHOLD:
+            chord_end += 1
+
+        if humanize is None:
+            chord_time, hold_ms = times[index] + offset, HOLD_TIME_MS
         else:
-            time.sleep(0.1)
-        for chord_key in chord:
-            keyboard.release(key_map[chord_key])
-        update_progress(log_window, first_time, total_duration, note)
-    except Exception as e:
-        log_window.log(f"按键错误: {str(e)}")
-        release_all_keys()
+            chord_time, hold_ms = times[index] + offset + humanize.onset[index], humanize.hold[index]
+
+        result = wait_until(clock, chord_time, log_window, stop_event, output, seek_count)
+        if result == WAIT_STOPPED:
+            return False
+        if result == WAIT_SEEKED:
+            seek_count = clock.seek_count
+            index = bisect_left(times, clock.position() - offset)
+            continue
+
+        last_time = times[chord_end - 1]
+        progress = (last_time - first_time) / total_duration * 100 if total_duration else 100
+        lateness = play_chord(keys[index:chord_end], chord_time, hold_ms, progress, clock, key_map, output, log_window)
+        if timing is not None:
+            timing.record(lateness)
+        index = chord_end
+    return not stop_event.is_set()
+
+def wait_while_paused(clock, log_window, stop_event, output):
+    """暂停时等待继续，返回 False 表示播放已停止"""
+    if not getattr(log_window, 'paused', False):
+        return True
+    clock.pause()
+    output.release_all()
+    while getattr(log_window, 'paused', False):
+        if stop_event.is_set():
+            output.release_all()
+            return False
+        clock.sleep(0.1)
+    clock.resume()
+    return True
 
-def play_single_key(key, note_time, start_time, key_map, log_window, delay_enabled, delay_min, delay_max, first_time, total_duration, note):
-    sleep_time = note_time - (time.perf_counter() - start_time)
-    if sleep_time > 0:
-        time.sleep(sleep_time)
+def wait_until(clock, note_time, log_window, stop_event, output, seek_count=None):
+    """等待到指定曲谱时间，分段休眠以便变速、暂停、跳转和停止及时生效
+
+    返回 WAIT_DONE、WAIT_STOPPED 或 WAIT_SEEKED（等待期间发生了跳转）。
+    """
+    while True:
+        if stop_event.is_set() or not wait_while_paused(clock, log_window, stop_event, output):
+            return WAIT_STOPPED
+        if seek_count is not None and clock.seek_count != seek_count:
+            return WAIT_SEEKED
+        sleep_time = clock.time_until(note_time)
+        if sleep_time <= 0:
+            return WAIT_DONE
+        clock.sleep(min(sleep_time, MAX_WAIT_SLICE))
+
+@profiled("play_chord")
+def play_chord(chord, chord_time, hold_ms, progress, clock, key_map, output, log_window):
+    """按下并释放一个和弦，返回按下时相对计划时间的延迟(ms)"""
+    lateness = -clock.time_until(chord_time) * 1000
     try:
-        keyboard.press(key_map[key])
-        if delay_enabled:
-            time.sleep(random.randint(delay_min, delay_max) / 1000.0)
-        else:
-            time.sleep(0.1)
-        keyboard.release(key_map[key])
-        update_progress(log_window, first_time, total_duration, note)
+        for key_code in chord:
+            output.press(key_map[key_code])
+        clock.sleep(hold_ms / 1000)
+        for key_code in chord:
+            output.release(key_map[key_code])
+        update_progress(log_window, progress)
     except Exception as e:
-        log_window.log(f"按键错误 {key}: {str(e)}")
-        release_all_keys()
+        log_window.log(f"按键错误 {', '.join(KEY_NAMES[key_code] for key_code in chord)}: {str(e)}", "error")
+        output.release_all()
+    return lateness
 
-def update_progress(log_window, first_time, total_duration, note):
-    current_time = note.get("time", 0) if isinstance(note, dict) else note[1]
-    progress = (current_time - first_time) / total_duration * 100
+def update_progress(log_window, progress):
     if hasattr(log_window, 'update_play_progress'):
-        log_window.update_play_progress(progress)
\ No newline at end of file
+        log_window.update_play_progress(progress)
@@ -0,0 +1,54 @@
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from chart import load_chart
+from library import SONGS_FOLDER
+
+PLAY_MODES = ("单曲循环", "列表循环", "随机播放")
+
+class Playlist:
+    """连续播放列表，按播放模式依次给出曲谱，并在后台提前编译下一首
+
+    load 为 曲名 -> Chart 的函数，加载失败时返回 None，这类曲谱会被跳过。
+    """
+    def __init__(self, song_names, load=None, mode="列表循环", start_index=0, gap=5.0):
+        self.song_names = list(song_names)
+        self.load = load or (lambda song_name: load_chart(os.path.join(SONGS_FOLDER, f"{song_name}.json"), song_name))
+        self.mode = mode
+        self.gap = gap  # 两首之间的间隔(秒)，可以为 0
+        self.index = None
+        self._next_index = start_index if self.song_names else None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._prefetch = self._submit(self._next_index)
+
+    def _submit(self, index):
+        if index is None:
+            return None
+        return self._executor.submit(self.load, self.song_names[index])
+
+    def _advance(self, index):
+        """根据播放模式计算下一首的位置"""
+        total = len(self.song_names)
+        if self.mode == "单曲循环":
+            return index
+        if self.mode == "随机播放" and total > 1:
+            return random.choice([i for i in range(total) if i != index])
+        return (index + 1) % total
+
+    def next_chart(self):
+        """返回 (曲名, Chart)，并开始预编译下一首；没有可播放曲谱时返回 None"""
+        for _ in range(len(self.song_names)):
+            if self._prefetch is None:
+                return None
+            index = self._next_index
+            chart = self._prefetch.result()
+            self._next_index = self._advance(index)
+            self._prefetch = self._submit(self._next_index)
+            if chart is not None and len(chart):
+                self.index = index
+                return self.song_names[index], chart
+        return None
+
+    def close(self):
+        """停止预编译线程"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
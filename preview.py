@@ -0,0 +1,113 @@
+import hashlib
+import os
+import sys
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from chart import load_chart
+from library import SONGS_FOLDER
+
+SAMPLE_RATE = 22050
+NOTE_LENGTH = 1.2  # 每个音的发声时长(秒)
+ATTACK_TIME = 0.005  # 起音时长(秒)，避免爆音
+DECAY_RATE = 3.5  # 指数衰减速度
+HARMONICS = (1.0, 0.35, 0.12)  # 各次谐波的幅度
+BASE_NOTE = 60  # 1Key0 对应的 MIDI 音高(C4)，再加上 pitchLevel 移调
+SCALE_STEPS = (0, 2, 4, 5, 7, 9, 11, 12, 14, 16, 17, 19, 21, 23, 24)  # 15个按键对应的C大调音阶(半音)
+PREVIEW_CACHE_DIR = "preview_cache"
+
+def chart_hash(chart):
+    """曲谱内容的哈希，内容和移调相同的曲谱共用一份试听缓存"""
+    digest = hashlib.sha1()
+    digest.update(chart.times.tobytes())
+    digest.update(bytes(code % len(SCALE_STEPS) for code in chart.keys))
+    digest.update(str(chart.pitch_level).encode())
+    return digest.hexdigest()
+
+def key_frequencies(pitch_level=0):
+    """15个按键在指定移调下的频率(Hz)"""
+    notes = BASE_NOTE + np.asarray(SCALE_STEPS, dtype=np.float64) + pitch_level
+    return 440.0 * 2 ** ((notes - 69) / 12)
+
+def note_templates(pitch_level=0, sample_rate=SAMPLE_RATE):
+    """一次性生成15个按键的单音波形，返回 (15, 采样数) 的数组"""
+    t = np.arange(int(NOTE_LENGTH * sample_rate)) / sample_rate
+    envelope = np.minimum(t / ATTACK_TIME, 1.0) * np.exp(-DECAY_RATE * t)
+    phase = 2 * np.pi * key_frequencies(pitch_level)[:, None] * t
+    wave_data = sum(amplitude * np.sin(phase * (index + 1)) for index, amplitude in enumerate(HARMONICS))
+    return (wave_data * envelope / sum(HARMONICS)).astype(np.float32)
+
+def render_chart(chart, sample_rate=SAMPLE_RATE):
+    """将曲谱合成为单声道音频，返回 -1~1 的 float32 数组，从第一个音符开始"""
+    if not len(chart):
+        return np.zeros(0, dtype=np.float32)
+    templates = note_templates(chart.pitch_level, sample_rate)
+    length = templates.shape[1]
+    times = np.frombuffer(chart.times, dtype=np.float64)
+    starts = np.round((times - times[0]) * sample_rate / 1000).astype(np.int64)
+    keys = np.frombuffer(chart.keys, dtype=np.uint8) % len(SCALE_STEPS)
+
+    audio = np.zeros(int(starts[-1]) + length, dtype=np.float32)
+    # 同一时刻同一按键的音符先合并计数，再逐个叠加波形片段
+    events, counts = np.unique(starts * len(SCALE_STEPS) + keys, return_counts=True)
+    for event, count in zip(events.tolist(), counts.tolist()):
+        start, key = divmod(event, len(SCALE_STEPS))
+        audio[start:start + length] += templates[key] * count
+
+    peak = float(np.max(np.abs(audio)))
+    if peak > 1.0:
+        audio /= peak
+    return audio
+
+def write_wav(file_path, audio, sample_rate=SAMPLE_RATE):
+    """以16位PCM保存音频，先写临时文件再替换"""
+    tmp_file = file_path + ".tmp"
+    with wave.open(tmp_file, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes((audio * 32767).astype("<i2").tobytes())
+    os.replace(tmp_file, file_path)
+
+def render_preview(chart, cache_dir=PREVIEW_CACHE_DIR):
+    """返回曲谱试听文件的路径，已有缓存时直接返回"""
+    file_path = os.path.join(cache_dir, chart_hash(chart) + ".wav")
+    if not os.path.exists(file_path):
+        os.makedirs(cache_dir, exist_ok=True)
+        write_wav(file_path, render_chart(chart))
+    return file_path
+
+def play_preview(file_path):
+    """异步播放试听文件，目前只支持 Windows"""
+    if sys.platform != "win32":
+        raise OSError("当前系统不支持试听播放")
+    import winsound
+    winsound.PlaySound(file_path, winsound.SND_FILENAME | winsound.SND_ASYNC)
+
+def stop_preview():
+    """停止正在播放的试听"""
+    if sys.platform == "win32":
+        import winsound
+        winsound.PlaySound(None, 0)
+
+def _render_file(args):
+    file_path, cache_dir = args
+    chart = load_chart(file_path)
+    if chart is None or not len(chart):
+        return None
+    return render_preview(chart, cache_dir)
+
+def render_library(songs_folder, cache_dir=PREVIEW_CACHE_DIR, workers=None):
+    """用多个进程为整个曲库生成试听缓存，返回 (生成的文件数, 耗时)"""
+    start = time.perf_counter()
+    files = [(os.path.join(songs_folder, name), cache_dir) for name in sorted(os.listdir(songs_folder))
+             if name.endswith(".json")]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        rendered = sum(1 for path in executor.map(_render_file, files, chunksize=8) if path)
+    return rendered, time.perf_counter() - start
+
+if __name__ == "__main__":
+    folder = sys.argv[1] if len(sys.argv) > 1 else SONGS_FOLDER
+    count, elapsed = render_library(folder)
+    print(f"已生成 {count} 个试听文件, 耗时 {elapsed:.2f}秒")
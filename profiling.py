@@ -0,0 +1,197 @@
+import atexit
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_ENV = "SKY_PROFILE"  # 取值: counters、cprofile、memory 或 all，可用逗号组合，1 等同 counters
+PROFILE_FLAG = "--profile"
+PROFILE_DIR = "profiles"
+PROFILE_MODES = ("counters", "cprofile", "memory")
+TOP_COUNT = 20
+
+_modes = set()
+_counters = {}  # {名称: [调用次数, 总耗时秒, 最大耗时秒]}
+_counter_lock = threading.Lock()
+_profilers = []
+_session = None
+
+def parse_modes(value):
+    """解析性能分析开关的取值"""
+    modes = set()
+    for mode in (value or "").lower().split(","):
+        mode = mode.strip()
+        if mode in ("1", "on", "true"):
+            modes.add("counters")
+        elif mode == "all":
+            modes.update(PROFILE_MODES)
+        elif mode in PROFILE_MODES:
+            modes.update(("counters", mode))
+    return modes
+
+def configure(argv=None):
+    """根据环境变量和 --profile[=模式] 参数开启性能分析，并从 argv 中移除该参数
+
+    必须在导入被分析的模块之前调用，未开启时被包装的函数保持原样，没有任何额外开销。
+    """
+    value = os.environ.get(PROFILE_ENV, "")
+    if argv is not None:
+        for arg in list(argv):
+            if arg == PROFILE_FLAG or arg.startswith(PROFILE_FLAG + "="):
+                value = arg.partition("=")[2] or "counters"
+                argv.remove(arg)
+    _modes.update(parse_modes(value))
+    if _modes:
+        start_session()
+    return set(_modes)
+
+def enabled(mode="counters"):
+    return mode in _modes
+
+def profiled(name, thread_entry=False):
+    """装饰器：开启性能分析时统计函数的调用次数和耗时
+
+    thread_entry 为 True 表示该函数是后台线程的入口（如播放循环），开启 cprofile 时会为这次调用单独采样；
+    Python 3.12 起会话的分析器已覆盖所有线程，此时不再单独采样。
+    未开启性能分析时直接返回原函数。
+    """
+    def decorator(func):
+        if not _modes:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = None
+            if (thread_entry and "cprofile" in _modes and threading.current_thread() is not threading.main_thread()
+                    and not profiler_active()):
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError:
+                    # 其他分析工具已经在运行，同一时间只能有一个
+                    profiler = None
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+                if profiler is not None:
+                    profiler.disable()
+                    _profilers.append(profiler)
+        return wrapper
+    return decorator
+
+def profiler_active():
+    """是否已有全局的分析工具在运行
+
+    Python 3.12 起 cProfile 基于 sys.monitoring，一个分析器覆盖所有线程，且同一时间只能启用一个；
+    更早的版本按线程设置，总是返回 False。
+    """
+    monitoring = getattr(sys, "monitoring", None)
+    return monitoring is not None and monitoring.get_tool(monitoring.PROFILER_ID) is not None
+
+def record(name, seconds):
+    """累加一次计时"""
+    with _counter_lock:
+        counter = _counters.get(name)
+        if counter is None:
+            _counters[name] = [1, seconds, seconds]
+        else:
+            counter[0] += 1
+            counter[1] += seconds
+            if seconds > counter[2]:
+                counter[2] = seconds
+
+def start_session():
+    """开始一次分析会话，程序退出时写入 profiles/ 目录"""
+    global _session
+    if _session is not None:
+        return
+    _session = os.path.join(PROFILE_DIR, time.strftime("session_%Y%m%d_%H%M%S"))
+    if "cprofile" in _modes:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        _profilers.append(profiler)
+    if "memory" in _modes:
+        tracemalloc.start(10)
+    atexit.register(save_session)
+
+def save_session():
+    """保存计数器、cProfile 数据和内存快照，返回会话文件前缀"""
+    if _session is None:
+        return None
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with _counter_lock:
+        counters = {name: list(values) for name, values in _counters.items()}
+    with open(_session + ".json", "w", encoding="utf-8") as f:
+        json.dump({"modes": sorted(_modes), "counters": counters}, f, ensure_ascii=False, indent=2)
+
+    if _profilers:
+        for profiler in _profilers:
+            profiler.disable()
+        stats = pstats.Stats(_profilers[0])
+        for profiler in _profilers[1:]:
+            stats.add(profiler)
+        stats.dump_stats(_session + ".prof")
+
+    if tracemalloc.is_tracing():
+        tracemalloc.take_snapshot().dump(_session + ".snapshot")
+        tracemalloc.stop()
+    print(f"性能分析数据已保存: {_session}")
+    return _session
+
+def format_report(session, top=TOP_COUNT):
+    """生成会话报告：计数器、最耗时的函数和内存分配最多的位置"""
+    lines = []
+    counter_file = session + ".json"
+    if os.path.exists(counter_file):
+        with open(counter_file, "r", encoding="utf-8") as f:
+            counters = json.load(f).get("counters", {})
+        lines.append("== 计数器 ==")
+        lines.append(f"{'名称':<24}{'次数':>10}{'总耗时(s)':>12}{'平均(ms)':>12}{'最大(ms)':>12}")
+        for name, (calls, total, worst) in sorted(counters.items(), key=lambda item: -item[1][1]):
+            lines.append(f"{name:<24}{calls:>10}{total:>12.3f}{total / calls * 1000:>12.3f}{worst * 1000:>12.3f}")
+
+    profile_file = session + ".prof"
+    if os.path.exists(profile_file):
+        stream = io.StringIO()
+        pstats.Stats(profile_file, stream=stream).sort_stats("tottime").print_stats(top)
+        lines.append("")
+        lines.append(f"== 自身耗时最多的 {top} 个函数 ==")
+        lines.append(stream.getvalue().strip())
+
+    snapshot_file = session + ".snapshot"
+    if os.path.exists(snapshot_file):
+        snapshot = tracemalloc.Snapshot.load(snapshot_file)
+        lines.append("")
+        lines.append(f"== 内存分配最多的 {top} 个位置 ==")
+        for stat in snapshot.statistics("lineno")[:top]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size / 1024:>10.1f} KiB {stat.count:>8} 次  {frame.filename}:{frame.lineno}")
+    return "\n".join(lines)
+
+def latest_session(folder=PROFILE_DIR):
+    """最近一次会话的文件前缀，没有时返回 None"""
+    try:
+        names = sorted(name[:-5] for name in os.listdir(folder) if name.endswith(".json"))
+    except OSError:
+        return None
+    return os.path.join(folder, names[-1]) if names else None
+
+def main():
+    session = sys.argv[1] if len(sys.argv) > 1 else latest_session()
+    if session is None:
+        print("没有找到性能分析数据")
+        return
+    session = os.path.splitext(session)[0] if session.endswith((".json", ".prof", ".snapshot")) else session
+    top = int(sys.argv[2]) if len(sys.argv) > 2 else TOP_COUNT
+    print(format_report(session, top))
+
+if __name__ == "__main__":
+    main()
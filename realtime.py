@@ -0,0 +1,130 @@
+import gc
+import os
+import sys
+import threading
+
+THREAD_PRIORITY_HIGHEST = 2
+LINUX_NICE = -10
+
+_last_timing = {}  # {是否实时模式: 上一次的时间误差统计}
+
+class TimingStats:
+    """记录每个和弦实际按下时间相对计划时间的延迟(ms)"""
+    LATE_THRESHOLD = 5.0
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+        self.late_count = 0  # 延迟超过 LATE_THRESHOLD 的次数
+
+    def record(self, lateness_ms):
+        self.count += 1
+        self.total += lateness_ms
+        if lateness_ms > self.worst:
+            self.worst = lateness_ms
+        if lateness_ms > self.LATE_THRESHOLD:
+            self.late_count += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self):
+        return f"平均延迟 {self.mean:.2f}ms, 最大延迟 {self.worst:.2f}ms, 超过{self.LATE_THRESHOLD:g}ms {self.late_count}/{self.count} 次"
+
+def report_timing(stats, realtime, log):
+    """输出本次播放的时间误差，并与另一种模式的上一次结果对比"""
+    if not stats.count:
+        return
+    mode = "实时模式" if realtime else "普通模式"
+    log(f"{mode}时间误差: {stats.summary()}")
+    other = _last_timing.get(not realtime)
+    if realtime and other:
+        log(f"相比普通模式: 平均延迟 {other.mean - stats.mean:+.2f}ms, 最大延迟 {other.worst - stats.worst:+.2f}ms (正数为改善)")
+    _last_timing[realtime] = stats
+
+class RealtimePlayback:
+    """实时播放模式：播放期间冻结并关闭GC，提升当前线程优先级，可选绑定CPU核心
+
+    需在播放线程内使用，退出时恢复原有设置。没有权限的操作会跳过并记录日志。
+    """
+    def __init__(self, enabled=False, cpu=None, log=print):
+        self.enabled = enabled
+        self.cpu = cpu
+        self.log = log
+        self._gc_was_enabled = False
+        self._restore_priority = None
+        self._restore_affinity = None
+
+    def __enter__(self):
+        if not self.enabled:
+            return self
+        self._gc_was_enabled = gc.isenabled()
+        gc.collect()
+        gc.freeze()
+        gc.disable()
+        applied = ["已暂停GC"]
+        if self._raise_priority():
+            applied.append("已提升线程优先级")
+        if self.cpu is not None and self._pin_cpu(self.cpu):
+            applied.append(f"已绑定CPU核心 {self.cpu}")
+        self.log(f"实时模式: {', '.join(applied)}")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.enabled:
+            return False
+        if self._restore_affinity:
+            try:
+                self._restore_affinity()
+            except Exception as e:
+                self.log(f"恢复CPU绑定失败: {str(e)}")
+        if self._restore_priority:
+            try:
+                self._restore_priority()
+            except Exception as e:
+                self.log(f"恢复线程优先级失败: {str(e)}")
+        gc.unfreeze()
+        if self._gc_was_enabled:
+            gc.enable()
+        return False
+
+    def _raise_priority(self):
+        try:
+            if sys.platform == "win32":
+                import ctypes
+                kernel32 = ctypes.windll.kernel32
+                handle = kernel32.GetCurrentThread()
+                previous = kernel32.GetThreadPriority(handle)
+                if not kernel32.SetThreadPriority(handle, THREAD_PRIORITY_HIGHEST):
+                    raise OSError(kernel32.GetLastError())
+                self._restore_priority = lambda: kernel32.SetThreadPriority(kernel32.GetCurrentThread(), previous)
+            else:
+                thread_id = threading.get_native_id()
+                previous = os.getpriority(os.PRIO_PROCESS, thread_id)
+                os.setpriority(os.PRIO_PROCESS, thread_id, LINUX_NICE)
+                self._restore_priority = lambda: os.setpriority(os.PRIO_PROCESS, thread_id, previous)
+            return True
+        except (OSError, AttributeError) as e:
+            self.log(f"无法提升线程优先级: {str(e)}")
+            return False
+
+    def _pin_cpu(self, cpu):
+        try:
+            if sys.platform == "win32":
+                import ctypes
+                kernel32 = ctypes.windll.kernel32
+                previous = kernel32.SetThreadAffinityMask(kernel32.GetCurrentThread(), 1 << cpu)
+                if not previous:
+                    raise OSError(kernel32.GetLastError())
+                self._restore_affinity = lambda: kernel32.SetThreadAffinityMask(kernel32.GetCurrentThread(), previous)
+            else:
+                thread_id = threading.get_native_id()
+                previous = os.sched_getaffinity(thread_id)
+                os.sched_setaffinity(thread_id, {cpu})
+                self._restore_affinity = lambda: os.sched_setaffinity(thread_id, previous)
+            return True
+        except (OSError, AttributeError, ValueError) as e:
+            self.log(f"无法绑定CPU核心 {cpu}: {str(e)}")
+            return False
@@ -0,0 +1,346 @@
+"""本地远程控制接口
+
+基于 asyncio 的 HTTP/WebSocket 服务，只使用标准库，在独立线程中运行自己的事件循环。
+
+HTTP 接口(请求和返回都是 JSON)：
+    GET    /api/state                    当前播放状态
+    GET    /api/library?q=关键字&limit=50 搜索曲库
+    GET    /api/queue                    播放队列
+    POST   /api/queue   {"id": 曲谱编号}  加入队列
+    DELETE /api/queue                    清空队列
+    POST   /api/play    {"id": 曲谱编号}  播放指定曲谱，不带 id 时播放当前曲谱
+    POST   /api/pause | /api/resume | /api/toggle | /api/stop
+    POST   /api/seek    {"progress": 0~100}
+    POST   /api/tempo   {"speed": 0.1~10}
+WebSocket /ws：连接后持续推送 {"type": "state", ...}，推送频率不超过 rate 次/秒，状态没有变化时不推送；
+    也可以通过 WebSocket 发送 {"cmd": "pause"}、{"cmd": "seek", "progress": 50} 等命令，省去每次建立 HTTP 请求。
+
+设置了 token 时，请求需要带 Authorization: Bearer <token> 头或 ?token=<token> 参数。
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import struct
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+from config import REMOTE_PORT
+
+PUSH_RATE = 10  # 每秒最多推送的状态次数
+MAX_BODY = 64 * 1024
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+STATUS_TEXT = {200: "OK", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden", 404: "Not Found",
+               405: "Method Not Allowed", 413: "Payload Too Large"}
+
+def _number(params, name, low, high):
+    try:
+        value = float(params[name])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"缺少或无效的参数 {name}") from None
+    if not low <= value <= high:
+        raise ValueError(f"参数 {name} 超出范围 {low}~{high}")
+    return value
+
+def parse_command(name, params):
+    """校验命令参数，返回交给控制器执行的参数；未知命令抛出 KeyError，参数无效抛出 ValueError"""
+    if name in ("pause", "resume", "toggle", "stop", "clear_queue"):
+        return {}
+    if name == "play":
+        return {"id": str(params["id"])} if params.get("id") else {}
+    if name == "queue":
+        if not params.get("id"):
+            raise ValueError("缺少参数 id")
+        return {"id": str(params["id"])}
+    if name == "seek":
+        return {"progress": _number(params, "progress", 0, 100)}
+    if name == "tempo":
+        return {"speed": _number(params, "speed", 0.1, 10.0)}
+    raise KeyError(name)
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class RemoteServer:
+    """远程控制服务
+
+    controller 需要提供：
+        state() -> dict                 当前播放状态，会在服务线程中频繁调用，只能读取简单属性
+        search(text, limit) -> list     曲库搜索结果 [{"id", "title"}]
+        queue() -> list                 播放队列
+        execute(command, params)        执行命令，会在服务线程中调用，需要自行转到播放/界面线程
+    """
+    def __init__(self, controller, host="127.0.0.1", port=REMOTE_PORT, token="", rate=PUSH_RATE, log=print):
+        self.controller = controller
+        self.host = host
+        self.port = port
+        self.token = token
+        self.rate = rate
+        self.log = log
+        self.subscribers = set()
+        self._clients = set()
+        self._loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._stopping = None
+        self._push_now = None
+        self._error = None
+
+    def start(self):
+        """在后台线程中启动服务，监听失败时抛出 OSError"""
+        self._thread = threading.Thread(target=self._run, name="remote-control", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error:
+            raise self._error
+        self.log(f"远程控制已启动: http://{self.host}:{self.port}/")
+        return self
+
+    def stop(self):
+        if self._loop is not None and self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+            self._thread.join(timeout=2)
+
+    def notify(self):
+        """状态发生了变化(如切换曲谱、停止)，立即推送一次，可以在任意线程调用"""
+        if self._loop is not None and self._push_now is not None:
+            self._loop.call_soon_threadsafe(self._push_now.set)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        except OSError as e:
+            self._error = e
+            self._ready.set()
+        finally:
+            self._loop.close()
+
+    async def _serve(self):
+        self._stopping = asyncio.Event()
+        self._push_now = asyncio.Event()
+        server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        pusher = asyncio.ensure_future(self._push_loop())
+        async with server:
+            await self._stopping.wait()
+        tasks = [pusher, *self._clients]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _authorized(self, headers, query):
+        if not self.token:
+            return True
+        supplied = query.get("token", [""])[0]
+        authorization = headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            supplied = authorization[7:].strip()
+        return hmac.compare_digest(supplied.encode(), self.token.encode())
+
+    async def _handle_client(self, reader, writer):
+        """处理一个连接，支持 keep-alive 和升级为 WebSocket"""
+        self._clients.add(asyncio.current_task())
+        try:
+            while True:
+                try:
+                    request = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lines = request.decode("latin-1").split("\r\n")
+                try:
+                    method, target, _ = lines[0].split(" ", 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                url = urlsplit(target)
+                query = parse_qs(url.query)
+                length = headers.get("content-length", "0")
+                if not length.isdigit() or int(length) > MAX_BODY:
+                    await self._respond(writer, 413 if length.isdigit() else 400, {"error": "无效的请求内容长度"}, close=True)
+                    break
+                length = int(length)
+                body = await reader.readexactly(length) if length else b""
+
+                if not self._authorized(headers, query):
+                    await self._respond(writer, 401, {"error": "需要有效的 token"})
+                elif url.path == "/ws" and headers.get("upgrade", "").lower() == "websocket":
+                    # WebSocket 不受浏览器同源限制，没有 token 时只接受非浏览器或同源页面的连接
+                    origin = headers.get("origin")
+                    if origin and not self.token and urlsplit(origin).netloc != headers.get("host"):
+                        await self._respond(writer, 403, {"error": "不接受跨域的 WebSocket 连接"}, close=True)
+                        break
+                    await self._websocket(reader, writer, headers)
+                    return
+                else:
+                    try:
+                        # 修改状态的请求必须是 JSON，浏览器中的其他网页无法不经预检直接发送这类请求
+                        if method != "GET" and not headers.get("content-type", "").startswith("application/json"):
+                            raise HttpError(400, "请求需要 Content-Type: application/json")
+                        status, result = self._route(method, url.path, query, body)
+                    except HttpError as e:
+                        status, result = e.status, {"error": str(e)}
+                    await self._respond(writer, status, result)
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # 服务停止时取消的连接正常结束，不作为异常上报
+            pass
+        finally:
+            self._clients.discard(asyncio.current_task())
+            writer.close()
+
+    async def _respond(self, writer, status, result, close=False):
+        data = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                "Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + data)
+        await writer.drain()
+
+    def _route(self, method, path, query, body):
+        """处理 HTTP 接口，返回 (状态码, 结果)"""
+        if not path.startswith("/api/"):
+            raise HttpError(404, "没有这个接口")
+        name = path[len("/api/"):].strip("/")
+        if method == "GET":
+            if name == "state":
+                return 200, self.controller.state()
+            if name == "library":
+                try:
+                    limit = int(query.get("limit", ["50"])[0])
+                except ValueError:
+                    raise HttpError(400, "无效的参数 limit") from None
+                return 200, self.controller.search(query.get("q", [""])[0], max(1, min(limit, 500)))
+            if name == "queue":
+                return 200, self.controller.queue()
+            raise HttpError(404, "没有这个接口")
+        if method not in ("POST", "DELETE"):
+            raise HttpError(405, "不支持的请求方法")
+        try:
+            params = json.loads(body) if body else {}
+        except ValueError:
+            raise HttpError(400, "请求内容不是有效的 JSON") from None
+        if not isinstance(params, dict):
+            raise HttpError(400, "请求内容必须是 JSON 对象")
+        if method == "DELETE":
+            if name != "queue":
+                raise HttpError(405, "不支持的请求方法")
+            name = "clear_queue"
+        return 202, self._execute(name, params)
+
+    def _execute(self, name, params):
+        try:
+            params = parse_command(name, params)
+        except KeyError:
+            raise HttpError(404, f"未知命令 {name}") from None
+        except ValueError as e:
+            raise HttpError(400, str(e)) from None
+        self.controller.execute(name, params)
+        return {"ok": True, "command": name}
+
+    async def _websocket(self, reader, writer, headers):
+        """完成 WebSocket 握手，之后接收命令，状态由 _push_loop 推送"""
+        key = headers.get("sec-websocket-key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+        self.subscribers.add(writer)
+        try:
+            await self._send_frame(writer, self._state_message())
+            while True:
+                opcode, payload = await self._read_frame(reader)
+                if opcode == 0x8:
+                    writer.write(b"\x88\x00")
+                    break
+                if opcode == 0x9:
+                    writer.write(bytes([0x8A, len(payload)]) + payload)
+                elif opcode == 0x1:
+                    await self._send_frame(writer, self._websocket_command(payload))
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self.subscribers.discard(writer)
+
+    def _websocket_command(self, payload):
+        try:
+            message = json.loads(payload)
+            name = message.pop("cmd")
+            return {"type": "result", **self._execute(name, message)}
+        except HttpError as e:
+            return {"type": "error", "error": str(e)}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return {"type": "error", "error": "命令格式应为 {\"cmd\": 命令, ...}"}
+
+    async def _read_frame(self, reader):
+        """读取一个客户端帧(客户端发送的帧都带掩码)，返回 (opcode, 内容)"""
+        first, second = await reader.readexactly(2)
+        length = second & 0x7F
+        if length == 126:
+            (length,) = struct.unpack(">H", await reader.readexactly(2))
+        elif length == 127:
+            (length,) = struct.unpack(">Q", await reader.readexactly(8))
+        if length > MAX_BODY:
+            raise ValueError("WebSocket 帧过大")
+        mask = await reader.readexactly(4) if second & 0x80 else b"\x00" * 4
+        data = await reader.readexactly(length)
+        return first & 0x0F, bytes(byte ^ mask[index % 4] for index, byte in enumerate(data))
+
+    async def _send_frame(self, writer, message):
+        data = json.dumps(message, ensure_ascii=False).encode("utf-8")
+        if len(data) < 126:
+            header = bytes([0x81, len(data)])
+        elif len(data) < 65536:
+            header = bytes([0x81, 126]) + struct.pack(">H", len(data))
+        else:
+            header = bytes([0x81, 127]) + struct.pack(">Q", len(data))
+        writer.write(header + data)
+        await writer.drain()
+
+    def _state_message(self):
+        return {"type": "state", "time": time.time(), **self.controller.state()}
+
+    async def _push_loop(self):
+        """按不超过 rate 次/秒的频率推送变化的状态，状态不变时不推送"""
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.rate
+        last_state = None
+        last_push = 0.0
+        while True:
+            try:
+                await asyncio.wait_for(self._push_now.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._push_now.clear()
+            # notify 触发的立即推送也要和上一次推送至少间隔一个周期
+            remaining = last_push + interval - loop.time()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+            if not self.subscribers:
+                last_state = None
+                continue
+            state = self.controller.state()
+            if state == last_state:
+                continue
+            last_state = state
+            last_push = loop.time()
+            message = {"type": "state", "time": time.time(), **state}
+            for writer in list(self.subscribers):
+                try:
+                    # 网络慢的客户端不能拖慢其他客户端，写缓冲堆积时直接断开
+                    if writer.transport.get_write_buffer_size() > MAX_BODY:
+                        raise ConnectionError
+                    await self._send_frame(writer, message)
+                except (ConnectionError, RuntimeError):
+                    self.subscribers.discard(writer)
+                    writer.close()
@@ -0,0 +1,198 @@
+import atexit
+import json
+import os
+import threading
+from library import DEFAULT_ROOTS
+from config import REMOTE_PORT
+
+SETTINGS_FILE = "settings.json"
+SETTINGS_VERSION = 1
+SAVE_DELAY = 0.5  # 修改后延迟保存的时间(秒)，期间的多次修改合并为一次写入
+RETRY_DELAY = 5.0  # 保存失败(文件被占用、磁盘已满等)后重试的间隔(秒)
+
+# 旧版本分散保存的设置文件，首次运行时迁移到 settings.json
+LEGACY_FILES = {
+    "favorites": "favorites.json",
+    "hotkeys": "hotkey_settings.json",
+    "delay": "delay_settings.json",
+    "latency": "latency_settings.json",
+}
+
+DEFAULT_SETTINGS = {
+    "favorites": [],
+    "hotkeys": {"pause": "F10", "stop": "F11"},
+    "delay": {"enabled": False, "min": 200, "max": 500},
+    "latency": {},
+    "library_roots": list(DEFAULT_ROOTS),
+    "remote": {"enabled": False, "host": "127.0.0.1", "port": REMOTE_PORT, "token": ""},
+}
+
+def _read_json(file_path):
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def migrate_settings(data):
+    """将旧版本的设置数据升级到当前版本"""
+    version = data.get("version", 0)
+    if version < 1:
+        data = {key: value for key, value in data.items() if key in DEFAULT_SETTINGS}
+    data["version"] = SETTINGS_VERSION
+    return data
+
+def migrate_legacy_files(folder="."):
+    """读取旧的分散设置文件，返回合并后的设置；没有任何旧文件时返回 None"""
+    data = {}
+    for section, file_name in LEGACY_FILES.items():
+        value = _read_json(os.path.join(folder, file_name))
+        if value is not None:
+            data[section] = value
+    return data or None
+
+class SettingsStore:
+    """统一的设置存储，所有设置保存在一个带版本号的 settings.json 中
+
+    收藏在内存中以有序字典保存，查询是 O(1) 的。修改后延迟 SAVE_DELAY 秒合并保存，
+    写入时先写临时文件再替换，避免中途退出导致文件损坏。
+    """
+    def __init__(self, settings_file=SETTINGS_FILE, save_delay=SAVE_DELAY, log=print):
+        self.settings_file = settings_file
+        self.save_delay = save_delay
+        self.log = log
+        self.migrated = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+        self._sections = {}
+        self._favorites = {}
+        self.load()
+        atexit.register(self.flush)
+
+    def load(self):
+        """加载设置，首次运行时从旧文件迁移"""
+        data = _read_json(self.settings_file)
+        if not isinstance(data, dict):
+            data = migrate_legacy_files(os.path.dirname(self.settings_file) or ".")
+            self.migrated = data is not None
+            data = data or {}
+        data = migrate_settings(data)
+
+        sections = {}
+        for section, default in DEFAULT_SETTINGS.items():
+            value = data.get(section)
+            sections[section] = value if isinstance(value, type(default)) else json.loads(json.dumps(default))
+        with self._lock:
+            self._favorites = dict.fromkeys(name for name in sections.pop("favorites") if isinstance(name, str))
+            self._sections = sections
+        if self.migrated:
+            self._dirty = True
+            self.flush()
+
+    def get(self, section):
+        """返回某个设置分区的副本"""
+        with self._lock:
+            return json.loads(json.dumps(self._sections.get(section, {})))
+
+    def set(self, section, value):
+        """替换某个设置分区，并安排延迟保存"""
+        with self._lock:
+            self._sections[section] = value
+        self.schedule_save()
+
+    def update(self, section, **values):
+        """更新某个设置分区中的若干项，并安排延迟保存"""
+        with self._lock:
+            self._sections.setdefault(section, {}).update(values)
+        self.schedule_save()
+
+    def favorites(self):
+        """按加入顺序返回收藏列表"""
+        with self._lock:
+            return list(self._favorites)
+
+    def is_favorite(self, chart_id):
+        return chart_id in self._favorites
+
+    def add_favorite(self, song_name):
+        """加入收藏，已存在时返回 False"""
+        with self._lock:
+            if song_name in self._favorites:
+                return False
+            self._favorites[song_name] = None
+        self.schedule_save()
+        return True
+
+    def remove_favorite(self, song_name):
+        """移出收藏，不存在时返回 False"""
+        with self._lock:
+            if self._favorites.pop(song_name, False) is False:
+                return False
+        self.schedule_save()
+        return True
+
+    def replace_favorite(self, old, new):
+        """在原位置把收藏替换为新的名称，用于迁移旧的收藏"""
+        with self._lock:
+            if old not in self._favorites:
+                return False
+            self._favorites = {(new if name == old else name): None for name in self._favorites}
+        self.schedule_save()
+        return True
+
+    def migrate_favorites(self, library):
+        """返回收藏中仍在曲库里的曲谱，并把旧版本按标题保存的收藏原位替换为曲谱编号
+
+        找不到的收藏(例如所在根目录暂时不可用)保留不动。
+        """
+        entries = []
+        for favorite in self.favorites():
+            entry = library.get(favorite)
+            if entry is None:
+                entry = library.find(favorite)
+                if entry is None:
+                    continue
+                self.replace_favorite(favorite, entry.id)
+            entries.append(entry)
+        return entries
+
+    def schedule_save(self, delay=None):
+        """延迟保存，期间再次修改会重新计时"""
+        with self._lock:
+            self._dirty = True
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.save_delay if delay is None else delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def snapshot(self):
+        """当前全部设置，即写入文件的内容"""
+        with self._lock:
+            data = {"version": SETTINGS_VERSION, "favorites": list(self._favorites)}
+            data.update(self._sections)
+            return json.loads(json.dumps(data))
+
+    def flush(self):
+        """立即保存尚未写入的修改，返回是否保存成功；失败时保留修改并在 RETRY_DELAY 秒后重试"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return True
+            self._dirty = False
+        data = self.snapshot()
+        try:
+            with self._save_lock:
+                tmp_file = self.settings_file + ".tmp"
+                with open(tmp_file, "w", encoding="utf-8") as f:
+                    json.dump(data, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_file, self.settings_file)
+        except OSError as e:
+            self.log(f"保存设置失败，{RETRY_DELAY:g} 秒后重试: {e}")
+            self.schedule_save(RETRY_DELAY)
+            return False
+        return True
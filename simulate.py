@@ -0,0 +1,108 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from chart import load_chart
+from library import SONGS_FOLDER
+from output import RecordingOutput
+from player import PlaybackClock, VirtualTimeSource, play_song
+
+class SimulatedListener:
+    """代替播放线程接收日志和进度，并提供暂停状态"""
+    def __init__(self):
+        self.paused = False
+        self.seek_position = 0
+        self.logs = []
+        self.progress = []
+
+    def log(self, message, level="info"):
+        self.logs.append(message)
+
+    def update_play_progress(self, progress):
+        self.progress.append(round(progress, 3))
+
+def simulate_chart(chart, speed=1.0, humanize=None, actions=(), output_latency=0.0, start_at=None):
+    """在虚拟时钟上以CPU速度完整演奏一首曲谱，返回记录到的按键事件、日志和进度
+
+    actions 为 [(虚拟时间秒, 操作, 参数)]，操作可以是 pause、resume、seek(曲谱位置ms)、speed(速度)，
+    用于模拟播放过程中的用户操作。start_at 为虚拟时间上约定的开始时间(秒)，模拟合奏。
+    """
+    source = VirtualTimeSource()
+    clock = PlaybackClock(speed, output_latency=output_latency, source=source)
+    output = RecordingOutput(clock)
+    listener = SimulatedListener()
+
+    handlers = {
+        "pause": lambda _: setattr(listener, "paused", True),
+        "resume": lambda _: setattr(listener, "paused", False),
+        "seek": clock.seek,
+        "speed": clock.set_speed,
+    }
+    for when, action, argument in actions:
+        source.call_at(when, lambda action=action, argument=argument: handlers[action](argument))
+
+    play_song(chart, threading.Event(), speed, listener, humanize=humanize, clock=clock, output=output,
+              start_at=start_at)
+    return {
+        "events": output.events,
+        "logs": listener.logs,
+        "progress": listener.progress,
+        "duration": round(source.now(), 6),
+    }
+
+def result_digest(result):
+    """模拟结果的摘要，用于回归对比"""
+    data = json.dumps([result["events"], result["logs"], result["progress"]], ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def simulate_library(songs_folder, speed=1.0):
+    """模拟演奏曲库中的所有曲谱，返回 ({曲名: 摘要}, 耗时)"""
+    start = time.perf_counter()
+    digests = {}
+    for file_name in sorted(os.listdir(songs_folder)):
+        if not file_name.endswith(".json"):
+            continue
+        song_name = file_name[:-5]
+        chart = load_chart(os.path.join(songs_folder, file_name), song_name)
+        if chart is None or not len(chart):
+            continue
+        digests[song_name] = result_digest(simulate_chart(chart, speed))
+    return digests, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="在虚拟时钟上模拟演奏整个曲库，生成或校验回归基线")
+    parser.add_argument("folder", nargs="?", default=SONGS_FOLDER)
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--save", help="保存基线到指定文件")
+    parser.add_argument("--check", help="与指定基线文件对比")
+    args = parser.parse_args()
+
+    digests, elapsed = simulate_library(args.folder, args.speed)
+    print(f"模拟完成: {len(digests)} 首曲谱, 耗时 {elapsed:.2f}秒")
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(digests, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到 {args.save}")
+
+    if args.check:
+        with open(args.check, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        changed = sorted(name for name in digests.keys() & baseline.keys() if digests[name] != baseline[name])
+        missing = sorted(baseline.keys() - digests.keys())
+        added = sorted(digests.keys() - baseline.keys())
+        for name in changed:
+            print(f"结果变化: {name}")
+        for name in missing:
+            print(f"基线中有但本次未模拟: {name}")
+        for name in added:
+            print(f"新增曲谱: {name}")
+        if changed or missing:
+            sys.exit(1)
+        print("与基线一致")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,13 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chart import Chart
+
+@pytest.fixture
+def make_chart():
+    """按 [(时间ms, 按键)] 生成测试曲谱，默认每秒一个音符"""
+    def make(notes=((0, "1Key0"), (1000, "1Key1"), (2000, "1Key2"))):
+        return Chart.from_song_data({"name": "测试", "songNotes": [{"time": time_ms, "key": key} for time_ms, key in notes]})
+    return make
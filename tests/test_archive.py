@@ -0,0 +1,116 @@
+import json
+import pytest
+import library
+from library import LibraryArchive, extract_library, pack_library, path_signature, read_file
+
+SONG = json.dumps([{"name": "曲子", "songNotes": [{"time": i * 250, "key": f"1Key{i % 15}"} for i in range(200)]}], ensure_ascii=False)
+
+@pytest.fixture
+def archive_path(tmp_path):
+    songs = tmp_path / "songs"
+    songs.mkdir()
+    (songs / "曲子.json").write_text(SONG, encoding="utf-8")
+    (songs / "宽字符.json").write_text(SONG, encoding="utf-16")
+    (songs / "说明.txt").write_text("不是曲谱", encoding="utf-8")
+    path = str(tmp_path / "songs.skylib")
+    count, raw_total, size, _ = pack_library(str(songs), path)
+    assert count == 2
+    assert size < raw_total
+    return path
+
+def test_round_trip(archive_path, tmp_path):
+    archive = LibraryArchive(archive_path)
+    try:
+        assert sorted(archive.names()) == ["宽字符.json", "曲子.json"]
+        # UTF-16 曲谱打包时转为 UTF-8
+        for name in archive.names():
+            data = archive.read(name)
+            assert data == SONG.encode("utf-8")
+            assert archive.head(name) == data[:library.SNIFF_SIZE]
+            assert archive.head(name, 10) == data[:10]
+            assert archive.signature(name) == [library.zlib.crc32(data), len(data)]
+    finally:
+        archive.close()
+
+    assert extract_library(archive_path, str(tmp_path / "out")) == 2
+    assert (tmp_path / "out" / "宽字符.json").read_text(encoding="utf-8") == SONG
+
+def test_member_paths(archive_path):
+    member = archive_path + "/曲子.json"
+    assert read_file(member) == SONG.encode("utf-8")
+    assert path_signature(member) == library.open_archive(archive_path).signature("曲子.json")
+    with pytest.raises(FileNotFoundError):
+        read_file(archive_path + "/没有.json")
+
+def test_crc_mismatch_is_rejected(archive_path):
+    archive = LibraryArchive(archive_path)
+    offset, size, raw_size, crc = archive.index["曲子.json"]
+    archive.index["曲子.json"] = (offset, size, raw_size, crc ^ 1)
+    with pytest.raises(ValueError, match="曲库归档数据损坏"):
+        archive.read("曲子.json")
+    archive.index["曲子.json"] = (offset, size, raw_size - 1, crc)
+    with pytest.raises(ValueError, match="曲库归档数据损坏"):
+        archive.read("曲子.json")
+    archive.close()
+
+def test_corrupt_block_is_rejected(archive_path):
+    offset, size, _, _ = LibraryArchive(archive_path).index["曲子.json"]
+    with open(archive_path, "r+b") as f:
+        f.seek(offset + size // 2)
+        byte = f.read(1)
+        f.seek(offset + size // 2)
+        f.write(bytes([byte[0] ^ 0xFF]))
+    archive = LibraryArchive(archive_path)
+    with pytest.raises(ValueError, match="曲库归档数据损坏"):
+        archive.read("曲子.json")
+    assert archive.read("宽字符.json") == SONG.encode("utf-8")
+    archive.close()
+
+def test_bad_magic_is_rejected(tmp_path):
+    path = tmp_path / "bad.skylib"
+    path.write_bytes(b"NOTSKYLB" + bytes(16))
+    with pytest.raises(ValueError):
+        LibraryArchive(str(path))
+
+def make_zip(path, compression=library.zipfile.ZIP_DEFLATED):
+    # Windows 上打包的中文文件名是 GBK 编码且没有 UTF-8 标记，先写同长度的占位名再替换字节
+    gbk_name = "曲谱.json".encode("gbk")
+    placeholder = b"X" * (len(gbk_name) - 5) + b".json"
+    with library.zipfile.ZipFile(path, "w", compression) as zf:
+        zf.writestr("合集/", b"")
+        zf.writestr("合集/曲子.json", SONG)
+        zf.writestr(placeholder.decode("ascii"), SONG)
+        zf.writestr("__MACOSX/合集/._曲子.json", b"\x00\x05\x16\x07")
+        zf.writestr("说明.md", "不是曲谱")
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data.replace(placeholder, gbk_name))
+
+def test_zip_members(tmp_path):
+    path = str(tmp_path / "合集.zip")
+    make_zip(path)
+    archive = library.ZipArchive(path)
+    try:
+        assert sorted(archive.names()) == ["合集/曲子.json", "曲谱.json"]
+        for name in archive.names():
+            data = archive.read(name)
+            assert data == SONG.encode("utf-8")
+            assert archive.head(name) == data[:library.SNIFF_SIZE]
+            assert archive.signature(name) == [library.zlib.crc32(data), len(data)]
+    finally:
+        archive.close()
+    assert read_file(path + "/合集/曲子.json") == SONG.encode("utf-8")
+
+def test_zip_crc_mismatch_is_rejected(tmp_path):
+    path = str(tmp_path / "合集.zip")
+    make_zip(path, library.zipfile.ZIP_STORED)
+    with open(path, "rb") as f:
+        data = f.read()
+    start = data.index(b'"songNotes"')
+    with open(path, "wb") as f:
+        f.write(data[:start] + b"'" + data[start + 1:])
+    archive = library.ZipArchive(path)
+    with pytest.raises(library.zipfile.BadZipFile):
+        archive.read("合集/曲子.json")
+    archive.close()
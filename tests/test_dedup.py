@@ -0,0 +1,32 @@
+from dedup import NUM_PERM, LSH_BANDS, SIMILARITY_THRESHOLD, fingerprint_song, group_duplicates
+
+ROWS = NUM_PERM // LSH_BANDS
+
+def song(keys, start=0):
+    return {"songNotes": [{"time": start + i * 300, "key": f"1Key{key}"} for i, key in enumerate(keys)]}
+
+def test_copies_and_transpositions_are_grouped():
+    melody = [0, 2, 4, 5, 7, 4, 2, 9, 11, 7, 4, 0, 2, 5, 9, 7]
+    fingerprints = {
+        "曲子": fingerprint_song(song(melody)),
+        "曲子(1)": fingerprint_song(song(melody, start=500)),
+        "曲子 升调": fingerprint_song(song([key + 1 for key in melody])),
+        "别的": fingerprint_song(song([14, 3, 8, 1, 12, 6, 0, 10, 2, 13, 5, 9, 4, 11, 7, 3])),
+    }
+    assert group_duplicates(fingerprints) == [["曲子", "曲子 升调", "曲子(1)"]]
+
+def test_bucket_head_outlier_does_not_hide_similar_members():
+    # 三首在前 4 段完全相同，因此同桶且 "甲" 排在桶首；"甲" 与另两首都不相似，
+    # "乙" 和 "丙" 其余每段各有一行不同，不会单独同桶，但整体相似度仍超过阈值
+    shared = [1000 + i for i in range(4 * ROWS)]
+    rest = range(4 * ROWS, NUM_PERM)
+    outlier = shared + [5000 + i for i in rest]
+    similar = shared + [2000 + i for i in rest]
+    other = shared + [3000 + i if i % ROWS == 0 else 2000 + i for i in rest]
+    assert sum(a == b for a, b in zip(similar, other)) / NUM_PERM >= SIMILARITY_THRESHOLD
+    fingerprints = {
+        "甲": {"exact": "a", "minhash": outlier},
+        "乙": {"exact": "b", "minhash": similar},
+        "丙": {"exact": "c", "minhash": other},
+    }
+    assert group_duplicates(fingerprints) == [["丙", "乙"]]
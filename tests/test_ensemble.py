@@ -0,0 +1,32 @@
+import threading
+from ensemble import Conductor, Member, _play, skewed_clock
+
+def test_member_output_latency_presses_early_on_loopback(make_chart):
+    chart = make_chart([(0, "1Key0"), (100, "1Key1"), (200, "1Key2")])
+    conductor = Conductor("127.0.0.1", 0, log=lambda message: None).start()
+    members = [Member("127.0.0.1", conductor.port, name=name, log=lambda message: None,
+                      local_clock=skewed_clock(offset)).connect()
+               for name, offset in (("a", 0.0), ("b", 1234.0))]
+    try:
+        start_at = conductor.announce_start(lead=0.3)
+        latencies = (0.0, 0.04)
+        errors = [None, None]
+
+        def play(index):
+            member = members[index]
+            errors[index] = _play(chart, 1.0, member.source, start_at, True, latencies[index])
+
+        threads = [threading.Thread(target=play, args=(index,)) for index in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        for member in members:
+            member.close()
+        conductor.close()
+
+    for member_errors, latency in zip(errors, latencies):
+        assert len(member_errors) == len(chart)
+        for error in member_errors:
+            assert abs(error + latency * 1000) < 10
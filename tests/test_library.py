@@ -0,0 +1,67 @@
+import json
+from library import Library, chart_id, looks_like_chart, scan_root
+from settings import SettingsStore
+
+CHART = json.dumps([{"name": "x", "songNotes": [{"time": 0, "key": "1Key0"}]}])
+
+def make_roots(tmp_path):
+    first = tmp_path / "first"
+    second = tmp_path / "second"
+    for root in (first, second):
+        root.mkdir()
+        (root / "同名.json").write_text(CHART, encoding="utf-8")
+    (first / "只在一.json").write_text(CHART, encoding="utf-8")
+    return str(first), str(second)
+
+def test_ids_are_stable_across_root_order(tmp_path):
+    first, second = make_roots(tmp_path)
+    forward = {entry.path: entry.id for entry in Library([first, second]).entries()}
+    backward = {entry.path: entry.id for entry in Library([second, first]).entries()}
+    assert forward == backward
+    assert len(set(forward.values())) == 3
+    assert forward[f"{first}/同名.json"] == chart_id(first, "同名.json")
+
+def test_duplicate_titles_get_root_label(tmp_path):
+    first, second = make_roots(tmp_path)
+    library = Library([first, second])
+    assert sorted(library.titles()) == ["只在一", "同名", "同名 [second]"]
+    assert library.find("同名").root == first
+    assert library.find("同名 [second]").root == second
+    assert [entry.title for entry in library.search("同名")] == ["同名", "同名 [second]"]
+
+def test_missing_root_is_reported(tmp_path):
+    first, _ = make_roots(tmp_path)
+    library = Library([first, str(tmp_path / "missing")]).refresh()
+    assert len(library) == 2
+    assert [root for root, _ in library.errors] == [str(tmp_path / "missing")]
+
+def test_title_favorites_migrate_to_ids(tmp_path):
+    first, second = make_roots(tmp_path)
+    library = Library([first, second])
+    store = SettingsStore(str(tmp_path / "settings.json"), save_delay=60)
+    for favorite in ("只在一", "同名 [second]", "已删除"):
+        store.add_favorite(favorite)
+    entries = store.migrate_favorites(library)
+    assert [entry.title for entry in entries] == ["只在一", "同名 [second]"]
+    assert store.favorites() == [entries[0].id, entries[1].id, "已删除"]
+
+    # 根目录顺序改变后标题变了，按编号保存的收藏仍指向同一首曲谱
+    reordered = Library([second, first])
+    assert [entry.path for entry in store.migrate_favorites(reordered)] == [entry.path for entry in entries]
+    assert reordered.get(entries[1].id).title == "同名"
+
+def test_looks_like_chart():
+    assert looks_like_chart(CHART.encode("utf-8"))
+    assert looks_like_chart(b'\xef\xbb\xbf {"songNotes": []}')
+    assert looks_like_chart(CHART.encode("utf-16"))
+    assert looks_like_chart(CHART.encode("utf-16-be"))
+    assert looks_like_chart(b"[\n  {")
+    assert not looks_like_chart(b"[YIP] U I")
+    assert not looks_like_chart("Y U I O P".encode("utf-16"))
+    assert not looks_like_chart(b"")
+
+def test_scan_root_skips_letter_notation_txt(tmp_path):
+    (tmp_path / "json.txt").write_bytes(CHART.encode("utf-16"))
+    (tmp_path / "letters.txt").write_text("[YIP] U I\n", encoding="utf-8")
+    (tmp_path / "chart.json").write_text(CHART, encoding="utf-8")
+    assert [name for name, _ in scan_root(str(tmp_path))] == ["chart.json", "json.txt"]
@@ -0,0 +1,53 @@
+import struct
+import pytest
+from importer import ImportReport
+from midi_import import convert_midi, iter_midi_events, midi_note_times
+
+def track(*events):
+    data = b"".join(events) + b"\x00\xff\x2f\x00"
+    return b"MTrk" + struct.pack(">I", len(data)) + data
+
+def tempo(delta, microseconds):
+    return delta + b"\xff\x51\x03" + microseconds.to_bytes(3, "big")
+
+# 480 tick 为一个四分音符；第 960 tick 起速度从 120 BPM 变为 240 BPM
+MIDI = (b"MThd" + struct.pack(">IHHh", 6, 1, 2, 480)
+        + track(tempo(b"\x00", 500000), tempo(b"\x87\x40", 250000))
+        + track(b"\x00\x90\x3c\x64",        # tick 0: C4
+                b"\x83\x60\x3e\x64",        # tick 480: D4，沿用上一个状态字节
+                b"\x83\x60\x40\x00",        # tick 960: 力度为 0 的 note-on 相当于 note-off
+                b"\x00\x80\x3c\x40",        # note-off
+                b"\x00\x90\x40\x64",        # tick 960: E4
+                b"\x00\xc0\x05",            # 只有一个数据字节的音色切换
+                b"\x83\x60\x90\x3d\x64",    # tick 1440: C#4，不在音阶上
+                b"\x00\x60\x64",            # tick 1440: C7，超出音域，沿用状态字节
+                b"\x00\x99\x26\x64"))       # 打击乐通道
+
+def test_events_use_running_status():
+    events = list(iter_midi_events(MIDI))
+    assert [event for event in events if event[0] == "tempo"] == [("tempo", 0, 500000), ("tempo", 960, 250000)]
+    assert [event[1:] for event in events if event[0] == "note"] == [
+        (0, 0, 60), (480, 0, 62), (960, 0, 64), (1440, 0, 61), (1440, 0, 96), (1440, 9, 38)]
+
+def test_tempo_changes_convert_ticks_to_ms():
+    times, notes, bpm = midi_note_times(MIDI)
+    assert bpm == 120
+    assert times.tolist() == pytest.approx([0, 500, 1000, 1250, 1250])
+    assert notes.tolist() == [60, 62, 64, 61, 96]
+
+def test_convert_folds_out_of_range_and_drops_out_of_scale(tmp_path):
+    path = tmp_path / "测试.mid"
+    path.write_bytes(MIDI)
+    report = ImportReport(str(path))
+    song = convert_midi(str(path), report)
+    assert song["name"] == "测试"
+    assert song["pitchLevel"] == 0
+    assert song["songNotes"] == [{"time": 0, "key": "1Key0"}, {"time": 500, "key": "1Key1"},
+                                 {"time": 1000, "key": "1Key2"}, {"time": 1250, "key": "1Key7"}]
+    assert (report.dropped, report.folded, report.merged) == (1, 1, 0)
+
+def test_corrupt_track_is_rejected():
+    with pytest.raises(ValueError):
+        midi_note_times(MIDI[:14] + b"XXXX" + MIDI[18:])
+    with pytest.raises(ValueError):
+        midi_note_times(b"RIFF" + MIDI[4:])
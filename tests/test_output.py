@@ -0,0 +1,18 @@
+import pytest
+from output import SimulatedOutput, measure_latency, parse_latency_profiles, DEFAULT_PROFILE
+
+@pytest.mark.parametrize("delay_ms", [0.0, 15.0, 40.0])
+def test_measure_latency_recovers_simulated_delay(delay_ms):
+    latency = measure_latency(SimulatedOutput(delay_ms=delay_ms), samples=5)
+    assert latency == pytest.approx(delay_ms, abs=0.5)
+
+def test_measure_latency_times_out_without_listener_events():
+    class SilentOutput(SimulatedOutput):
+        def add_listener(self, callback):
+            pass
+
+    assert measure_latency(SilentOutput(delay_ms=5), samples=2, timeout=0.05) is None
+
+def test_parse_latency_profiles():
+    assert parse_latency_profiles({"profile": "蓝牙", "profiles": {"蓝牙": "32.5"}}) == ("蓝牙", {"蓝牙": 32.5})
+    assert parse_latency_profiles({"profiles": {"x": "bad"}}) == (DEFAULT_PROFILE, {DEFAULT_PROFILE: 0.0})
@@ -0,0 +1,45 @@
+import contextlib
+import threading
+from output import RecordingOutput
+from player import PlaybackClock, VirtualTimeSource, play_playlist
+from simulate import SimulatedListener, simulate_chart
+
+def press_times(result):
+    return [time_ms for time_ms, kind, _ in result["events"] if kind == "down"]
+
+def test_output_latency_shifts_presses_before_shared_start(make_chart):
+    chart = make_chart()
+    base = press_times(simulate_chart(chart, start_at=5.0))
+    early = press_times(simulate_chart(chart, start_at=5.0, output_latency=0.05))
+    assert base == [5000, 6000, 7000]
+    assert early == [4950, 5950, 6950]
+
+def test_output_latency_keeps_spacing_without_shared_start(make_chart):
+    chart = make_chart()
+    assert press_times(simulate_chart(chart, output_latency=0.05)) == press_times(simulate_chart(chart))
+
+class RecordingPlaylist:
+    def __init__(self, charts, events):
+        self.charts = list(charts)
+        self.events = events
+        self.gap = 1.0
+
+    def next_chart(self):
+        self.events.append("load")
+        return ("测试", self.charts.pop(0)) if self.charts else None
+
+def test_realtime_context_wraps_each_song(make_chart):
+    events = []
+
+    @contextlib.contextmanager
+    def realtime():
+        events.append("enter")
+        yield
+        events.append("exit")
+
+    clock = PlaybackClock(1.0, source=VirtualTimeSource())
+    playlist = RecordingPlaylist([make_chart(), make_chart()], events)
+    play_playlist(playlist, threading.Event(), 1.0, SimulatedListener(), clock=clock,
+                  output=RecordingOutput(clock), realtime_factory=realtime)
+    # 加载下一首发生在实时模式之外
+    assert events == ["load", "enter", "exit", "load", "enter", "exit", "load"]
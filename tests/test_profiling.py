@@ -0,0 +1,36 @@
+import threading
+import profiling
+
+def test_thread_entry_runs_while_session_profiler_is_active(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "_modes", {"counters", "cprofile"})
+    monkeypatch.setattr(profiling, "_counters", {})
+    monkeypatch.setattr(profiling, "_profilers", [])
+    monkeypatch.setattr(profiling, "_session", None)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling.atexit, "register", lambda func: None)
+
+    @profiling.profiled("entry", thread_entry=True)
+    def entry(value):
+        return sum(range(value))
+
+    results = []
+    errors = []
+
+    def run():
+        try:
+            results.append(entry(100))
+        except Exception as e:
+            errors.append(e)
+
+    profiling.start_session()
+    try:
+        thread = threading.Thread(target=run)
+        thread.start()
+        thread.join()
+    finally:
+        for profiler in profiling._profilers:
+            profiler.disable()
+
+    assert errors == []
+    assert results == [4950]
+    assert profiling._counters["entry"][0] == 1
@@ -0,0 +1,140 @@
+import base64
+import hashlib
+import http.client
+import json
+import os
+import socket
+from urllib.parse import quote
+import pytest
+from remote import MAX_BODY, WEBSOCKET_GUID, RemoteServer
+
+class FakeController:
+    def __init__(self):
+        self.commands = []
+        self.position = 0.0
+
+    def state(self):
+        return {"playing": True, "position": self.position}
+
+    def search(self, text, limit):
+        return [{"id": "abc", "title": text}][:limit]
+
+    def queue(self):
+        return []
+
+    def execute(self, command, params):
+        self.commands.append((command, params))
+
+@pytest.fixture
+def controller():
+    return FakeController()
+
+@pytest.fixture
+def server(controller):
+    server = RemoteServer(controller, port=0, token="", rate=50, log=lambda message: None).start()
+    yield server
+    server.stop()
+
+def request(server, method, path, body=None, headers=None):
+    connection = http.client.HTTPConnection("127.0.0.1", server.port, timeout=2)
+    try:
+        connection.request(method, path, body=body, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+def post(server, path, params):
+    return request(server, "POST", path, json.dumps(params), {"Content-Type": "application/json"})
+
+def test_http_commands(server, controller):
+    assert request(server, "GET", "/api/state") == (200, {"playing": True, "position": 0.0})
+    assert request(server, "GET", "/api/library?q=" + quote("曲子"))[1] == [{"id": "abc", "title": "曲子"}]
+    assert post(server, "/api/seek", {"progress": 50}) == (202, {"ok": True, "command": "seek"})
+    assert post(server, "/api/play", {"id": "abc"})[0] == 202
+    assert request(server, "DELETE", "/api/queue", headers={"Content-Type": "application/json"})[0] == 202
+    assert controller.commands == [("seek", {"progress": 50.0}), ("play", {"id": "abc"}), ("clear_queue", {})]
+
+def test_invalid_http_commands(server, controller):
+    assert post(server, "/api/seek", {"progress": 150})[0] == 400
+    assert post(server, "/api/nope", {})[0] == 404
+    # 没有 JSON 内容类型的修改请求一律拒绝
+    assert request(server, "POST", "/api/pause")[0] == 400
+    assert controller.commands == []
+
+def test_oversized_body_is_rejected(server, controller):
+    with socket.create_connection(("127.0.0.1", server.port), timeout=2) as sock:
+        sock.sendall((f"POST /api/pause HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+                      f"Content-Length: {MAX_BODY + 1}\r\n\r\n").encode("latin-1"))
+        response = sock.makefile("rb").read()
+    assert response.startswith(b"HTTP/1.1 413 ")
+    assert b"Connection: close" in response
+    assert controller.commands == []
+
+def test_token_is_required(controller):
+    server = RemoteServer(controller, port=0, token="secret", log=lambda message: None).start()
+    try:
+        assert request(server, "GET", "/api/state")[0] == 401
+        assert request(server, "GET", "/api/state?token=secret")[0] == 200
+        assert request(server, "GET", "/api/state", headers={"Authorization": "Bearer secret"})[0] == 200
+    finally:
+        server.stop()
+
+class WebSocketClient:
+    def __init__(self, port):
+        self.sock = socket.create_connection(("127.0.0.1", port), timeout=2)
+        self.file = self.sock.makefile("rb")
+        self.key = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall((f"GET /ws HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                           f"Sec-WebSocket-Key: {self.key}\r\nSec-WebSocket-Version: 13\r\n\r\n").encode("latin-1"))
+        self.headers = []
+        line = self.file.readline()
+        while line != b"\r\n":
+            self.headers.append(line.decode("latin-1").strip())
+            line = self.file.readline()
+
+    def receive(self):
+        _, second = self.file.read(2)
+        length = second & 0x7F
+        if length == 126:
+            length = int.from_bytes(self.file.read(2), "big")
+        return json.loads(self.file.read(length))
+
+    def send(self, message):
+        data = json.dumps(message).encode("utf-8")
+        mask = os.urandom(4)
+        self.sock.sendall(bytes([0x81, 0x80 | len(data)]) + mask + bytes(byte ^ mask[index % 4] for index, byte in enumerate(data)))
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+def test_websocket_pushes_state(server, controller):
+    client = WebSocketClient(server.port)
+    try:
+        accept = base64.b64encode(hashlib.sha1((client.key + WEBSOCKET_GUID).encode()).digest()).decode()
+        assert client.headers[0] == "HTTP/1.1 101 Switching Protocols"
+        assert f"Sec-WebSocket-Accept: {accept}" in client.headers
+
+        first = client.receive()
+        assert first["type"] == "state" and first["position"] == 0.0
+        controller.position = 12.5
+        server.notify()
+        pushed = client.receive()
+        while pushed["position"] != 12.5:
+            pushed = client.receive()
+        assert pushed["type"] == "state"
+
+        client.send({"cmd": "seek", "progress": 30})
+        assert client.receive() == {"type": "result", "ok": True, "command": "seek"}
+        client.send({"cmd": "seek"})
+        assert client.receive()["type"] == "error"
+        assert controller.commands == [("seek", {"progress": 30.0})]
+    finally:
+        client.close()
+
+def test_cross_origin_websocket_is_rejected(server):
+    with socket.create_connection(("127.0.0.1", server.port), timeout=2) as sock:
+        sock.sendall((f"GET /ws HTTP/1.1\r\nHost: 127.0.0.1:{server.port}\r\nOrigin: http://evil.example\r\n"
+                      "Upgrade: websocket\r\nConnection: Upgrade\r\nSec-WebSocket-Key: x\r\n\r\n").encode("latin-1"))
+        assert sock.makefile("rb").readline().startswith(b"HTTP/1.1 403 ")
@@ -0,0 +1,72 @@
+import json
+import time
+import pytest
+import settings
+from settings import RETRY_DELAY, SettingsStore
+
+@pytest.fixture(autouse=True)
+def no_atexit(monkeypatch):
+    monkeypatch.setattr(settings.atexit, "register", lambda func: None)
+
+def read_settings(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def test_legacy_files_are_migrated(tmp_path):
+    (tmp_path / "favorites.json").write_text(json.dumps(["曲子"], ensure_ascii=False), encoding="utf-8")
+    (tmp_path / "hotkey_settings.json").write_text(json.dumps({"pause": "F7", "stop": "F8"}), encoding="utf-8")
+    (tmp_path / "delay_settings.json").write_text(json.dumps({"enabled": True, "min": 100, "max": 300}), encoding="utf-8")
+    settings_file = str(tmp_path / "settings.json")
+
+    store = SettingsStore(settings_file, save_delay=60)
+    assert store.migrated
+    data = read_settings(settings_file)
+    assert data["version"] == settings.SETTINGS_VERSION
+    assert data["favorites"] == ["曲子"]
+    assert data["hotkeys"] == {"pause": "F7", "stop": "F8"}
+    assert data["delay"] == {"enabled": True, "min": 100, "max": 300}
+    assert data["latency"] == {}
+
+    # 已有 settings.json 时不再迁移
+    (tmp_path / "favorites.json").write_text(json.dumps(["别的"], ensure_ascii=False), encoding="utf-8")
+    store = SettingsStore(settings_file, save_delay=60)
+    assert not store.migrated
+    assert store.favorites() == ["曲子"]
+
+def test_edits_within_save_delay_are_written_once(tmp_path, monkeypatch):
+    writes = []
+    replace = settings.os.replace
+    monkeypatch.setattr(settings.os, "replace", lambda src, dst: (writes.append(dst), replace(src, dst)))
+    settings_file = str(tmp_path / "settings.json")
+    store = SettingsStore(settings_file, save_delay=0.2)
+
+    for name in ("一", "二", "三"):
+        store.add_favorite(name)
+    store.update("delay", enabled=True)
+    store.remove_favorite("二")
+    assert writes == []
+    time.sleep(0.5)
+
+    assert writes == [settings_file]
+    data = read_settings(settings_file)
+    assert data["favorites"] == ["一", "三"]
+    assert data["delay"]["enabled"] is True
+    assert store.flush() is True
+    assert writes == [settings_file]
+
+def test_failed_save_stays_dirty_and_retries(tmp_path):
+    folder = tmp_path / "missing"
+    settings_file = str(folder / "settings.json")
+    logs = []
+    store = SettingsStore(settings_file, save_delay=60, log=logs.append)
+    store.add_favorite("曲子")
+
+    assert store.flush() is False
+    assert store._dirty
+    assert store._timer is not None and store._timer.interval == RETRY_DELAY
+    assert len(logs) == 1 and "保存设置失败" in logs[0]
+
+    folder.mkdir()
+    assert store.flush() is True
+    assert store._timer is None and not store._dirty
+    assert read_settings(settings_file)["favorites"] == ["曲子"]
@@ -0,0 +1,29 @@
+import json
+import os
+from library import SONGS_FOLDER
+from simulate import simulate_chart, simulate_library, result_digest
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "simulate_baseline.json")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHORD_NOTES = [(0, "1Key0"), (20, "1Key4"), (1000, "1Key1"), (2000, "1Key2"), (3000, "1Key3")]
+
+def test_virtual_clock_records_chords_pause_and_seek(make_chart):
+    actions = [(1.5, "pause", None), (4.0, "resume", None), (4.5, "seek", 2500)]
+    result = simulate_chart(make_chart(CHORD_NOTES), actions=actions)
+    presses = [(time_ms, key) for time_ms, kind, key in result["events"] if kind == "down"]
+    keys = [key for _, key in presses]
+    # 和弦同时按下；暂停期间不发出按键；跳转后从 2500ms 继续，只剩最后一个音符
+    assert presses[0][0] == presses[1][0] == 0
+    assert presses[2][0] == 1000
+    assert len(keys) == 4
+    assert presses[3][0] == 5000
+    assert result_digest(result) == result_digest(simulate_chart(make_chart(CHORD_NOTES), actions=actions))
+
+def test_library_matches_baseline():
+    with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    digests, _ = simulate_library(os.path.join(ROOT, SONGS_FOLDER))
+    assert digests.keys() == baseline.keys()
+    changed = sorted(name for name in digests if digests[name] != baseline[name])
+    assert not changed, f"模拟结果与基线不一致: {changed[:10]}"
@@ -0,0 +1,51 @@
+from text_import import parse_letter_notation, convert_text
+from utils import load_key_mapping
+
+MAPPING = load_key_mapping()
+
+def parse(text, **kwargs):
+    return parse_letter_notation(text, mapping=MAPPING, **kwargs)
+
+def test_request_example_treats_slash_as_bar():
+    notes, bpm, errors = parse("Y U I O P / H J K L ;")
+    assert errors == []
+    assert bpm == 120
+    assert [key for _, key in notes] == [f"1Key{i}" for i in range(10)]
+    assert [time_ms for time_ms, _ in notes] == [i * 250.0 for i in range(10)]
+
+def test_slash_as_key_is_opt_in():
+    notes, _, errors = parse("N M , . /", slash_as_key=True)
+    assert errors == []
+    assert [key for _, key in notes] == [f"1Key{i}" for i in range(10, 15)]
+
+def test_chords_share_one_step():
+    notes, _, errors = parse("YIP [Y I P] (HK) U")
+    assert errors == []
+    assert notes[:3] == [(0.0, "1Key0"), (0.0, "1Key2"), (0.0, "1Key4")]
+    assert notes[3:6] == [(250.0, "1Key0"), (250.0, "1Key2"), (250.0, "1Key4")]
+    assert notes[6:8] == [(500.0, "1Key5"), (500.0, "1Key7")]
+    assert notes[8] == (750.0, "1Key1")
+
+def test_tempo_grid_rests_and_comments():
+    notes, bpm, errors = parse("@bpm 60 # slow\n@step 1\nY - U | --- I  # tail\n")
+    assert errors == []
+    assert bpm == 60
+    assert notes == [(0.0, "1Key0"), (2000.0, "1Key1"), (6000.0, "1Key2")]
+
+def test_unparseable_lines_are_reported_and_skipped():
+    text = "Y U\n[YI)\nI Q\n@bpm -120\n(Y I\nP)\nO"
+    notes, bpm, errors = parse(text)
+    assert bpm == 120
+    assert [line for line, _, _ in errors] == [2, 3, 4, 5, 6]
+    assert errors[0] == (2, "[YI)", "和弦括号没有闭合")
+    assert errors[1][2] == "无法识别的字符 'Q'"
+    # 出错的行整行丢弃，时间不前进
+    assert notes == [(0.0, "1Key0"), (250.0, "1Key1"), (500.0, "1Key3")]
+
+def test_convert_text_builds_chart(tmp_path):
+    source = tmp_path / "曲子.txt"
+    source.write_text("@bpm 100\nY U I\n", encoding="utf-8")
+    song = convert_text(str(source))
+    assert song["name"] == "曲子"
+    assert song["bpm"] == 100
+    assert song["songNotes"] == [{"time": 0, "key": "1Key0"}, {"time": 300, "key": "1Key1"}, {"time": 600, "key": "1Key2"}]
@@ -0,0 +1,47 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import utils
+
+class VersionHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(2)
+        body = json.dumps({"version": "2.5.0"}).encode("utf-8")
+        self.send_response(200 if self.path != "/missing" else 404)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), VersionHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_fetch_latest_version(server):
+    assert utils.fetch_latest_version(server + "/version.json") == "2.5.0"
+    assert utils.fetch_latest_version(server + "/missing") is None
+
+def test_slow_server_times_out(server):
+    started = time.perf_counter()
+    assert utils.fetch_latest_version(server + "/slow", timeout=(0.5, 0.3)) is None
+    assert time.perf_counter() - started < 1.5
+
+def test_cached_version_expires(tmp_path, monkeypatch):
+    cache_file = str(tmp_path / "version_cache.json")
+    assert utils.load_cached_version(cache_file) == (None, False)
+    utils.save_cached_version("2.5.0", cache_file)
+    assert utils.load_cached_version(cache_file, ttl=60) == ("2.5.0", True)
+    now = time.time()
+    monkeypatch.setattr(utils.time, "time", lambda: now + 61)
+    assert utils.load_cached_version(cache_file, ttl=60) == ("2.5.0", False)
@@ -0,0 +1,47 @@
+from window import FakeWindow, FakeWindowProvider, GameWindow, WINDOW_POLL_INTERVAL, poll_interval, title_matches
+
+def test_title_matches_substrings():
+    assert title_matches("Sky")
+    assert title_matches("Sky - 光遇国际服")
+    assert title_matches("光·遇")
+    assert not title_matches("Notepad")
+
+def test_cached_window_is_reused():
+    window = FakeWindow("Sky - Children of the Light", active=True)
+    provider = FakeWindowProvider([FakeWindow("Notepad"), window])
+    game = GameWindow(provider)
+    assert game.get() is window
+    assert game.is_active() is True
+    assert game.get() is window
+    assert provider.lookups == 1
+
+def test_closed_window_is_resolved_again():
+    first = FakeWindow("Sky")
+    second = FakeWindow("光·遇")
+    provider = FakeWindowProvider([first, second])
+    game = GameWindow(provider)
+    assert game.get() is first
+    first.closed = True
+    assert game.get() is second
+    assert provider.lookups == 2
+
+def test_invalidate_forces_lookup():
+    window = FakeWindow("Sky", minimized=True)
+    provider = FakeWindowProvider([window])
+    game = GameWindow(provider)
+    game.get()
+    game.invalidate()
+    assert game.activate() is True
+    assert provider.lookups == 2
+    assert window.isActive and not window.isMinimized
+
+def test_missing_window():
+    game = GameWindow(FakeWindowProvider())
+    assert game.get() is None
+    assert game.is_active() is None
+    assert game.activate() is False
+
+def test_poll_interval_only_while_playing():
+    assert poll_interval(True, False) == WINDOW_POLL_INTERVAL
+    assert poll_interval(True, True) is None
+    assert poll_interval(False, False) is None
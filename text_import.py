@@ -0,0 +1,171 @@
+"""字母谱导入
+
+字母谱的每个按键用 utils.load_key_mapping 中对应的键盘字母表示，例如 Y U I O P / H J K L ; / N M , . /。
+语法：
+    空白分隔的每一组占一拍格，组内多个字母为和弦，如 YIP
+    [YIP] 或 (Y I P) 也表示和弦，括号内可以有空格
+    - 为休止一格，--- 为休止三格
+    | 和 / 为小节线，只用于排版；/ 默认不作为按键，slash_as_key=True (命令行 --slash-key) 时才表示对应按键
+    # 之后到行尾为注释
+    @bpm 120 设置速度，@step 2 设置每拍格数，可以出现在任意一行
+"""
+import os
+import re
+import sys
+from functools import partial
+from importer import batch_import, find_sources, SONGS_FOLDER
+from utils import load_key_mapping, detect_encoding
+
+TEXT_EXTENSIONS = (".txt",)
+DEFAULT_BPM = 120
+DEFAULT_STEPS_PER_BEAT = 2  # 每拍的格数，默认每格为八分音符
+CHORD_OPEN = "[("
+BAR_CHARS = "|/"
+
+def inverse_key_mapping(mapping=None, slash_as_key=False):
+    """键盘字母 -> 按键名，同一字母只取 1Key 的按键；slash_as_key 为 False 时 / 留作小节线"""
+    inverse = {}
+    for key_name, letter in (mapping or load_key_mapping()).items():
+        if key_name.startswith("1Key") and (slash_as_key or letter != "/"):
+            inverse.setdefault(letter.upper(), key_name)
+    return inverse
+
+def token_pattern(letters):
+    """构建词法分析用的正则，按顺序尝试各类记号，最后一项匹配任意无法识别的字符"""
+    letter_class = "".join(re.escape(letter) for letter in letters)
+    bar_class = "".join(re.escape(char) for char in BAR_CHARS if char not in letters)
+    chord_body = rf"(?:[{letter_class}]|[^\S\n])*"
+    return re.compile(
+        r"(?P<newline>\n)|(?P<space>[^\S\n]+)|(?P<comment>#[^\n]*)|(?P<directive>@[^\n#]*)"
+        rf"|(?P<chord>\[{chord_body}\]|\({chord_body}\))|(?P<group>[{letter_class}]+)"
+        rf"|(?P<rest>-+)|(?P<bar>[{bar_class}])|(?P<error>.)",
+        re.IGNORECASE,
+    )
+
+def parse_letter_notation(text, bpm=DEFAULT_BPM, steps_per_beat=DEFAULT_STEPS_PER_BEAT, mapping=None,
+                          slash_as_key=False):
+    """单遍扫描解析字母谱，返回 (音符列表, 最终速度, 无法解析的行 [(行号, 内容, 原因)])
+
+    每一行先暂存解析结果，行内出现无法识别的内容时整行丢弃并记录。
+    """
+    letters = inverse_key_mapping(mapping, slash_as_key)
+    pattern = token_pattern(letters)
+    notes = []
+    errors = []
+    time_ms = 0.0
+    line_number = 1
+    line_start = 0
+    line_notes = []
+    line_time = 0.0
+    line_error = None
+    step_ms = 60000 / bpm / steps_per_beat
+
+    for match in pattern.finditer(text + "\n"):
+        kind = match.lastgroup
+        token = match.group()
+        if kind == "group" or kind == "chord":
+            keys = dict.fromkeys(letters[char.upper()] for char in token if char.upper() in letters)
+            if not keys:
+                line_error = line_error or "空的和弦"
+            line_notes.extend((time_ms + line_time, key_name) for key_name in keys)
+            line_time += step_ms
+        elif kind == "rest":
+            line_time += step_ms * len(token)
+        elif kind == "directive":
+            name, _, value = token[1:].strip().partition(" ")
+            if line_notes or line_time:
+                line_error = line_error or "指令必须单独一行"
+            elif name.lower() in ("bpm", "step"):
+                try:
+                    number = float(value)
+                except ValueError:
+                    number = 0
+                if not 0 < number < float("inf"):
+                    line_error = line_error or f"指令参数必须是正数: {value.strip()}"
+                else:
+                    if name.lower() == "bpm":
+                        bpm = number
+                    else:
+                        steps_per_beat = number
+                    step_ms = 60000 / bpm / steps_per_beat
+            else:
+                line_error = line_error or f"未知指令 @{name}"
+        elif kind == "error":
+            reason = "和弦括号没有闭合" if token in CHORD_OPEN else f"无法识别的字符 {token!r}"
+            line_error = line_error or reason
+        elif kind == "newline":
+            if line_error:
+                errors.append((line_number, text[line_start:match.start()].strip(), line_error))
+            else:
+                notes.extend(line_notes)
+                time_ms += line_time
+            line_notes = []
+            line_time = 0.0
+            line_error = None
+            line_number += 1
+            line_start = match.end()
+
+    return notes, bpm, errors
+
+def convert_text(file_path, report=None, bpm=DEFAULT_BPM, steps_per_beat=DEFAULT_STEPS_PER_BEAT, slash_as_key=False):
+    """将字母谱文本文件转换为 Sky Studio 曲谱数据"""
+    with open(file_path, "rb") as f:
+        raw_data = f.read()
+    text = raw_data.decode(detect_encoding(raw_data) or "utf-8", errors="replace")
+    if text.lstrip().startswith(("{", "[{")):
+        if report is not None:
+            report.errors.append("文件是 JSON 曲谱，不需要转换")
+        return None
+
+    notes, bpm, errors = parse_letter_notation(text, bpm, steps_per_beat, slash_as_key=slash_as_key)
+    if report is not None:
+        report.errors.extend(f"第{line}行 {reason}: {content}" for line, content, reason in errors)
+    if not notes:
+        return None
+    return {
+        "name": os.path.splitext(os.path.basename(file_path))[0],
+        "author": "字母谱导入",
+        "bpm": round(bpm),
+        "bitsPerPage": 16,
+        "pitchLevel": 0,
+        "isComposed": True,
+        "isEncrypted": False,
+        "songNotes": [{"time": round(time_ms), "key": key_name} for time_ms, key_name in notes],
+    }
+
+def main():
+    args = sys.argv[1:]
+    bpm, steps_per_beat = DEFAULT_BPM, DEFAULT_STEPS_PER_BEAT
+    slash_as_key = False
+    paths = []
+    for arg in args:
+        if arg == "--slash-key":
+            slash_as_key = True
+        elif arg.startswith(("--bpm=", "--step=")):
+            option, value = arg.split("=", 1)
+            try:
+                number = float(value)
+            except ValueError:
+                number = 0
+            if not 0 < number < float("inf"):
+                print(f"{option} 必须是正数: {value}")
+                return
+            if option == "--bpm":
+                bpm = number
+            else:
+                steps_per_beat = number
+        else:
+            paths.append(arg)
+    if not paths:
+        print("用法: python text_import.py [--bpm=120] [--step=2] [--slash-key] <字母谱文件或文件夹>...")
+        return
+    convert = partial(convert_text, bpm=bpm, steps_per_beat=steps_per_beat, slash_as_key=slash_as_key)
+    reports, elapsed = batch_import(convert, find_sources(paths, TEXT_EXTENSIONS), SONGS_FOLDER)
+    for report in reports:
+        print(report.summary())
+        for error in report.errors:
+            print(f"    {error}")
+    print(f"导入完成: 成功 {sum(report.ok for report in reports)}/{len(reports)}, 耗时 {elapsed:.2f}秒")
+
+if __name__ == "__main__":
+    main()
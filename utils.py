@@ -1,10 +1,13 @@
 import json
+import os
 import chardet
 import codecs
 import keyboard
 import time
 import random
 import requests
+from profiling import profiled
+from library import read_file, path_signature
 
 def load_key_mapping(custom_mapping=None):
     default_mapping = {
@@ -21,22 +24,37 @@ def load_key_mapping(custom_mapping=None):
 
 key_mapping = load_key_mapping()
 
+def detect_encoding(raw_data):
+    """检测曲谱文件编码，优先根据BOM判断，避免对大文件调用chardet"""
+    if raw_data.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if raw_data.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        raw_data.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        return chardet.detect(raw_data)['encoding']
+
+def file_signature(file_path):
+    """生成文件签名，用于判断缓存是否失效，归档中的曲谱使用内容校验值"""
+    return path_signature(file_path)
+
+@profiled("load_json")
 def load_json(file_path, encoding_cache={}):
     """优化JSON加载"""
     try:
+        raw_data = read_file(file_path)
         encoding = encoding_cache.get(file_path)
         if not encoding:
-            with open(file_path, 'rb') as f:
-                raw_data = f.read()
-                encoding = chardet.detect(raw_data)['encoding']
-                encoding_cache[file_path] = encoding
-                
-        with codecs.open(file_path, 'r', encoding=encoding) as f:
-            data = json.load(f)
-            if isinstance(data, list) and data:
-                song_data = data[0]
-                return song_data if "songNotes" in song_data else data
-            return data
+            encoding = detect_encoding(raw_data)
+            encoding_cache[file_path] = encoding
+
+        data = json.loads(raw_data.decode(encoding))
+        if isinstance(data, list) and data:
+            song_data = data[0]
+            return song_data if "songNotes" in song_data else data
+        return data
     except Exception as e:
         print(f"读取JSON文件出错: {e}")
         return None
@@ -65,15 +83,41 @@ def get_key_mapping(key):
         _key_map_cache[key] = key_mapping.get(key)
     return _key_map_cache[key]
 
-def fetch_latest_version():
-    """获取最新版本信息"""
+VERSION_URL = 'https://gitee.com/Tloml-Starry/resources/raw/master/resources/json/SkyAutoMusicVersion.json'
+VERSION_CACHE_FILE = 'version_cache.json'
+VERSION_CACHE_TTL = 6 * 60 * 60  # 版本缓存有效期(秒)
+VERSION_TIMEOUT = (2, 3)  # (连接超时, 读取超时)
+
+def fetch_latest_version(url=VERSION_URL, timeout=VERSION_TIMEOUT):
+    """获取最新版本信息，请求失败或超时返回 None"""
     try:
-        response = requests.get('https://gitee.com/Tloml-Starry/resources/raw/master/resources/json/SkyAutoMusicVersion.json')
+        response = requests.get(url, timeout=timeout)
         if response.status_code == 200:
             data = response.json()
             return data.get('version', '未知版本')
         else:
-            return '获取失败'
+            return None
     except Exception as e:
         print(f"获取最新版本信息失败: {e}")
-        return '获取失败'
+        return None
+
+def load_cached_version(cache_file=VERSION_CACHE_FILE, ttl=VERSION_CACHE_TTL):
+    """读取缓存的版本信息，返回 (版本号, 是否仍在有效期内)"""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        version = cache.get('version')
+        fresh = time.time() - cache.get('checked_at', 0) < ttl
+        return version, fresh
+    except (OSError, ValueError, AttributeError):
+        return None, False
+
+def save_cached_version(version, cache_file=VERSION_CACHE_FILE):
+    """保存版本信息到缓存文件"""
+    try:
+        tmp_file = cache_file + '.tmp'
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': version, 'checked_at': time.time()}, f, ensure_ascii=False)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        print(f"保存版本缓存失败: {e}")
@@ -0,0 +1,95 @@
+GAME_TITLES = ("Sky", "光·遇")
+WINDOW_POLL_INTERVAL = 250  # 演奏中检查游戏窗口焦点的间隔(ms)，暂停或停止时不检查
+
+def title_matches(title, titles=GAME_TITLES):
+    """窗口标题包含任一游戏标题即视为游戏窗口，如 "Sky - ..." """
+    return any(name in title for name in titles)
+
+def poll_interval(playing, paused):
+    """窗口焦点检查的间隔(ms)，只在演奏中且未暂停时检查，其余情况返回 None"""
+    return WINDOW_POLL_INTERVAL if playing and not paused else None
+
+class PyGetWindowProvider:
+    """通过 pygetwindow 查找游戏窗口
+
+    窗口提供者需实现 find_window() 返回标题匹配的窗口或 None，以及 is_valid(window) 判断窗口是否仍然存在。
+    窗口对象需提供 isActive、isMinimized、restore()、activate()。
+    """
+    def __init__(self, titles=GAME_TITLES):
+        self.titles = titles
+
+    def find_window(self):
+        import pygetwindow as gw
+        # 只枚举一次所有窗口，而不是每个标题各枚举一次
+        return next((w for w in gw.getAllWindows() if title_matches(w.title, self.titles)), None)
+
+    def is_valid(self, window):
+        try:
+            handle = getattr(window, "_hWnd", None)
+            if handle is not None:
+                import ctypes
+                if not ctypes.windll.user32.IsWindow(handle):
+                    return False
+            return title_matches(window.title, self.titles)
+        except Exception:
+            return False
+
+class FakeWindow:
+    """模拟的窗口对象"""
+    def __init__(self, title, active=False, minimized=False):
+        self.title = title
+        self.isActive = active
+        self.isMinimized = minimized
+        self.closed = False
+
+    def restore(self):
+        self.isMinimized = False
+
+    def activate(self):
+        self.isActive = True
+
+class FakeWindowProvider:
+    """模拟的窗口提供者，用于在没有游戏窗口的环境(如 Linux)下测试，lookups 记录实际查找次数"""
+    def __init__(self, windows=(), titles=GAME_TITLES):
+        self.windows = list(windows)
+        self.titles = titles
+        self.lookups = 0
+
+    def find_window(self):
+        self.lookups += 1
+        return next((w for w in self.windows if not w.closed and title_matches(w.title, self.titles)), None)
+
+    def is_valid(self, window):
+        return not window.closed and window in self.windows
+
+class GameWindow:
+    """缓存已找到的游戏窗口，只有窗口失效时才重新查找"""
+    def __init__(self, provider=None):
+        self.provider = provider or PyGetWindowProvider()
+        self._window = None
+
+    def get(self):
+        """返回游戏窗口，找不到时返回 None"""
+        window = self._window
+        if window is None or not self.provider.is_valid(window):
+            window = self._window = self.provider.find_window()
+        return window
+
+    def invalidate(self):
+        """丢弃缓存的窗口，下次使用时重新查找"""
+        self._window = None
+
+    def is_active(self):
+        """游戏窗口是否存在且处于前台；找不到窗口时返回 None"""
+        window = self.get()
+        return None if window is None else window.isActive
+
+    def activate(self):
+        """还原并激活游戏窗口，找不到窗口时返回 False"""
+        window = self.get()
+        if window is None:
+            return False
+        if window.isMinimized:
+            window.restore()
+        window.activate()
+        return True